@@ -0,0 +1,401 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+
+#throughput benchmarks for the compute and file hot paths, on synthetic data from 10 to 10^7 rows
+#run from the repo root:
+#   python benchmarks/hot_paths.py run [--max-size 10000000] [--only density_calc] [-o results.json]
+#   python benchmarks/hot_paths.py compare benchmarks/results/old.json benchmarks/results/new.json
+#each run is saved as json in benchmarks/results/ (named by date and git commit) so runs can be compared
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(REPO_ROOT, "benchmarks", "results")
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "density_measurement"))
+
+from density_analysis.density_calculations import density_calc as dc
+from density_analysis.density_calculations import densityplots
+from density_analysis.density_calculations import plotSettings as ps
+from density_analysis.density_calculations.linear_fit import robust_line_fit
+from density_analysis.density_calculations.nonlinear_fit import fit_curves
+from density_analysis.density_calculations.columnar import columnar_path, read_table, write_columns
+from density_analysis.density_calculations.processing import RAW_COLUMNS, process_trial
+from density_analysis.density_calculations.trial_set import TrialSet
+import functions.utilities as util
+
+SIZES = [10**k for k in range(1, 8)]
+
+#(name, largest size worth running, setup function)
+#setup(n, folder) builds the synthetic data and returns the function to time
+BENCHMARKS = []
+
+
+def benchmark(name, max_size=10**7):
+    def register(setup):
+        BENCHMARKS.append((name, max_size, setup))
+        return setup
+    return register
+
+
+#a raw trial file with n points, the same columns density_measurement writes
+def make_raw_trial(n, seed=0):
+    rng = np.random.default_rng(seed)
+    currents = np.round(np.linspace(-5, 5, n), 3)
+    currents[:2] = 0.0
+    voltages = 0.2 + 1.0E-3*currents + rng.normal(0, 1.0E-5, n)
+    return pd.DataFrame({
+        RAW_COLUMNS[0]: currents,
+        RAW_COLUMNS[1]: voltages,
+        RAW_COLUMNS[2]: np.full(n, 8.0E-6),
+        RAW_COLUMNS[3]: np.full(n, 1.0E-5)
+    })
+
+
+def make_plotable(x, y, y_error=[]):
+    return ps.plotable(x, y, 7.80505E-5, 3.7, y_error=y_error)
+
+
+######################### density_calc #########################
+
+@benchmark("density_calc.rb_density")
+def bench_rb_density(n, folder):
+    slopes = np.linspace(1.0E-6, 1.0E-5, n)
+    wavelengths = np.linspace(7.800E-5, 7.810E-5, n)
+    return lambda: dc.rb_density(slopes, 3.7, wavelengths)
+
+@benchmark("density_calc.rb_density_batch")
+def bench_rb_density_batch(n, folder):
+    slopes = np.linspace(1.0E-6, 1.0E-5, n)
+    return lambda: dc.rb_density_batch(slopes, 3.7, 7.80505E-5)
+
+@benchmark("density_calc.convertItoB_mainroom")
+def bench_convert_i_to_b(n, folder):
+    currents = np.linspace(-5, 5, n)
+    return lambda: dc.convertItoB_mainroom(currents)
+
+@benchmark("density_calc.convertVtoRot")
+def bench_convert_v_to_rot(n, folder):
+    voltages = np.linspace(0.1, 0.3, n)
+    return lambda: dc.convertVtoRot(voltages, 0.2, 0.05)
+
+@benchmark("density_calc.calculateRotationConversionFactor")
+def bench_conversion_factor(n, folder):
+    voltage_diffs = np.linspace(0.01, 0.1, n)
+    return lambda: dc.calculateRotationConversionFactor(voltage_diffs, 0.4)
+
+######################### processing #########################
+
+#App.createProcessedFile delegates to process_trial (the App itself needs a Tk window)
+@benchmark("processing.process_trial")
+def bench_process_trial(n, folder):
+    raw_data = make_raw_trial(n)
+    return lambda: process_trial(raw_data, 0.05)
+
+######################### fits #########################
+
+@benchmark("densityplots.fit_to_line")
+def bench_fit_to_line(n, folder):
+    rng = np.random.default_rng(1)
+    x = np.linspace(-10, 10, n)
+    data = make_plotable(x, 1.0E-5*x + rng.normal(0, 1.0E-6, n), np.full(n, 1.0E-6))
+    return lambda: densityplots.fit_to_line(data)
+
+#n points split into stacked trials of 40 points, with 5% glitch points
+@benchmark("linear_fit.robust_line_fit (40 point trials)")
+def bench_robust_line_fit(n, folder):
+    rng = np.random.default_rng(7)
+    num_trials = max(1, n//40)
+    x = np.tile(np.linspace(-10, 10, 40), (num_trials, 1))
+    y = 1.0E-5*x + rng.normal(0, 1.0E-6, x.shape)
+    glitches = rng.random(x.shape) < 0.05
+    y[glitches] += rng.normal(0, 3.0E-5, glitches.sum())
+    return lambda: robust_line_fit(x, y, np.full(x.shape, 1.0E-6))
+
+#n points split into 40 point trials, all fit and converted to densities together
+@benchmark("TrialSet.fit (40 point trials)")
+def bench_trial_set_fit(n, folder):
+    rng = np.random.default_rng(8)
+    num_trials = max(1, n//40)
+    x = np.tile(np.linspace(-10, 10, 40), num_trials)
+    trials = TrialSet(x, 1.0E-5*x + rng.normal(0, 1.0E-6, x.size), np.full(x.size, 1.0E-6),
+                      np.arange(num_trials + 1)*40, 7.80505E-5, 3.7)
+    return lambda: trials.fit()
+
+@benchmark("densityplots.fit_to_ln", max_size=10**5)
+def bench_fit_to_ln(n, folder):
+    rng = np.random.default_rng(2)
+    x = np.linspace(1, 10, n)
+    data = make_plotable(x, 2.0*np.log(1.5*x) + 0.5 + rng.normal(0, 0.01, n))
+    return lambda: densityplots.fit_to_ln(data)
+
+@benchmark("densityplots.fit_to_sine", max_size=10**5)
+def bench_fit_to_sine(n, folder):
+    rng = np.random.default_rng(3)
+    x = np.linspace(0, 3, n)
+    data = make_plotable(x, 2.0*np.sin(1.2*x) + 0.5 + rng.normal(0, 0.01, n))
+    return lambda: densityplots.fit_to_sine(data)
+
+@benchmark("densityplots.fit_to_gaussian", max_size=10**5)
+def bench_fit_to_gaussian(n, folder):
+    rng = np.random.default_rng(4)
+    x = np.linspace(-3, 3, n)
+    data = make_plotable(x, 2.0*np.exp(-(x - 0.3)**2/1.5) + 0.5 + rng.normal(0, 0.01, n))
+    return lambda: densityplots.fit_to_gaussian(data)
+
+#one field window query on an n point sweep (the sorted index is built before timing)
+@benchmark("plotable.get_field_range")
+def bench_field_range(n, folder):
+    x = np.linspace(-100, 100, n)
+    data = make_plotable(x, 1.0E-5*x, np.full(n, 1.0E-6))
+    data.get_field_range()
+    return lambda: data.get_field_range(-10, 10)
+
+#n points split into 100 point trials of slowly drifting sines, all fit together
+@benchmark("nonlinear_fit.fit_curves sine (100 point trials)", max_size=10**6)
+def bench_fit_curves_sine(n, folder):
+    rng = np.random.default_rng(9)
+    num_trials = max(1, n//100)
+    x = np.tile(np.linspace(0, 3, 100), (num_trials, 1))
+    b = np.linspace(1.0, 1.5, num_trials)[:, None]
+    y = 2.0*np.sin(b*x) + 0.5 + rng.normal(0, 0.01, x.shape)
+    return lambda: fit_curves("sine", x, y)
+
+######################### plots #########################
+
+#one trial plot (n points) rendered to a png with a reused figure
+@benchmark("plot_renderer trial png", max_size=10**4)
+def bench_render_trial_plot(n, folder):
+    from density_analysis.density_calculations.plot_renderer import render_plot
+    x = np.linspace(-10, 10, n)
+    plot = {"x": x, "y": 1.0E-5*x, "y_err": np.full(n, 1.0E-6), "fit_x": x, "fit_y": 1.0E-5*x,
+            "title": "benchmark", "xlabel": "Magnetic Field (Gauss)", "ylabel": "Rotation (Radians)", "note": "note"}
+    path = os.path.join(folder, "plot_%d.png" % n)
+    return lambda: render_plot(path, plot)
+
+######################### utilities #########################
+
+@benchmark("utilities.meanAbsError")
+def bench_mean_abs_error(n, folder):
+    samples = np.random.default_rng(5).normal(0.2, 1.0E-3, n)
+    return lambda: util.meanAbsError(samples)
+
+@benchmark("utilities.stringArraytoFloatArray", max_size=10**6)
+def bench_string_to_float(n, folder):
+    strings = [str(v) for v in np.random.default_rng(6).normal(0.2, 1.0E-3, n)]
+    return lambda: util.stringArraytoFloatArray(strings)
+
+@benchmark("utilities.formatTimestampsForCSV", max_size=10**6)
+def bench_format_timestamps(n, folder):
+    times = 1.7E9 + np.arange(n)*0.1
+    return lambda: util.formatTimestampsForCSV(times)
+
+######################### trial files #########################
+
+@benchmark("trial csv write")
+def bench_csv_write(n, folder):
+    raw_data = make_raw_trial(n)
+    path = os.path.join(folder, "write_%d.csv" % n)
+    return lambda: raw_data.to_csv(path, index=False)
+
+@benchmark("trial csv read")
+def bench_csv_read(n, folder):
+    path = os.path.join(folder, "read_%d.csv" % n)
+    make_raw_trial(n).to_csv(path, index=False)
+    return lambda: pd.read_csv(path)
+
+@benchmark("trial columnar write")
+def bench_columnar_write(n, folder):
+    raw_data = make_raw_trial(n)
+    path = columnar_path(os.path.join(folder, "colwrite_%d.csv" % n))
+    return lambda: write_columns(raw_data, path)
+
+@benchmark("trial columnar read")
+def bench_columnar_read(n, folder):
+    csv_path = os.path.join(folder, "colread_%d.csv" % n)
+    write_columns(make_raw_trial(n), columnar_path(csv_path))
+    #read every column so the memory maps are actually paged in
+    return lambda: read_table(csv_path).sum()
+
+
+#times one call of fn: enough calls to fill min_time, best of repeat
+def time_call(fn, repeat=3, min_time=0.2):
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 10**6:
+            break
+        number = max(number*10, int(number*min_time/max(elapsed, 1.0E-9)))
+    best = elapsed/number
+    for _ in range(repeat - 1):
+        best = min(best, timer.timeit(number)/number)
+    return best
+
+
+def run_benchmarks(sizes=SIZES, max_size=10**6, only=None, repeat=3, min_time=0.2, verbose=True):
+    """
+    Runs every benchmark at every size.
+
+    Parameters
+    ----------
+    sizes : list of ints
+        Number of rows (samples, points, trials) in the synthetic data. Defaults to 10 to 10^7.
+    max_size : int
+        Sizes above this are skipped. Defaults to 10^6; pass 10^7 for the full suite.
+    only : string
+        Only run benchmarks whose name contains this. Set to None by default (run all).
+    repeat : int
+        The time kept is the best of this many measurements.
+    min_time : float
+        Each measurement calls the function enough times to take at least this long (seconds).
+    verbose : bool
+        If True, print each result as it is measured.
+
+    Returns
+    -------
+    results : list of dicts
+        One per benchmark and size: name, size, seconds per call, rows per second, and an
+        error message instead of the times if the function raised.
+    """
+
+    folder = tempfile.mkdtemp(prefix="density_bench_")
+    results = []
+    try:
+        for name, bench_max, setup in BENCHMARKS:
+            if only is not None and only not in name:
+                continue
+            for n in sizes:
+                if n > min(bench_max, max_size):
+                    continue
+                result = {"name": name, "size": int(n)}
+                try:
+                    seconds = time_call(setup(int(n), folder), repeat, min_time)
+                    result["seconds"] = seconds
+                    result["rows_per_second"] = n/seconds
+                except Exception as e:
+                    result["error"] = type(e).__name__+": "+str(e)
+                results.append(result)
+                if verbose:
+                    print(format_result(result), flush=True)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def format_result(result):
+    if "error" in result:
+        return "%-44s %10d  %s" % (result["name"], result["size"], result["error"])
+    return "%-44s %10d %14.3e s %14.3e rows/s" % (result["name"], result["size"], result["seconds"], result["rows_per_second"])
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+        return proc.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+#where a run is saved when no output file is given
+def default_results_path(commit):
+    stamp = datetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    return os.path.join(RESULTS_FOLDER, stamp + "_" + commit + ".json")
+
+
+def save_results(results, path):
+    commit = git_commit()
+    run = {
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "results": results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+
+
+def compare_results(old_path, new_path, threshold=1.2):
+    """
+    Compares two saved runs.
+
+    Parameters
+    ----------
+    old_path, new_path : string
+        The json files saved by run.
+    threshold : float
+        A benchmark is a regression when it takes more than threshold times as long as before.
+
+    Returns
+    -------
+    comparison : list of dicts
+        One per benchmark and size in both runs: name, size, old and new seconds, ratio
+        (new/old) and whether it is a regression.
+    """
+
+    with open(old_path) as f:
+        old = {(r["name"], r["size"]): r for r in json.load(f)["results"] if "seconds" in r}
+    with open(new_path) as f:
+        new = [r for r in json.load(f)["results"] if "seconds" in r]
+
+    comparison = []
+    for r in new:
+        key = (r["name"], r["size"])
+        if key not in old:
+            continue
+        ratio = r["seconds"]/old[key]["seconds"]
+        comparison.append({
+            "name": r["name"], "size": r["size"], "old": old[key]["seconds"], "new": r["seconds"],
+            "ratio": ratio, "regression": ratio > threshold
+        })
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the density compute and file hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and save the results")
+    run_parser.add_argument("--sizes", help="comma separated sizes, default 10,100,...,10000000")
+    run_parser.add_argument("--max-size", type=float, default=1.0E6, help="skip sizes above this (default 1e6)")
+    run_parser.add_argument("--only", help="only run benchmarks whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--min-time", type=float, default=0.2)
+    run_parser.add_argument("-o", "--output", help="json file for the results (default benchmarks/results/<date>_<commit>.json)")
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        sizes = SIZES if args.sizes is None else [int(float(s)) for s in args.sizes.split(",")]
+        results = run_benchmarks(sizes, int(args.max_size), args.only, args.repeat, args.min_time)
+        output = args.output or default_results_path(git_commit())
+        save_results(results, output)
+        print("saved to " + output)
+        return 0
+
+    comparison = compare_results(args.old, args.new, args.threshold)
+    for c in comparison:
+        flag = "  <-- slower" if c["regression"] else ""
+        print("%-44s %10d %12.3e %12.3e %8.2fx%s" % (c["name"], c["size"], c["old"], c["new"], c["ratio"], flag))
+    return 1 if any(c["regression"] for c in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+#measures how long each entry point takes to import, in a fresh python process every time,
+#and checks that the headless ones do not load the GUI, plotting, fitting or instrument libraries
+#run from the repo root:  python benchmarks/startup.py [--repeat 10] [--output startup.json]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#libraries that should only be loaded when they are actually used
+HEAVY_MODULES = ["tkinter", "matplotlib", "scipy", "pyvisa"]
+
+#(name, folder to run from, import statement, headless)
+#headless entry points fail the benchmark if they load any of HEAVY_MODULES
+STARTUP_TARGETS = [
+    ("density_calc", REPO_ROOT, "import density_analysis.density_calculations.density_calc", True),
+    ("processing", REPO_ROOT, "import density_analysis.density_calculations.processing", True),
+    ("densityplots", REPO_ROOT, "import density_analysis.density_calculations.densityplots", True),
+    ("uncertainty", REPO_ROOT, "import density_analysis.density_calculations.uncertainty", True),
+    ("resonance_fit", REPO_ROOT, "import density_analysis.density_calculations.resonance_fit", True),
+    ("nonlinear_fit", REPO_ROOT, "import density_analysis.density_calculations.nonlinear_fit", True),
+    ("catalog", REPO_ROOT, "import density_analysis.density_calculations.catalog", True),
+    ("batch cli", os.path.join(REPO_ROOT, "density_analysis"), "import batch", True),
+    ("measurement functions", os.path.join(REPO_ROOT, "density_measurement"),
+     "import functions.density_collection_functions, functions.current_sweep, functions.trial_recorder", True),
+    ("analysis app", os.path.join(REPO_ROOT, "density_analysis"), "import app", False),
+    ("measurement app", os.path.join(REPO_ROOT, "density_measurement"), "import app", False)
+]
+
+_CHILD = """
+import time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+import json, sys
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+#imports one target in a new interpreter, returns the import time, the wall time of the whole
+#process (interpreter start included) and which heavy modules were loaded
+def time_import(folder, statement):
+    code = _CHILD.format(statement=statement, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=folder, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()
+        return {"error": error[-1] if error else "exit code " + str(proc.returncode)}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall"] = wall
+    return result
+
+
+def run_startup_benchmark(repeat=10):
+    """
+    Times the import of every entry point in STARTUP_TARGETS.
+
+    Parameters
+    ----------
+    repeat : int
+        Number of fresh processes to time for each target. Defaults to 10.
+
+    Returns
+    -------
+    results : list of dicts
+        One per target: name, median and min import time, median process wall time (seconds),
+        the heavy modules it loaded, whether it is headless, and an error message if it
+        could not be imported (e.g. tkinter is not installed).
+    """
+
+    results = []
+    for name, folder, statement, headless in STARTUP_TARGETS:
+        runs = [time_import(folder, statement) for _ in range(repeat)]
+        errors = [r["error"] for r in runs if "error" in r]
+        if errors:
+            results.append({"name": name, "headless": headless, "error": errors[0]})
+            continue
+        import_times = np.array([r["seconds"] for r in runs])
+        results.append({
+            "name": name,
+            "headless": headless,
+            "import_median": float(np.median(import_times)),
+            "import_min": float(np.min(import_times)),
+            "wall_median": float(np.median([r["wall"] for r in runs])),
+            "heavy": runs[0]["heavy"]
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time how long each entry point takes to import.")
+    parser.add_argument("-n", "--repeat", type=int, default=10, help="fresh processes per target")
+    parser.add_argument("-o", "--output", help="also save the results to this json file")
+    args = parser.parse_args(argv)
+
+    results = run_startup_benchmark(args.repeat)
+    failed = False
+    print("%-24s %12s %12s %12s  %s" % ("target", "import (ms)", "min (ms)", "process (ms)", "heavy modules loaded"))
+    for r in results:
+        if "error" in r:
+            print("%-24s %s" % (r["name"], "could not import: " + r["error"]))
+            continue
+        heavy = ", ".join(r["heavy"]) or "-"
+        if r["headless"] and r["heavy"]:
+            heavy = heavy + "  <-- should be headless"
+            failed = True
+        print("%-24s %12.1f %12.1f %12.1f  %s" % (r["name"], 1000*r["import_median"], 1000*r["import_min"],
+                                                  1000*r["wall_median"], heavy))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version, "repeat": args.repeat, "results": results}, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
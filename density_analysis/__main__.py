@@ -1,4 +1,17 @@
-from app import App
+import sys
 
-app = App()
-app.mainloop()
\ No newline at end of file
+#the process pool in batch mode re-imports this file in its workers, so only run from the real main
+if __name__ == "__main__":
+	#python density_analysis batch <data folder> runs the headless batch analysis instead of the app
+	if len(sys.argv) > 1 and sys.argv[1] == "batch":
+		from batch import main
+		sys.exit(main(sys.argv[2:]))
+	#python density_analysis convert <data folder> makes columnar copies of the larger csv files
+	if len(sys.argv) > 1 and sys.argv[1] == "convert":
+		from batch import convert_main
+		sys.exit(convert_main(sys.argv[2:]))
+
+	from app import App
+
+	app = App()
+	app.mainloop()
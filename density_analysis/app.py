@@ -2,14 +2,9 @@
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import scrolledtext
-from matplotlib.figure import Figure
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import pandas as pd
-from density_calculations.density_calc import convertItoB_mainroom, convertVtoRot
-import numpy as np
 import pandas as pd
+from density_calculations.processing import get_zero_rotation_voltage, process_trial
+from density_calculations.trial_files import deconstruct_filename, get_experiment_params
 
 #my libraries
 #import functions.utilities as util
@@ -58,58 +53,26 @@ class App(tk.Tk):
 	#we have been taking two data points at 0 field because of the current switch
 	#handle this by taking the two 0 values and averagating them. Use that voltage as 0 rotation
 	def getZeroRotationVoltage(self):
-		# find all instances of 0 current, use those as our 0 rotation
-		# if there is more than one, average the voltages at 0 current and return that 
-		df = self.raw_data
-		zero_index = df.loc[df["Current"] == 0].index.tolist()
-		zero_vs = df["Voltage"].iloc[zero_index].to_list()
-		avg_0 = np.average(zero_vs)
-		return avg_0
+		return get_zero_rotation_voltage(self.raw_data)
 
 		
 	def createProcessedFile(self):
 		self.processed_filename = self.raw_filename+"_processed.csv"
 		self.processed_filepath = self.base_filepath+self.processed_filename
-		#get raw data as dataframe transform voltage to rotation
-		zero_rotation_voltage = self.getZeroRotationVoltage() 
-
-		voltages = self.raw_data["Voltage"]
-		voltages_mae = self.raw_data["Voltage Mean Absolute Error"]
-		voltages_std = self.raw_data["Voltage Standard Deviation"]
-		currents = self.raw_data["Current"]
-		rotations = []
-		rotation_mae = []
-		rotation_std = []
-		mag_fields = []
-		print(voltages)
-		l = len(voltages)
-		#convert all the voltages to rotations
-		for i in range (0, l):
-			rotations.append(convertVtoRot(voltages[i], zero_rotation_voltage, self.conversion_factor))
-			rotation_mae.append(voltages_mae[i]*self.conversion_factor)
-			rotation_std.append(voltages_std[i]*self.conversion_factor)
-			mag_fields.append(convertItoB_mainroom(currents[i]))
-		#convert current to magnetic field
-		self.processed_data = pd.DataFrame({
-			"Magnetic Field (Gauss)": mag_fields,
-			"Rotation (Radians)": rotations,
-			"Rotation Mean Absolute Error": rotation_mae, 
-			"Rotation Standard Deviation": rotation_std
-		})
+		#convert voltage to rotation and current to magnetic field for the whole trial at once
+		self.processed_data = process_trial(self.raw_data, self.conversion_factor)
 		self.data_display.insert(tk.END, self.processed_data)
 		self.processed_data.to_csv(self.processed_filepath)
 
 
-
 		
 
 	def deconstruct_filename(self):
-		fn = self.raw_filename
-		fn_arr = fn.split("_")
-		self.date = fn_arr[0]
-		self.cell_id = fn_arr[1].split("-")[1]
-		self.oven_temp = fn_arr[2].split("-")[1]
-		self.trial_num = fn_arr[3].split("-")[1]
+		trial_info = deconstruct_filename(self.raw_filename)
+		self.date = trial_info["date"]
+		self.cell_id = trial_info["cell_id"]
+		self.oven_temp = trial_info["oven_temp"]
+		self.trial_num = trial_info["trial_num"]
 
 	def reconstruct_basefilepath(self, arr):
 		basefp = ""
@@ -120,12 +83,10 @@ class App(tk.Tk):
 	def get_experiment_params(self):
 		self.param_filename = "Experiment_Params_"+self.date+".csv"
 		self.param_filepath = self.base_filepath+self.param_filename
-		all_params = pd.read_csv(self.param_filepath)
 		#find the row that matches the trial number in the filename selected 
-		# filter rows based on list values
-		experiment_params = all_params.loc[all_params['Trial Number'] == int(self.trial_num)].reset_index()
-		self.conversion_factor = float(experiment_params['Conversion Factor'][0])
-		self.conversion_factor_err = float(experiment_params['Conversion Factor Error'][0])
+		experiment_params = get_experiment_params(self.param_filepath, self.trial_num)
+		self.conversion_factor = experiment_params["conversion_factor"]
+		self.conversion_factor_err = experiment_params["conversion_factor_err"]
 
 
 	def choose_file(self):
@@ -0,0 +1,176 @@
+#public libraries
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+#my libraries
+from density_calculations.cells import cell_registry
+from density_calculations.catalog import ResultsCatalog
+from density_calculations.processing import process_trial, fit_trial
+from density_calculations.columnar import read_table, write_columns, columnar_path, convert_tree, COLUMNAR_MIN_ROWS
+from density_calculations.sample_archive import SAMPLE_ARCHIVE_SUFFIX
+from density_calculations.trial_files import deconstruct_filename, find_raw_trials, params_filepath, get_experiment_params
+from density_calculations.plot_renderer import render_plot, render_plots, trial_plot, summary_plot
+
+#headless version of the analysis app. Walks a data tree (usually Data/Density/),
+#processes and fits every raw trial file it finds and writes one summary table.
+#usage: python density_analysis batch Data/Density -o density_summary.csv
+#       python density_analysis convert Data/Density   (columnar copies of the larger csv files, see columnar.py)
+#       python density_analysis batch Data/Density --plots report/   (also save a plot of every trial and summary plots)
+#       python density_analysis batch Data/Density --catalog results.sqlite   (only analyze new or changed trials, see catalog.py)
+
+SUMMARY_COLUMNS = [
+	"Date", "Cell", "Oven Temperature", "Trial Number", "Laser Wavelength", "Optical Length",
+	"Conversion Factor", "Conversion Factor Error", "Slope", "Slope Error", "Intercept", "Intercept Error",
+	"Density", "Density Error", "Density Error (MAE)", "Density Error (STD)", "Downweighted Points", "Raw File", "Error"
+]
+
+
+#process and fit a single raw trial file, returns one row of the summary table
+#this runs in a worker process, so any problem with the trial is reported in the row instead of raised
+def analyze_trial(raw_filepath, write_processed=False, columnar=False, robust=None, plot_folder=None):
+	trial_info = deconstruct_filename(raw_filepath)
+	summary_row = {
+		"Date": trial_info["date"],
+		"Cell": trial_info["cell_id"],
+		"Oven Temperature": trial_info["oven_temp"],
+		"Trial Number": trial_info["trial_num"],
+		"Raw File": raw_filepath,
+		"Error": ""
+	}
+	try:
+		folder = os.path.dirname(raw_filepath)
+		params = get_experiment_params(params_filepath(folder, trial_info["date"]), trial_info["trial_num"])
+		#cells without a profile in the cell config use the constants in density_calc
+		cell = cell_registry.find(trial_info["cell_id"])
+		raw_data = read_table(raw_filepath)
+		processed_data = process_trial(raw_data, params["conversion_factor"], cell)
+		fit_results = fit_trial(processed_data, params["laser_wavelength"], params["optical_length"], cell, robust)
+		if write_processed:
+			#robust fits save the weight of every point, so the flagged points can be found
+			if robust != None:
+				processed_data["Robust Weight"] = fit_results["Robust Weights"]
+			processed_filepath = raw_filepath[:-len(".csv")]+"_processed.csv"
+			if columnar:
+				write_columns(processed_data, columnar_path(processed_filepath))
+			else:
+				processed_data.to_csv(processed_filepath)
+	except Exception as e:
+		summary_row["Error"] = type(e).__name__+": "+str(e)
+		return summary_row
+
+	#the plot is drawn here, while the trial is still in memory, with this worker's own renderer
+	if (plot_folder != None):
+		plot_path = os.path.join(plot_folder, os.path.basename(raw_filepath)[:-len(".csv")]+".png")
+		plot_error = render_plot(plot_path, trial_plot(processed_data, fit_results, os.path.basename(raw_filepath)))
+		if plot_error:
+			summary_row["Error"] = "plot: "+plot_error
+
+	summary_row["Laser Wavelength"] = params["laser_wavelength"]
+	summary_row["Optical Length"] = params["optical_length"]
+	summary_row["Conversion Factor"] = params["conversion_factor"]
+	summary_row["Conversion Factor Error"] = params["conversion_factor_err"]
+	summary_row.update(fit_results)
+	return summary_row
+
+
+def run_batch(root, workers=None, write_processed=False, columnar=False, robust=None, plot_folder=None, catalog=None):
+	"""
+	Processes and fits every raw trial file under a data folder.
+
+	Parameters
+	----------
+	root : string
+		The folder to search, e.g. Data/Density/ or a single Data/Density/<date>/ folder.
+	workers : int
+		Number of worker processes to use. Defaults to the number of CPUs.
+	write_processed : bool
+		If True, also write a <trial>_processed.csv file next to each raw file, like the app does.
+	columnar : bool
+		If True, the processed files are written in the columnar format (see columnar.py) instead of csv.
+	robust : string
+		"huber" or "tukey" to fit every trial robustly, down weighting glitch points. Set to None by default.
+	plot_folder : string
+		If given, a png of every trial (rotation vs field with the fit) is saved in this folder.
+	catalog : ResultsCatalog
+		If given, only the trials that are new or changed since they were added to the catalog are analyzed,
+		the results are added to it and the summary is read back from it. Set to None by default.
+
+	Returns
+	-------
+	summary : pandas DataFrame
+		One row per trial, with the columns in SUMMARY_COLUMNS.
+	"""
+
+	all_raw_files = find_raw_trials(root)
+	raw_files = all_raw_files if catalog == None else catalog.stale(all_raw_files)
+	if (plot_folder != None):
+		os.makedirs(plot_folder, exist_ok=True)
+	if workers == 1 or len(raw_files) <= 1:
+		rows = [analyze_trial(f, write_processed, columnar, robust, plot_folder) for f in raw_files]
+	else:
+		#raw_files is sorted by folder, so handing out contiguous chunks lets each worker
+		#reuse its cached params file for the trials from the same day
+		n_workers = workers or os.cpu_count() or 1
+		chunksize = max(1, len(raw_files)//(n_workers*4))
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			n = len(raw_files)
+			rows = list(pool.map(analyze_trial, raw_files, [write_processed]*n, [columnar]*n, [robust]*n, [plot_folder]*n, chunksize=chunksize))
+	if (catalog != None):
+		catalog.add(rows)
+		rows = catalog.rows(all_raw_files)
+	summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+	return summary
+
+
+#density vs oven temperature and density vs laser wavelength for every cell, rendered across the worker pool
+def render_summary_plots(summary, plot_folder, workers=None):
+	fitted = summary[summary["Density"].notna()]
+	plots = []
+	for cell, cell_trials in fitted.groupby("Cell"):
+		for x_column, name in [("Oven Temperature", "temperature"), ("Laser Wavelength", "wavelength")]:
+			cell_trials = cell_trials.sort_values(x_column)
+			path = os.path.join(plot_folder, "summary_cell-"+str(cell)+"_density_vs_"+name+".png")
+			plots.append((path, summary_plot(cell_trials, x_column, "Density", "Density Error", "Cell "+str(cell))))
+	return render_plots(plots, workers)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="density_analysis batch", description="Process and fit every raw trial file in a data folder.")
+	parser.add_argument("root", help="data folder to search, e.g. Data/Density/")
+	parser.add_argument("-o", "--output", default="density_summary.csv", help="where to save the summary table")
+	parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+	parser.add_argument("--write-processed", action="store_true", help="also save a _processed.csv file for every trial")
+	parser.add_argument("--columnar", action="store_true", help="save the processed files in the columnar format instead of csv")
+	parser.add_argument("--robust", choices=["huber", "tukey"], default=None, help="fit robustly, down weighting glitch points")
+	parser.add_argument("--plots", default=None, help="folder to save a plot of every trial and the summary plots in")
+	parser.add_argument("--catalog", default=None, help="sqlite results catalog to update, only new or changed trials are analyzed")
+	args = parser.parse_args(argv)
+
+	catalog = None if args.catalog == None else ResultsCatalog(args.catalog)
+	indexed = 0 if catalog == None else len(catalog)
+	summary = run_batch(args.root, args.workers, args.write_processed, args.columnar, args.robust, args.plots, catalog)
+	summary.to_csv(args.output, index=False)
+	failed = (summary["Error"] != "").sum()
+	print("Processed "+str(len(summary))+" trials ("+str(failed)+" failed). Summary saved to "+args.output)
+	if (catalog != None):
+		print("Catalog "+args.catalog+" has "+str(len(catalog))+" trials ("+str(len(catalog)-indexed)+" new)")
+		catalog.close()
+	if (args.plots != None):
+		plot_errors = [e for e in render_summary_plots(summary, args.plots, args.workers) if e]
+		print("Plots saved to "+args.plots+("" if not plot_errors else " ("+str(len(plot_errors))+" summary plots failed: "+plot_errors[0]+")"))
+	return 0
+
+
+def convert_main(argv=None):
+	parser = argparse.ArgumentParser(prog="density_analysis convert", description="Make columnar copies of the raw, processed and params csv files in a data folder that are big enough to benefit.")
+	parser.add_argument("root", help="data folder to convert, e.g. Data/Density/")
+	parser.add_argument("--overwrite", action="store_true", help="convert files even if their columnar copy is up to date")
+	parser.add_argument("--min-rows", type=int, default=COLUMNAR_MIN_ROWS, help="leave smaller tables as csv (default "+str(COLUMNAR_MIN_ROWS)+", smaller ones read just as fast from csv)")
+	args = parser.parse_args(argv)
+
+	#sample archives are already binary, their index is not a table to convert
+	converted = convert_tree(args.root, args.overwrite, args.min_rows, exclude=(SAMPLE_ARCHIVE_SUFFIX,))
+	print("Converted "+str(len(converted))+" csv files under "+args.root)
+	return 0
@@ -0,0 +1,318 @@
+import os
+import sqlite3
+import time
+import numpy as np
+
+from .columnar import table_source
+from .trial_files import deconstruct_filename, params_filepath
+
+#a sqlite file that keeps the fit results of every trial ever analyzed, so temperature and
+#spin-up studies are a query instead of copying numbers out of old runs by hand.
+#it is filled from the batch summary rows (see batch.py --catalog), and remembers the modification
+#time of each raw file and its params file, so only new or changed trials are analyzed again.
+#trials are keyed by the absolute path of their raw file, so ./Data/x.csv and Data/x.csv are the same trial.
+#values come back with the types they went in with, so a summary read back from the catalog is the same
+#as one made without it: oven temperature and trial number are the text from the file name
+#(e.g. "100"), but filters, sorting and grouping on them are numeric.
+
+#summary table column -> catalog column
+CATALOG_COLUMNS = {
+    "Raw File": "raw_file",
+    "Date": "date",
+    "Cell": "cell",
+    "Oven Temperature": "oven_temp",
+    "Trial Number": "trial_num",
+    "Laser Wavelength": "laser_wavelength",
+    "Optical Length": "optical_length",
+    "Conversion Factor": "conversion_factor",
+    "Conversion Factor Error": "conversion_factor_err",
+    "Slope": "slope",
+    "Slope Error": "slope_err",
+    "Intercept": "intercept",
+    "Intercept Error": "intercept_err",
+    "Density": "density",
+    "Density Error": "density_err",
+    "Density Error (MAE)": "density_err_mae",
+    "Density Error (STD)": "density_err_std",
+    "Downweighted Points": "downweighted_points",
+    "Error": "error"
+}
+
+_TEXT_COLUMNS = {"raw_file", "date", "cell", "oven_temp", "trial_num", "error"}
+#text columns that are compared, sorted and grouped as numbers
+_NUMERIC_TEXT_COLUMNS = {"oven_temp", "trial_num"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    raw_file TEXT PRIMARY KEY,
+    date TEXT, cell TEXT, oven_temp TEXT, trial_num TEXT,
+    laser_wavelength REAL, optical_length REAL, conversion_factor REAL, conversion_factor_err REAL,
+    slope REAL, slope_err REAL, intercept REAL, intercept_err REAL,
+    density REAL, density_err REAL, density_err_mae REAL, density_err_std REAL,
+    downweighted_points INTEGER, error TEXT,
+    raw_mtime_ns INTEGER, raw_size INTEGER, params_mtime_ns INTEGER, indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS trials_cell_temp ON trials (cell, CAST(oven_temp AS REAL));
+CREATE INDEX IF NOT EXISTS trials_date ON trials (date);
+CREATE INDEX IF NOT EXISTS trials_wavelength ON trials (laser_wavelength);
+"""
+
+
+#accepts either a summary column name ("Oven Temperature") or a catalog column name ("oven_temp")
+def _column(name):
+    if name in CATALOG_COLUMNS:
+        return CATALOG_COLUMNS[name]
+    if name in CATALOG_COLUMNS.values():
+        return name
+    raise KeyError("the catalog has no column " + str(name))
+
+
+#the sql for a column in WHERE, ORDER BY and GROUP BY (numbers stored as text are cast)
+def _sql(column):
+    if column in _NUMERIC_TEXT_COLUMNS:
+        return "CAST(" + column + " AS REAL)"
+    return column
+
+
+#the key a raw file is stored under
+def _key(raw_file):
+    return os.path.abspath(str(raw_file))
+
+
+#a summary value as sqlite stores it: numpy numbers as python ones, missing values as NULL
+def _sql_value(value, text):
+    if value is None or (not isinstance(value, str) and value != value):
+        return "" if text else None
+    if text:
+        return str(value)
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return float(value)
+
+
+#(mtime_ns, size) of the file a table is read from (csv or its columnar copy), (None, None) if it is missing
+def _file_state(path):
+    try:
+        st = os.stat(table_source(path))
+    except OSError:
+        return (None, None)
+    return (st.st_mtime_ns, st.st_size)
+
+
+#the part of a WHERE clause for one filter: a value (==), a list (IN) or a (low, high) tuple (BETWEEN, inclusive)
+def _condition(column, value):
+    if isinstance(value, tuple):
+        return column + " BETWEEN ? AND ?", [value[0], value[1]]
+    if isinstance(value, (list, np.ndarray)):
+        return column + " IN (" + ", ".join("?"*len(value)) + ")", list(value)
+    return column + " = ?", [value]
+
+
+class ResultsCatalog:
+    """
+    An on-disk sqlite catalog of trial fit results.
+
+    Attributes
+    ----------
+    path : string
+        The sqlite file.
+
+    Methods
+    -------
+    stale(self, raw_files)
+        The raw files that are not in the catalog or have changed since they were indexed.
+    add(self, summary_rows)
+        Adds or replaces trials, from batch summary rows.
+    remove(self, raw_files)
+        Removes trials.
+    rows(self, raw_files)
+        The indexed trials as summary rows, in the order given.
+    query(self, columns, order_by=None, include_failed=False, **filters)
+        Returns the requested columns of the matching trials as numpy arrays.
+    group_by(self, by, value, error=None, include_failed=False, **filters)
+        Count, mean, standard deviation and error weighted mean of a column for each value of another.
+    close(self)
+        Closes the database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM trials").fetchone()[0]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _states(self, raw_file):
+        trial_info = deconstruct_filename(raw_file)
+        params_file = params_filepath(os.path.dirname(raw_file), trial_info["date"])
+        raw_mtime, raw_size = _file_state(raw_file)
+        params_mtime, _ = _file_state(params_file)
+        return raw_mtime, raw_size, params_mtime
+
+    def stale(self, raw_files):
+        indexed = {row[0]: row[1:] for row in self._db.execute(
+            "SELECT raw_file, raw_mtime_ns, raw_size, params_mtime_ns FROM trials")}
+        return [f for f in raw_files if indexed.get(_key(f)) != self._states(f)]
+
+    def add(self, summary_rows):
+        """
+        Parameters
+        ----------
+        summary_rows : list of dicts or pandas DataFrame
+            Rows of the batch summary table (see batch.SUMMARY_COLUMNS).
+        """
+
+        if hasattr(summary_rows, "to_dict"):
+            summary_rows = summary_rows.to_dict("records")
+        names = list(CATALOG_COLUMNS.values()) + ["raw_mtime_ns", "raw_size", "params_mtime_ns", "indexed_at"]
+        sql = "INSERT OR REPLACE INTO trials (" + ", ".join(names) + ") VALUES (" + ", ".join("?"*len(names)) + ")"
+        now = time.time()
+        records = []
+        for row in summary_rows:
+            record = [_sql_value(row.get(summary_name), column in _TEXT_COLUMNS) for summary_name, column in CATALOG_COLUMNS.items()]
+            record[0] = _key(row["Raw File"])
+            records.append(record + list(self._states(row["Raw File"])) + [now])
+        with self._db:
+            self._db.executemany(sql, records)
+
+    def remove(self, raw_files):
+        with self._db:
+            self._db.executemany("DELETE FROM trials WHERE raw_file = ?", [(_key(f),) for f in raw_files])
+
+    #the rows carry the raw file paths as they were given, not as they are stored
+    def rows(self, raw_files):
+        names = list(CATALOG_COLUMNS.values())
+        indexed = {}
+        for record in self._db.execute("SELECT " + ", ".join(names) + " FROM trials"):
+            indexed[record[0]] = record
+        summary_names = list(CATALOG_COLUMNS.keys())
+        rows = []
+        for f in raw_files:
+            if _key(f) in indexed:
+                row = dict(zip(summary_names, indexed[_key(f)]))
+                row["Raw File"] = f
+                rows.append(row)
+        return rows
+
+    def _where(self, include_failed, filters):
+        conditions, values = [], []
+        if not include_failed:
+            conditions.append("error = ''")
+        for name, value in filters.items():
+            condition, condition_values = _condition(_sql(_column(name)), value)
+            conditions.append(condition)
+            values += condition_values
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+        return where, values
+
+    def query(self, columns, order_by=None, include_failed=False, **filters):
+        """
+        Finds the trials that match every filter.
+
+        Parameters
+        ----------
+        columns : list of strings
+            The columns to return, summary names ("Oven Temperature") or catalog names ("oven_temp").
+        order_by : string or list of strings
+            Columns to sort by. Set to None by default (sorted by date, then trial number).
+        include_failed : bool
+            If False (default) trials whose analysis failed are left out.
+        **filters
+            Catalog column names with a value (equal), a list (any of) or a (low, high) tuple
+            (inclusive range), e.g. cell="314B", oven_temp=(90, 110), date=["2023-06-27", "2023-06-28"].
+
+        Returns
+        -------
+        results : dict
+            One numpy array per requested column, keyed by the names given. Oven temperature and
+            trial number are numbers here.
+        """
+
+        if isinstance(columns, str):
+            columns = [columns]
+        if order_by is None:
+            order_by = ["date", "trial_num"]
+        elif isinstance(order_by, str):
+            order_by = [order_by]
+        where, values = self._where(include_failed, filters)
+        sql = ("SELECT " + ", ".join(_sql(_column(c)) for c in columns) + " FROM trials" + where
+               + " ORDER BY " + ", ".join(_sql(_column(c)) for c in order_by))
+        rows = self._db.execute(sql, values).fetchall()
+        results = {}
+        for i, name in enumerate(columns):
+            values_i = [row[i] for row in rows]
+            if _column(name) in _TEXT_COLUMNS - _NUMERIC_TEXT_COLUMNS:
+                results[name] = np.array(values_i, dtype=str)
+            else:
+                results[name] = np.array([np.nan if v is None else v for v in values_i], dtype=float)
+        return results
+
+    def group_by(self, by, value, error=None, include_failed=False, **filters):
+        """
+        Summarizes one column for each value of another, e.g. density at each oven temperature.
+
+        Parameters
+        ----------
+        by : string
+            The column to group on.
+        value : string
+            The column to summarize.
+        error : string
+            The error column of value. If given, the error weighted mean and its error are included.
+            Only rows whose error is above 0 can be weighted, so they are the only ones in the weighted
+            mean ("weighted_count" says how many there were). count, mean and std use every row.
+        include_failed : bool
+            If False (default) trials whose analysis failed are left out.
+        **filters
+            The same filters as query.
+
+        Returns
+        -------
+        groups : dict of numpy arrays
+            by (the group values, sorted), "count", "mean", "std" (population) and, with error,
+            "weighted_count", "weighted_mean" and "weighted_mean_err" (NaN for a group with no usable errors).
+        """
+
+        by_col, value_col = _sql(_column(by)), _sql(_column(value))
+        where, values = self._where(include_failed, filters)
+        where = (where + " AND " if where else " WHERE ") + value_col + " IS NOT NULL"
+        aggregates = ["COUNT(" + value_col + ")", "AVG(" + value_col + ")", "AVG(" + value_col + "*" + value_col + ")"]
+        if error is not None:
+            err_col = _sql(_column(error))
+            #NULL (left out of the sums) unless the error is above 0
+            weight = "(CASE WHEN " + err_col + " > 0 THEN 1.0/(" + err_col + "*" + err_col + ") END)"
+            aggregates += ["SUM(" + value_col + "*" + weight + ")", "SUM(" + weight + ")", "COUNT(" + weight + ")"]
+        sql = ("SELECT " + by_col + ", " + ", ".join(aggregates) + " FROM trials" + where
+               + " GROUP BY " + by_col + " ORDER BY " + by_col)
+        rows = self._db.execute(sql, values).fetchall()
+
+        columns = list(zip(*rows)) if rows else [[] for _ in range(len(aggregates) + 1)]
+        key_dtype = str if _column(by) in _TEXT_COLUMNS - _NUMERIC_TEXT_COLUMNS else float
+        mean = np.array(columns[2], dtype=float)
+        groups = {
+            by: np.array(columns[0], dtype=key_dtype),
+            "count": np.array(columns[1], dtype=int),
+            "mean": mean,
+            #AVG(x^2) - AVG(x)^2 can come out a hair below 0 from rounding
+            "std": np.sqrt(np.maximum(np.array(columns[3], dtype=float) - mean**2, 0.0))
+        }
+        if error is not None:
+            sum_w = np.array(columns[5], dtype=float)
+            groups["weighted_count"] = np.array(columns[6], dtype=int)
+            groups["weighted_mean"] = np.array(columns[4], dtype=float)/sum_w
+            groups["weighted_mean_err"] = 1/np.sqrt(sum_w)
+        return groups
@@ -0,0 +1,185 @@
+import json
+import os
+from functools import lru_cache
+import numpy as np
+
+from .density_calc import (convertItoB, convertItoB_mainroom, convertItoB_mainroom_DEPRICATED,
+                           delta_term, get_laser_f, delta_term_from_f, optical_length_term)
+
+#the physical constants of each vapor cell, so switching cells does not mean editing density_calc.py
+#the profiles are read from a json file: cells.json next to this file, or the file named by the
+#DENSITY_CELLS_CONFIG environment variable. Each entry looks like
+#   {"name": "309A", "isotope": "Rb85", "d1_resonance_f": 3.77107568E+14, "d2_resonance_f": 3.842306E+14,
+#    "optical_length": null, "coil": "mainroom", "notes": "..."}
+#optical_length can be null, then the one in the experiment params file is always used
+
+CELLS_CONFIG_ENV = "DENSITY_CELLS_CONFIG"
+DEFAULT_CELLS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cells.json")
+
+#the current to magnetic field conversions a cell profile can name
+COIL_MODELS = {
+    "frontroom": convertItoB,
+    "mainroom": convertItoB_mainroom,
+    "mainroom_helmholtz": convertItoB_mainroom_DEPRICATED
+}
+
+
+#optical length term * delta term for one cell at one wavelength
+#the key is the cell's resonances and optical length, so two cells with the same constants share entries
+#and editing a profile can never return a stale value
+@lru_cache(maxsize=4096)
+def _density_factor(d1_f, d2_f, o_len, laser_wavelen):
+    return float(optical_length_term(o_len)) * delta_term(laser_wavelen, d1_f, d2_f)
+
+
+class CellProfile:
+    """
+    The physical constants of one vapor cell.
+
+    Attributes
+    ----------
+    name : string
+        The cell id, as it appears in the data file names (cell-<name>).
+    isotope : string
+        The rubidium isotope in the cell, e.g. "Rb85".
+    d1_resonance_f : float
+        The (pressure shifted) D1 resonance frequency (Hz).
+    d2_resonance_f : float
+        The (pressure shifted) D2 resonance frequency (Hz).
+    optical_length : float
+        The length of the path of the laser through the cell (cm), or None if it is
+        always taken from the experiment params file.
+    coil : string
+        The coil model used to turn current into magnetic field, a key of COIL_MODELS.
+    notes : string
+        Free text, e.g. where the resonances came from.
+
+    Methods
+    -------
+    delta_term(self, laser_wavelen)
+        The delta term at a wavelength, with this cell's resonances.
+    optical_length_term(self, o_len=None)
+        The optical length term, for o_len or the cell's optical length.
+    density_factor(self, laser_wavelen, o_len=None)
+        Optical length term * delta term, the number rb_density multiplies the slope by.
+    convert_current(self, current)
+        Magnetic field (Gauss) for a coil current (amps), using this cell's coil model.
+    """
+
+    def __init__(self, name, d1_resonance_f, d2_resonance_f, isotope="Rb85", optical_length=None,
+                 coil="mainroom", notes=""):
+        if coil not in COIL_MODELS:
+            raise ValueError("unknown coil model " + str(coil) + ", use one of " + ", ".join(COIL_MODELS))
+        self.name = str(name)
+        self.isotope = isotope
+        self.d1_resonance_f = float(d1_resonance_f)
+        self.d2_resonance_f = float(d2_resonance_f)
+        self.optical_length = None if optical_length is None else float(optical_length)
+        self.coil = coil
+        self.notes = notes
+
+    def __repr__(self):
+        return "CellProfile(" + self.name + ", " + str(self.isotope) + ")"
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(**entry)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "isotope": self.isotope,
+            "d1_resonance_f": self.d1_resonance_f,
+            "d2_resonance_f": self.d2_resonance_f,
+            "optical_length": self.optical_length,
+            "coil": self.coil,
+            "notes": self.notes
+        }
+
+    def _optical_length(self, o_len):
+        if o_len is None:
+            o_len = self.optical_length
+        if o_len is None:
+            raise ValueError("cell " + self.name + " has no optical length, pass one in")
+        return o_len
+
+    def delta_term(self, laser_wavelen):
+        return delta_term(laser_wavelen, self.d1_resonance_f, self.d2_resonance_f)
+
+    def optical_length_term(self, o_len=None):
+        return optical_length_term(self._optical_length(o_len))
+
+    def density_factor(self, laser_wavelen, o_len=None):
+        o_len = self._optical_length(o_len)
+        if np.ndim(laser_wavelen) == 0 and np.ndim(o_len) == 0:
+            return _density_factor(self.d1_resonance_f, self.d2_resonance_f, float(o_len), float(laser_wavelen))
+        #arrays are computed directly, one term per input before broadcasting (like rb_density_batch)
+        laser_f = get_laser_f(np.asarray(laser_wavelen, dtype=float))
+        return optical_length_term(o_len) * delta_term_from_f(laser_f, self.d1_resonance_f, self.d2_resonance_f)
+
+    def convert_current(self, current):
+        return COIL_MODELS[self.coil](current)
+
+
+class CellRegistry:
+    """
+    The cell profiles, read from a json config file the first time one is needed.
+
+    Methods
+    -------
+    load(self, path=None)
+        (Re)reads the profiles from a config file.
+    get(self, name)
+        Returns the profile for a cell, raises KeyError if there is none.
+    find(self, name)
+        Returns the profile for a cell, or None if there is none.
+    add(self, profile)
+        Adds or replaces a profile (not saved to the config file).
+    names(self)
+        The names of all the cells.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._cells = None
+
+    def load(self, path=None):
+        if path is not None:
+            self.path = path
+        config_path = self.path or os.environ.get(CELLS_CONFIG_ENV) or DEFAULT_CELLS_CONFIG
+        with open(config_path) as f:
+            config = json.load(f)
+        self._cells = {}
+        for entry in config["cells"]:
+            self.add(CellProfile.from_dict(entry))
+
+    def _profiles(self):
+        if self._cells is None:
+            self.load()
+        return self._cells
+
+    def get(self, name):
+        cells = self._profiles()
+        if str(name) not in cells:
+            raise KeyError("no profile for cell " + str(name) + " in the cell config")
+        return cells[str(name)]
+
+    def find(self, name):
+        return self._profiles().get(str(name))
+
+    def add(self, profile):
+        self._profiles()[profile.name] = profile
+
+    def names(self):
+        return list(self._profiles())
+
+
+#the registry used by get_cell, rb_density and the batch analysis
+cell_registry = CellRegistry()
+
+
+#returns a CellProfile given either a profile or the name of a cell in the registry
+def get_cell(cell):
+    if isinstance(cell, CellProfile):
+        return cell
+    return cell_registry.get(cell)
@@ -1,5 +1,6 @@
 import numpy as np
 from typing import Type
+from functools import lru_cache
 
 ######################### CONSTANTS #########################
 
@@ -49,6 +50,10 @@ d2_resonance_f = 3.842306E+14 #pressure shifted for cell 309A
 #this is for the coils used in the front room set up
 b_const = ((4 / 5)**(3/2)) * 4E-3 * np.pi
 
+#the part of the optical length term that does not depend on the optical length
+#ol = [18 * m_e * h * c / (q_e^2 * mu_b)] / o_len
+ol_const = (18 * m_electron * h * light_speed) / (q_electron**2 * mu_b)
+
 ######################## FUNCTIONS #################################
 
 #given the laser frequency, returns the difference from D1 resonance
@@ -69,40 +74,97 @@ def get_laser_f(laser_lambda):
     laser_f = light_speed/laser_lambda
     return laser_f
 
-#given laser wavelength, return the delta term in the density calculation
-def delta_term(laser_wavelen):
-    laser_fr = get_laser_f(laser_wavelen)
-    D1 = get_Delta_D1(laser_fr)
+#given the laser frequency and the D1/D2 resonance frequencies, return the delta term
+#works on numpy arrays, broadcasting the three inputs together
+def delta_term_from_f(laser_fr, d1_f, d2_f):
+    D1 = d1_f - laser_fr
     D1_sq = D1**2
-    D2 = get_Delta_D2(laser_fr)
+    D2 = d2_f - laser_fr
     D2_sq = D2**2
     delta_numerator = D1_sq * D2_sq
     delta_denominator = (4 * D2_sq) + (7 * D1_sq) - (2 * D1 * D2)
     delta_term = delta_numerator/delta_denominator
     return delta_term
 
+#single wavelengths are cached, since a trial is analyzed at one wavelength over and over
+#the resonances are part of the key so changing the module constants does not give stale values
+@lru_cache(maxsize=1024)
+def _delta_term_scalar(laser_wavelen, d1_f, d2_f):
+    return float(delta_term_from_f(get_laser_f(laser_wavelen), d1_f, d2_f))
+
+#given laser wavelength, return the delta term in the density calculation
+#laser_wavelen can be a number or a numpy array of wavelengths
+#the resonances default to the module constants, pass a cell's resonances to use those instead (see cells.py)
+def delta_term(laser_wavelen, d1_f=None, d2_f=None):
+    d1_f = d1_resonance_f if d1_f is None else d1_f
+    d2_f = d2_resonance_f if d2_f is None else d2_f
+    wl = np.asarray(laser_wavelen, dtype=float)
+    if wl.ndim == 0:
+        return _delta_term_scalar(float(wl), float(d1_f), float(d2_f))
+    return delta_term_from_f(get_laser_f(wl), d1_f, d2_f)
+
 #given optical path length return optical path term in density caculation
 def optical_length_term(o_len):
-    ol_numerator = 18 * m_electron * h * light_speed
-    ol_denominator = o_len * q_electron**2 * mu_b
-    ol = ol_numerator/ol_denominator
+    ol = ol_const/np.asarray(o_len, dtype=float)
     return ol
 
 #given the slope of the rotation vs magnetic field graph, the optical path length 
 #and the laser wavelength, return the density of rubidium in the cell
-def rb_density(slope, o_len, laser_wave):
+#if a cell (a CellProfile or the name of one in the cell registry) is given, its resonances are
+#used, and its optical length when o_len is None
+def rb_density(slope, o_len, laser_wave, cell=None):
+    if cell is not None:
+        from .cells import get_cell #cells imports this module
+        return slope * get_cell(cell).density_factor(laser_wave, o_len)
     deltas_term = delta_term(laser_wave)
     opt_len_term = optical_length_term(o_len)
     density = slope * opt_len_term * deltas_term
     return density
 
+def rb_density_batch(slopes, o_lens, wavelengths, cell=None):
+    """
+    Calculates the rubidium density for many slopes at once.
+
+    The three inputs are broadcast together like any numpy operation. The delta and
+    optical length terms are computed on the inputs before broadcasting, so for a
+    wavelength scan pass the wavelengths with a shape like (num_wavelengths, 1) and
+    the slopes with shape (num_wavelengths, num_slopes); each delta term is then
+    computed once per wavelength, not once per slope.
+
+    Parameters
+    ----------
+    slopes : numpy array
+        Slopes of rotation (radians) vs magnetic field (Gauss).
+    o_lens : numpy array or float
+        Optical path lengths through the cell (cm).
+    wavelengths : numpy array or float
+        Probe laser wavelengths (cm).
+    cell : CellProfile or string
+        The cell (or its name in the cell registry) whose resonances to use. Set to None
+        by default, which uses the resonances in this module.
+
+    Returns
+    -------
+    densities : numpy array
+        The density for every combination, with the broadcast shape of the inputs.
+    """
+
+    slopes = np.asarray(slopes, dtype=float)
+    if cell is not None:
+        from .cells import get_cell #cells imports this module
+        return slopes * get_cell(cell).density_factor(wavelengths, o_lens)
+    deltas_term = delta_term(wavelengths)
+    opt_len_term = optical_length_term(o_lens)
+    densities = slopes * (opt_len_term * deltas_term)
+    return densities
+
 #given a current value, number of coil turns, and radius of coil,
 #returns the strength of the magnetic field, in Gauss
 #for original helmholtz coils
 def convertItoB(current):
     num_turns = 110
     radius = 0.21 #meters
-    b_field = b_const*float(current)*num_turns/radius
+    b_field = b_const*np.asarray(current, dtype=float)*num_turns/radius
     return b_field
 
 #this is to get the magnetic field for the mainroom set up
@@ -114,13 +176,13 @@ def convertItoB_mainroom_DEPRICATED(current):
     #bfield =  2.081*float(current) - 0.07857 
 
     #calculates B from helmholtz coil eqn
-    bfield = b_const*float(current)*num_turns/radius
+    bfield = b_const*np.asarray(current, dtype=float)*num_turns/radius
     return bfield
 
 #this is to get the magnetic field for the mainroom set up
 #based on EPR data
 def convertItoB_mainroom(current):
-    bfield = float(current) * 2.17
+    bfield = np.asarray(current, dtype=float) * 2.17
     return bfield
 
 #given a voltage readout, the voltage at 0 field, and a conversion factor,
@@ -135,7 +197,7 @@ def convertVtoRot(voltage, noB_voltage, conversion):
 # the rotation value (in degrees, should be ~.4 degrees typically)
 # returns an array containing the conversion factor in radians
 def calculateRotationConversionFactor(voltage_diff, cal_rot):
-    cal_rot_Radians = float(cal_rot) * (np.pi/180)
+    cal_rot_Radians = np.asarray(cal_rot, dtype=float) * (np.pi/180)
     conversion_factor = cal_rot_Radians/voltage_diff
     return conversion_factor
 
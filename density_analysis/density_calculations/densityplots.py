@@ -1,7 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
-import ZZ_depricated_remove_eventually.plotSettings as ps
+from . import plotSettings as ps
+from .linear_fit import weighted_line_fit, robust_line_fit, usable_sigma
+from .nonlinear_fit import fit_curve
+
+#pyplot is imported inside the functions that use it, so importing this
+#module (e.g. for fit_to_line in a batch job) does not load matplotlib
 
 
 
@@ -9,9 +12,24 @@ def Line(x, a, b):
     y = a*x + b
     return y
 
-def fit_to_line(data_to_fit):
-    param, pcov = curve_fit(Line, data_to_fit.x, data_to_fit.y)
-    linear_fit = [param, pcov]
+#the y errors to weight a fit by: only when the plotable has one for every point and they are all
+#above zero (hand-made test files have zero errors), like processing.fit_trial. Otherwise None (unweighted)
+def _y_sigma(data_to_fit):
+    y_error = data_to_fit.y_error
+    if y_error.size == data_to_fit.y.size and usable_sigma(y_error):
+        return y_error
+    return None
+
+#uses the closed form weighted least squares solution instead of curve_fit, weighted by the y errors (see _y_sigma)
+#robust="huber" or "tukey" down weights glitch points (see linear_fit.robust_line_fit),
+#then the weight of every point is added to the end of the list
+def fit_to_line(data_to_fit, robust=None):
+    sigma = _y_sigma(data_to_fit)
+    if robust is None:
+        slope, intercept, pcov = weighted_line_fit(data_to_fit.x, data_to_fit.y, sigma)
+        return [np.array([slope, intercept]), pcov]
+    slope, intercept, pcov, weights = robust_line_fit(data_to_fit.x, data_to_fit.y, sigma, robust)
+    linear_fit = [np.array([slope, intercept]), pcov, weights]
     return linear_fit
 
 def get_equation_linear(linear_fit):
@@ -21,25 +39,30 @@ def get_equation_linear(linear_fit):
     equation = 'y = ' + str(a) +'x + ' + str(b)
     return equation
 
-#functions for creating a plot with fit lines other than mx+b 
-def fit_to_ln(data_to_fit):
+#functions for creating a plot with fit lines other than mx+b
+#these use the Levenberg-Marquardt fits in nonlinear_fit (analytic jacobians and a starting guess made
+#from the data), weighted by the y errors like fit_to_line (see _y_sigma). p0 gives the starting parameters
+#instead, e.g. the fit of the previous trial. To fit many trials at once use nonlinear_fit.fit_curves
+
+def fit_to_ln(data_to_fit, p0=None):
     # Fit the function a * np.log(b * t) + c to x and y
-    param, pcov = curve_fit(lambda t, a, b, c: a * np.log(np.abs(b * t)) + c, data_to_fit.x, data_to_fit.y)
+    # only a*ln(|b|) + c is set by the data, so b comes back as 1
+    param, pcov = fit_curve("ln", data_to_fit.x, data_to_fit.y, _y_sigma(data_to_fit), p0)
     log_fit = [param, pcov]
     return log_fit
 
-def fit_to_sine(data_to_fit):
+def fit_to_sine(data_to_fit, p0=None):
     # Fit the function a * np.sin(b * t) + c to x and y
-    param, pcov = curve_fit(lambda t, a, b, c: a * np.sin(b * t) + c, data_to_fit.x, data_to_fit.y)
+    param, pcov = fit_curve("sine", data_to_fit.x, data_to_fit.y, _y_sigma(data_to_fit), p0)
     sine_fit = [param, pcov]
     return sine_fit
 
 def Gaussian(x, a, b, c, d):
-    gauss = a * np.exp((x-b) ** 2 / c) + d
+    gauss = a * np.exp(-(x-b) ** 2 / c) + d
     return gauss
 
-def fit_to_gaussian(data_to_fit):
-    param, pcov = curve_fit(Gaussian, data_to_fit.x, data_to_fit.y)
+def fit_to_gaussian(data_to_fit, p0=None):
+    param, pcov = fit_curve("gaussian", data_to_fit.x, data_to_fit.y, _y_sigma(data_to_fit), p0)
     gaussian_fit = [param, pcov]
     return gaussian_fit
 
@@ -76,6 +99,7 @@ def get_param_std(pcov):
     return perr
 
 def better_plot(settings):
+    import matplotlib.pyplot as plt
     # Plot
     ax = plt.axes()
     #ax.scatter(settings.data_set.x, settings.data_set.y, label='Raw data')
@@ -95,6 +119,7 @@ def better_plot(settings):
     ax.legend()
 
 def even_better_plot(settings):
+    import matplotlib.pyplot as plt
     # Plot
     ax = plt.axes()
     ax.scatter(settings.raw_data1.x, settings.raw_data1.y, color='black', label='Raw data')
@@ -112,6 +137,7 @@ def even_better_plot(settings):
 
 #like the other plots but just makes a nice scatter plot, no fits
 def basic_plot(settings):
+    import matplotlib.pyplot as plt
     # Plot
     ax = plt.axes()
     ax.scatter(settings.data_set.x, settings.data_set.y, label='Raw data')
@@ -127,6 +153,7 @@ def basic_plot(settings):
     
 #like the other plots but just makes a nice scatter plot, no fits
 def basic_plot(x, y):
+    import matplotlib.pyplot as plt
     # Plot    
     ax = plt.axes()
     ax.scatter(x, y, label='Raw data')
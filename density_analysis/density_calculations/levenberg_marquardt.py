@@ -0,0 +1,93 @@
+import numpy as np
+
+#the Levenberg-Marquardt loop behind resonance_fit and nonlinear_fit
+#many independent least squares fits are stepped together over arrays of shape (num_fits, num_points):
+#each fit has its own damping, and stops on its own once it converges or cannot improve
+
+
+#weighted residuals (model - y)*weights and their jacobian, with the points of weight 0 left out,
+#and the cost (sum of squared weighted residuals) of each fit
+def weighted_residuals(model, jac, y, weights):
+    valid = weights > 0
+    resid = np.where(valid, (model - y)*weights, 0.0)
+    jac = np.where(valid[..., None], jac*weights[..., None], 0.0)
+    return resid, jac, np.sum(resid**2, axis=-1)
+
+
+def levenberg_marquardt(residuals, p0, max_iter=200, ftol=1.0E-10, xtol=1.0E-10):
+    """
+    Fits many least squares problems at once by Levenberg-Marquardt.
+
+    Parameters
+    ----------
+    residuals : function
+        residuals(p) takes parameters with shape (num_fits, num_params) and returns the weighted
+        residuals (num_fits, num_points), their jacobian (num_fits, num_points, num_params) and the
+        cost of each fit (num_fits,), e.g. from weighted_residuals.
+    p0 : numpy array
+        The starting parameters, shape (num_fits, num_params). Fits that start from parameters
+        (or a cost) that are not finite are left where they are and never converge.
+    max_iter : int
+        Maximum number of iterations.
+    ftol, xtol : float
+        A fit has converged when an accepted step changes the cost or the parameters by less than this.
+
+    Returns
+    -------
+    p : numpy array
+        The best parameters found for each fit.
+    cov : numpy array
+        The inverse of J^T J at p (shape (num_fits, num_params, num_params)), the covariance before
+        it is scaled by the reduced chi squared.
+    cost : numpy array
+        The sum of squared weighted residuals at p.
+    converged : numpy array
+        Whether each fit converged.
+    iterations : numpy array
+        The number of iterations each fit took.
+    """
+
+    num_fits, num_params = p0.shape
+    p = p0.copy()
+    lam = np.full(num_fits, 1.0E-3)
+    active = np.all(np.isfinite(p), axis=-1)
+    converged = np.zeros(num_fits, dtype=bool)
+    iterations = np.zeros(num_fits, dtype=int)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        resid, jac, cost = residuals(p)
+        active &= np.isfinite(cost)
+        for it in range(max_iter):
+            if not active.any():
+                break
+            jac_t = jac.transpose(0, 2, 1)
+            jtj = jac_t @ jac
+            grad = (jac_t @ resid[..., None])[..., 0]
+            #marquardt damping, scaled by the diagonal (the tiny term keeps empty fits solvable)
+            diag = np.diagonal(jtj, axis1=1, axis2=2) + 1.0E-30
+            damped = jtj + (lam[:, None]*diag)[:, :, None]*np.eye(num_params)
+            damped[~active] = np.eye(num_params)
+            step = np.linalg.solve(damped, -grad[..., None])[..., 0]
+            step[~active] = 0.0
+
+            p_new = p + step
+            resid_new, jac_new, cost_new = residuals(p_new)
+            better = active & np.isfinite(cost_new) & (cost_new <= cost)
+
+            small_cost_change = (cost - cost_new) <= ftol*cost
+            small_step = np.all(np.abs(step) <= xtol*(np.abs(p) + xtol), axis=-1)
+            done = better & (small_cost_change | small_step)
+
+            p[better] = p_new[better]
+            resid[better] = resid_new[better]
+            jac[better] = jac_new[better]
+            cost[better] = cost_new[better]
+            lam = np.where(better, lam/10, lam*10)
+            iterations[active] = it + 1
+
+            converged |= done
+            #stop fits that have converged or cannot find a better step
+            active &= ~done & (lam < 1.0E12)
+
+        cov = np.linalg.pinv(jac.transpose(0, 2, 1) @ jac)
+    return p, cov, cost, converged, iterations
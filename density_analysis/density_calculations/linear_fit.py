@@ -0,0 +1,261 @@
+import numpy as np
+
+#closed form weighted least squares for y = slope*x + intercept
+#every function here works on the last axis, so a stack of trials with shape (num_trials, num_points)
+#is fit in one call. Points where x, y or sigma is NaN are left out of the fit, which is how
+#trials with different numbers of points are stacked together (see pad_trials)
+
+
+def pad_trials(arrays, fill=np.nan):
+    """
+    Stacks a list of 1D arrays of different lengths into one 2D array.
+
+    Parameters
+    ----------
+    arrays : list of numpy arrays
+        One array per trial.
+    fill : float
+        The value used to pad the shorter trials. Defaults to NaN, which the fitting
+        functions treat as a missing point.
+
+    Returns
+    -------
+    padded : numpy array
+        Array with shape (number of trials, length of the longest trial).
+    """
+
+    lengths = np.array([len(a) for a in arrays], dtype=int)
+    padded = np.full((len(arrays), lengths.max(initial=0)), fill, dtype=float)
+    for i, a in enumerate(arrays):
+        padded[i, :lengths[i]] = a
+    return padded
+
+
+def pad_segments(values, offsets, fill=np.nan):
+    """
+    Like pad_trials, for trials stored one after another in a single flat array (see trial_set.TrialSet).
+
+    Parameters
+    ----------
+    values : numpy array
+        The points of every trial, one trial after another.
+    offsets : numpy array
+        Where each trial starts in values, with the total number of points at the end.
+    fill : float
+        The value used to pad the shorter trials. Defaults to NaN.
+
+    Returns
+    -------
+    padded : numpy array
+        Array with shape (number of trials, length of the longest trial).
+    """
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    width = np.arange(lengths.max(initial=0))
+    inside = width < lengths[:, None]
+    index = np.where(inside, offsets[:-1, None] + width, 0)
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return np.full(inside.shape, fill, dtype=float)
+    return np.where(inside, values[index], fill)
+
+
+#whether a trial can be weighted by its errors: only if every one of them is above 0
+#(hand-made test files have 0 errors), shape (...) for sigma of shape (..., num_points)
+def usable_sigma(sigma):
+    return np.all(np.asarray(sigma) > 0, axis=-1)
+
+
+def weighted_line_fit(x, y, sigma=None, absolute_sigma=False):
+    """
+    Fits y = slope*x + intercept by weighted least squares, using the analytic solution.
+
+    Gives the same answer as scipy.optimize.curve_fit on a straight line, without iterating.
+    x, y and sigma are broadcast together and fit along the last axis, so stacked
+    trials are all fit at once.
+
+    Parameters
+    ----------
+    x : numpy array
+        The independent values (e.g. magnetic field in Gauss), shape (..., num_points).
+    y : numpy array
+        The dependent values (e.g. rotation in radians), shape (..., num_points).
+    sigma : numpy array
+        The error on each y value (e.g. the Rotation Standard Deviation column). Points are
+        weighted by 1/sigma**2. Set to None by default, which weights every point equally.
+    absolute_sigma : bool
+        Same meaning as in curve_fit. If False (default) the covariance is scaled by the
+        reduced chi squared, so only the relative size of sigma matters.
+
+    Returns
+    -------
+    slope : numpy array or float
+        The best fit slope for each trial.
+    intercept : numpy array or float
+        The best fit y-intercept for each trial.
+    cov : numpy array
+        The covariance matrix of [slope, intercept] for each trial, shape (..., 2, 2).
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if sigma is None:
+        sigma = np.ones_like(y)
+    sigma = np.asarray(sigma, dtype=float)
+    x, y, sigma = np.broadcast_arrays(x, y, sigma)
+
+    #missing points get zero weight
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(sigma)
+    w = np.where(valid, 1/np.where(valid, sigma, 1)**2, 0.0)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    #all-missing trials (e.g. padding rows) come out as NaN instead of warning
+    with np.errstate(divide="ignore", invalid="ignore"):
+        #center x and y on their weighted means so the sums do not lose precision
+        s = w.sum(axis=-1)
+        x_mean = (w*x).sum(axis=-1)/s
+        y_mean = (w*y).sum(axis=-1)/s
+        dx = np.where(valid, x - x_mean[..., None], 0.0)
+        dy = np.where(valid, y - y_mean[..., None], 0.0)
+        sxx = (w*dx*dx).sum(axis=-1)
+        sxy = (w*dx*dy).sum(axis=-1)
+
+        slope = sxy/sxx
+        intercept = y_mean - slope*x_mean
+
+        cov = np.empty(slope.shape + (2, 2))
+        cov[..., 0, 0] = 1/sxx
+        cov[..., 0, 1] = -x_mean/sxx
+        cov[..., 1, 0] = cov[..., 0, 1]
+        cov[..., 1, 1] = 1/s + x_mean**2/sxx
+
+        if not absolute_sigma:
+            residuals = np.where(valid, dy - slope[..., None]*dx, 0.0)
+            chisq = (w*residuals**2).sum(axis=-1)
+            dof = valid.sum(axis=-1) - 2
+            reduced_chisq = np.where(dof > 0, chisq/dof, np.inf)
+            cov = cov*reduced_chisq[..., None, None]
+
+    return slope, intercept, cov
+
+
+#the errors on slope and intercept from the covariance matrix, shape (..., 2)
+def line_fit_errors(cov):
+    return np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+
+
+#tuning constants for 95% efficiency on gaussian noise
+ROBUST_TUNING = {"huber": 1.345, "tukey": 4.685}
+
+
+#robust weights for residuals already divided by the robust scale and the tuning constant
+def _robust_weights(u, loss):
+    au = np.abs(u)
+    if loss == "huber":
+        return np.where(au <= 1, 1.0, 1/np.where(au <= 1, 1.0, au))
+    return np.where(au < 1, (1 - u**2)**2, 0.0)
+
+
+#median of each row ignoring NaN, by sorting (NaN sorts to the end), much faster than np.nanmedian on many short rows
+#the result keeps the last axis (length 1), like np.nanmedian(a, axis=-1, keepdims=True)
+def row_median(a):
+    a = np.sort(a, axis=-1)
+    n = np.isfinite(a).sum(axis=-1, keepdims=True)
+    lo = np.take_along_axis(a, np.maximum((n - 1)//2, 0), axis=-1)
+    hi = np.take_along_axis(a, np.maximum(n//2, 0), axis=-1)
+    return np.where(n > 0, 0.5*(lo + hi), np.nan)
+
+
+#1.4826*MAD of each row of standardized residuals, the standard deviation for gaussian noise
+#a scale at rounding level means most points are exactly on the line, then any point clearly off it is
+#an outlier, so the scale is kept above floor (the rounding error of the data) instead of going to 0
+def _robust_scale(r, floor):
+    scale = 1.4826*row_median(np.abs(r - row_median(r)))
+    return np.maximum(scale, floor)
+
+
+def robust_line_fit(x, y, sigma=None, loss="huber", tuning=None, max_iter=50, tol=1.0E-3, absolute_sigma=False):
+    """
+    Fits y = slope*x + intercept with outlier points down weighted, by iteratively reweighted least squares.
+
+    Works on stacked trials like weighted_line_fit: every iteration is one weighted_line_fit call
+    on all the trials that have not converged yet, so a large reanalysis costs a few ordinary fits
+    instead of a loop over trials. The residuals (divided by sigma) are scaled by their median
+    absolute deviation in each trial, then weighted with the Huber or Tukey biweight function.
+    Tukey fits start from the Huber fit.
+
+    Parameters
+    ----------
+    x : numpy array
+        The independent values, shape (..., num_points).
+    y : numpy array
+        The dependent values, shape (..., num_points).
+    sigma : numpy array
+        The error on each y value. Set to None by default, which weights every point equally.
+    loss : string
+        "huber" (default) only reduces the weight of outliers, "tukey" can reject them completely.
+    tuning : float
+        The tuning constant, in robust standard deviations. Defaults to ROBUST_TUNING[loss].
+    max_iter : int
+        Maximum number of reweighting iterations.
+    tol : float
+        A trial has converged when its slope and intercept change by less than this fraction of their errors.
+    absolute_sigma : bool
+        Same meaning as in weighted_line_fit.
+
+    Returns
+    -------
+    slope : numpy array or float
+        The robust slope for each trial.
+    intercept : numpy array or float
+        The robust y-intercept for each trial.
+    cov : numpy array
+        The covariance matrix of [slope, intercept] for each trial from the final weighted fit, shape (..., 2, 2).
+    weights : numpy array
+        The robust weight of every point, from 1 (normal) to 0 (rejected), NaN for missing points.
+    """
+
+    if loss not in ROBUST_TUNING:
+        raise ValueError("unknown robust loss " + str(loss) + ", use one of " + ", ".join(ROBUST_TUNING))
+    c = ROBUST_TUNING[loss] if tuning is None else tuning
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if sigma is None:
+        sigma = np.ones_like(y)
+    x, y, sigma = np.broadcast_arrays(x, y, np.asarray(sigma, dtype=float))
+    #work on a 2D stack of trials, reshaped back at the end
+    shape = y.shape
+    num_trials = int(np.prod(shape[:-1]))
+    x, y, sigma = [a.reshape(num_trials, shape[-1]) for a in (x, y, sigma)]
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(sigma)
+
+    if loss == "tukey":
+        slope, intercept, cov, _ = robust_line_fit(x, y, sigma, "huber", None, max_iter, tol, absolute_sigma)
+    else:
+        slope, intercept, cov = weighted_line_fit(x, y, sigma, absolute_sigma)
+    weights = np.where(valid, 1.0, np.nan)
+    active = np.isfinite(slope)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        floor = 1.0E-10*np.nanmax(np.where(valid, np.abs(y/sigma), np.nan), axis=-1, keepdims=True, initial=0.0)
+        floor = np.maximum(floor, np.finfo(float).tiny)
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            xa, ya, sa = x[active], y[active], sigma[active]
+            r = np.where(valid[active], (ya - slope[active, None]*xa - intercept[active, None])/sa, np.nan)
+            w = np.where(valid[active], _robust_weights(r/(c*_robust_scale(r, floor[active])), loss), np.nan)
+            #a weight of 0 gives an infinite sigma, which weighted_line_fit leaves out
+            new_slope, new_intercept, new_cov = weighted_line_fit(xa, ya, sa/np.sqrt(w), absolute_sigma)
+            #converged once the fit moves by a small fraction of its own uncertainty
+            err = line_fit_errors(new_cov)
+            done = ((np.abs(new_slope - slope[active]) <= tol*err[:, 0])
+                    & (np.abs(new_intercept - intercept[active]) <= tol*err[:, 1]))
+            slope[active], intercept[active], cov[active], weights[active] = new_slope, new_intercept, new_cov, w
+            active[active] = ~done & np.isfinite(new_slope)
+
+    #[()] turns the results for a single trial back into numbers, like weighted_line_fit
+    return slope.reshape(shape[:-1])[()], intercept.reshape(shape[:-1])[()], cov.reshape(shape[:-1] + (2, 2)), weights.reshape(shape)
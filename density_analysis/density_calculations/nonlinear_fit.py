@@ -0,0 +1,368 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .levenberg_marquardt import levenberg_marquardt, weighted_residuals
+from .linear_fit import pad_trials, row_median
+
+#Levenberg-Marquardt fits (see levenberg_marquardt.py) of the curves in densityplots (ln, sine and gaussian) with analytic jacobians
+#many data sets are fit at the same time over arrays of shape (num_fits, num_points), padded with NaN
+#when they have different lengths (see pad_trials), and chunks of fits can be spread over a process pool.
+#every fit starts from a guess made from its own data (or a given p0); fits that do not converge, or end up
+#far worse than the rest (see POOR_FIT_FACTOR), are tried again starting from the solutions of the nearest
+#good fits before and after them (warm start), which is what usually works for a run of trials taken one after another
+
+#the parameters of each model, in the order they are returned
+#   ln:       y = a*ln(|b*x|) + c
+#   sine:     y = a*sin(b*x) + c
+#   gaussian: y = a*exp(-(x - b)^2/c) + d
+NONLINEAR_MODELS = {
+    "ln": ("a", "b", "c"),
+    "sine": ("a", "b", "c"),
+    "gaussian": ("a", "b", "c", "d")
+}
+
+NONLINEAR_FIT_COLUMNS = [
+    "Parameters", "Parameter Errors", "Covariance", "Reduced Chi Squared", "Converged", "Iterations", "Warm Started"
+]
+
+#a converged fit whose reduced chi squared is more than this many times the median of the converged fits
+#is tried again from its neighbours' solutions (it most likely found a local minimum)
+POOR_FIT_FACTOR = 10.0
+
+#frequencies tried around the FFT peak for the sine starting guess, spread over +-2 FFT bins
+_SINE_GUESS_FREQUENCIES = 17
+
+
+#model values and jacobian (shape (num_fits, num_points, num_params)) for parameters p with shape (num_fits, num_params)
+#a*ln(|b*x|) + c = a*ln(|x|) + (a*ln(|b|) + c), so b and c cannot both be fit: the ln model is fit with b = 1
+#and only a and c (see _to_fitted and _from_fitted)
+def _ln_model(x, p):
+    log_x = np.log(np.abs(x))
+    jac = np.empty(x.shape + (2,))
+    jac[..., 0] = log_x
+    jac[..., 1] = 1.0
+    return p[:, 0:1]*log_x + p[:, 1:2], jac
+
+
+def _sine_model(x, p):
+    bx = p[:, 1:2]*x
+    sin_bx = np.sin(bx)
+    jac = np.empty(x.shape + (3,))
+    jac[..., 0] = sin_bx
+    jac[..., 1] = p[:, 0:1]*x*np.cos(bx)
+    jac[..., 2] = 1.0
+    return p[:, 0:1]*sin_bx + p[:, 2:3], jac
+
+
+def _gaussian_model(x, p):
+    a, b, c = p[:, 0:1], p[:, 1:2], p[:, 2:3]
+    dx = x - b
+    e = np.exp(-dx**2/c)
+    jac = np.empty(x.shape + (4,))
+    jac[..., 0] = e
+    jac[..., 1] = a*e*2*dx/c
+    jac[..., 2] = a*e*dx**2/c**2
+    jac[..., 3] = 1.0
+    return a*e + p[:, 3:4], jac
+
+
+_MODEL_FUNCTIONS = {"ln": _ln_model, "sine": _sine_model, "gaussian": _gaussian_model}
+
+
+#the parameters that are actually fit, from the ones that are returned (only ln differs)
+def _to_fitted(model, p):
+    if model != "ln":
+        return p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.stack([p[:, 0], p[:, 0]*np.log(np.abs(p[:, 1])) + p[:, 2]], axis=-1)
+
+
+#the returned parameters and covariance from the fitted ones, for ln b is 1 and has no error
+def _from_fitted(model, p, cov):
+    if model != "ln":
+        return p, cov
+    full_p = np.stack([p[:, 0], np.ones(len(p)), p[:, 1]], axis=-1)
+    full_cov = np.zeros((len(p), 3, 3))
+    full_cov[:, 0::2, 0::2] = cov
+    return full_p, full_cov
+
+
+#every row linearly interpolated (like np.interp) onto m evenly spaced points from its x_min to its x_max,
+#0 for rows with fewer than 2 points. The rows are laid end to end on one increasing axis (row i scaled onto
+#[2i, 2i + 1], its missing points at 2i + 1.5) so a single searchsorted finds the points around every grid point
+def _resample_rows(x, y, valid, x_min, x_max, m):
+    num_fits, num_points = y.shape
+    num_valid = valid.sum(axis=-1)
+    ok = (num_valid >= 2) & (x_max > x_min)
+    span = np.where(ok, x_max - x_min, 1.0)[:, None]
+    start = np.where(ok, x_min, 0.0)[:, None]
+    order = np.argsort(np.where(valid, x, np.inf), axis=-1)
+    xs = np.take_along_axis(x, order, axis=-1)
+    ys = np.take_along_axis(y, order, axis=-1)
+    row_start = 2.0*np.arange(num_fits)[:, None]
+    keys = row_start + np.where(np.take_along_axis(valid, order, axis=-1), (xs - start)/span, 1.5)
+    grid = np.linspace(0, 1, m)
+    #the last point at or before each grid point, kept where it and the next one are both points of the row
+    lo = np.searchsorted(keys.ravel(), (row_start + grid).ravel(), side="right").reshape(num_fits, m) - 1
+    lo = np.clip(lo - num_points*np.arange(num_fits)[:, None], 0, np.maximum(num_valid - 2, 0)[:, None])
+    hi = np.minimum(lo + 1, num_points - 1)
+    x0, x1 = np.take_along_axis(xs, lo, axis=-1), np.take_along_axis(xs, hi, axis=-1)
+    y0, y1 = np.take_along_axis(ys, lo, axis=-1), np.take_along_axis(ys, hi, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = np.where(x1 > x0, (start + grid*span - x0)/(x1 - x0), 0.0)
+    return np.where(ok[:, None], y0 + frac*(y1 - y0), 0.0)
+
+
+#the model has no phase, so the strongest frequency of the data (from an FFT of it resampled on an even grid)
+#is refined by trying the frequencies around it and keeping the one whose a*sin(b*x) + c fits best
+def _sine_guess(x, y, valid, x_min, x_max):
+    num_fits, num_points = y.shape
+    num_valid = valid.sum(axis=-1)
+    m = 1 << int(np.ceil(np.log2(max(num_points, 2))))
+    resampled = _resample_rows(x, y, valid, x_min, x_max, m)
+    resampled -= resampled.mean(axis=-1, keepdims=True)
+    #zero padded 4 times for finer frequency bins, the constant term is left out
+    power = np.abs(np.fft.rfft(resampled, n=4*m, axis=-1))**2
+    power[:, 0] = 0
+    bin_width = 2*np.pi*(m - 1)/(4*m*np.where(x_max > x_min, x_max - x_min, 1.0))
+    b_peak = power.argmax(axis=-1)*bin_width
+
+    best_score = np.full(num_fits, -1.0)
+    a0, b0 = np.zeros(num_fits), b_peak.copy()
+    y_mean = y.sum(axis=-1)/num_valid
+    yc = np.where(valid, y - y_mean[:, None], 0.0)
+    for offset in np.linspace(-2, 2, _SINE_GUESS_FREQUENCIES):
+        b = np.maximum(b_peak + offset*bin_width, 0.25*bin_width)
+        #least squares a (and c) for this b: the sines are centered like the data
+        s = np.where(valid, np.sin(b[:, None]*x), 0.0)
+        s = np.where(valid, s - (s.sum(axis=-1)/num_valid)[:, None], 0.0)
+        proj = (yc*s).sum(axis=-1)
+        norm = (s*s).sum(axis=-1)
+        score = np.where(norm > 0, proj**2/np.where(norm > 0, norm, 1.0), 0.0)
+        better = score > best_score
+        best_score = np.where(better, score, best_score)
+        b0 = np.where(better, b, b0)
+        a0 = np.where(better, proj/np.where(norm > 0, norm, 1.0), a0)
+    #c follows from a: the mean of y - a*sin(b*x)
+    c0 = (np.where(valid, y - a0[:, None]*np.sin(b0[:, None]*x), 0.0)).sum(axis=-1)/num_valid
+    return np.stack([a0, b0, c0], axis=-1)
+
+
+#starting parameters made from the data of each fit, x and y are 0 where valid is False
+def _guess(model, x, y, valid):
+    num_valid = valid.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y_mean = y.sum(axis=-1)/num_valid
+        if model == "ln":
+            return np.stack([np.zeros(len(y)), y_mean], axis=-1)
+
+        x_min = np.where(valid, x, np.inf).min(axis=-1)
+        x_max = np.where(valid, x, -np.inf).max(axis=-1)
+        if model == "sine":
+            return _sine_guess(x, y, valid, x_min, x_max)
+
+        #gaussian: the peak is whichever of the highest or lowest point is further from the median,
+        #the baseline is the other extreme, and the width comes from the second moment of the peak
+        y_hi = np.where(valid, y, -np.inf)
+        y_lo = np.where(valid, y, np.inf)
+        i_hi, i_lo = y_hi.argmax(axis=-1), y_lo.argmin(axis=-1)
+        rows = np.arange(len(y))
+        hi, lo = y_hi[rows, i_hi], y_lo[rows, i_lo]
+        y_med = row_median(np.where(valid, y, np.nan))[..., 0]
+        peak_up = (hi - y_med) >= (y_med - lo)
+        a0 = np.where(peak_up, hi - lo, lo - hi)
+        b0 = np.where(peak_up, x[rows, i_hi], x[rows, i_lo])
+        d0 = np.where(peak_up, lo, hi)
+        u = np.where(valid, np.clip((y - d0[:, None])/np.where(a0 != 0, a0, 1.0)[:, None], 0, 1), 0.0)
+        c0 = 2*(u*(x - b0[:, None])**2).sum(axis=-1)/u.sum(axis=-1)
+        fallback = ((x_max - x_min)/4)**2
+        c0 = np.where(np.isfinite(c0) & (c0 > 0), c0, np.where(fallback > 0, fallback, 1.0))
+        return np.stack([a0, b0, c0, d0], axis=-1)
+
+
+#fits one chunk of rows from their starting parameters
+def _fit_chunk(args):
+    (model, x, y, weights, p, max_iter, ftol, xtol) = args
+    model_fn = _MODEL_FUNCTIONS[model]
+
+    def residuals(p):
+        values, jac = model_fn(x, p)
+        return weighted_residuals(values, jac, y, weights)
+
+    return levenberg_marquardt(residuals, p, max_iter, ftol, xtol)
+
+
+#fits every row, in chunks spread over the pool (or in this process)
+def _fit_rows(model, x, y, weights, p0, max_iter, ftol, xtol, pool, chunk_size):
+    jobs = []
+    for start in range(0, len(y), chunk_size):
+        s = slice(start, start + chunk_size)
+        jobs.append((model, x[s], y[s], weights[s], p0[s], max_iter, ftol, xtol))
+    if pool is not None and len(jobs) > 1:
+        chunks = list(pool.map(_fit_chunk, jobs))
+    else:
+        chunks = [_fit_chunk(job) for job in jobs]
+    return [np.concatenate(parts) for parts in zip(*chunks)]
+
+
+#for every fit, the index of the nearest good fit before and after it (-1 if there is none)
+def _good_neighbours(good):
+    index = np.arange(len(good))
+    previous = np.maximum.accumulate(np.where(good, index, -1))
+    following = np.minimum.accumulate(np.where(good, index, len(good))[::-1])[::-1]
+    following = np.where(following < len(good), following, -1)
+    return previous, following
+
+
+def fit_curves(model, x, y, sigma=None, p0=None, absolute_sigma=False, warm_start=True, max_iter=200,
+               ftol=1.0E-10, xtol=1.0E-10, workers=1, chunk_size=256):
+    """
+    Fits one of the densityplots curves to many data sets at once.
+
+    Parameters
+    ----------
+    model : string
+        "ln", "sine" or "gaussian" (see NONLINEAR_MODELS). For "ln" only a*ln(|b|) + c can be found
+        from the data, so b is returned as 1 with c holding the rest (the same curve).
+    x : numpy array or list of arrays
+        The x values of every data set, shape (num_fits, num_points). A list of arrays of different
+        lengths (one per data set) is padded with NaN. A single 1D data set also works.
+    y : numpy array or list of arrays
+        The y values, same shape as x.
+    sigma : numpy array or list of arrays
+        The error on each y value. Set to None by default, which weights every point equally.
+    p0 : numpy array
+        Starting parameters, one set for every fit (shape (num_fits, num_params)) or one for all of them,
+        e.g. the results of a previous run. Set to None by default, which makes a guess from each data set.
+    absolute_sigma : bool
+        Same meaning as in curve_fit. If False (default) the covariance is scaled by the reduced chi squared.
+    warm_start : bool
+        If True (default) fits that do not converge, or whose reduced chi squared is more than POOR_FIT_FACTOR
+        times the median, are tried again starting from the solutions of the nearest good fits before and
+        after them, so pass the data sets in the order they were taken.
+    max_iter : int
+        Maximum number of Levenberg-Marquardt iterations.
+    ftol, xtol : float
+        A fit has converged when an accepted step changes the cost or the parameters by less than this.
+    workers : int
+        Number of processes to spread the fits over. Defaults to 1 (no process pool).
+    chunk_size : int
+        Number of fits done together in one process.
+
+    Returns
+    -------
+    fit_results : dict
+        "Parameters" (num_fits, num_params), "Parameter Errors" (num_fits, num_params),
+        "Covariance" (num_fits, num_params, num_params), and the diagnostics "Reduced Chi Squared",
+        "Converged", "Iterations" and "Warm Started" (whether the result came from a neighbour's solution),
+        one value per fit.
+    """
+
+    if model not in NONLINEAR_MODELS:
+        raise ValueError("model must be one of "+", ".join(NONLINEAR_MODELS))
+
+    def as_rows(values):
+        if isinstance(values, (list, tuple)) and len(values) and np.ndim(values[0]) == 1:
+            return pad_trials(values)
+        return np.atleast_2d(np.asarray(values, dtype=float))
+
+    x = as_rows(x)
+    y = as_rows(y)
+    x, y = np.broadcast_arrays(x, y)
+    if sigma is None:
+        sigma = np.ones_like(y)
+    sigma = np.broadcast_to(as_rows(sigma), y.shape)
+    num_fits = y.shape[0]
+
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(sigma) & (sigma > 0)
+    if model == "ln":
+        valid &= x != 0
+    weights = np.where(valid, 1/np.where(valid, sigma, 1), 0.0)
+    x = np.where(valid, x, 1.0)
+    y = np.where(valid, y, 0.0)
+
+    if p0 is None:
+        p_start = _guess(model, x, y, valid)
+    else:
+        p0 = np.broadcast_to(np.asarray(p0, dtype=float), (num_fits, len(NONLINEAR_MODELS[model])))
+        p_start = _to_fitted(model, p0)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers is not None and workers > 1 else None
+    try:
+        p, cov, cost, converged, iterations = _fit_rows(model, x, y, weights, p_start, max_iter, ftol, xtol, pool, chunk_size)
+        warm_started = np.zeros(num_fits, dtype=bool)
+        if warm_start:
+            #a fit is poor if it did not converge, or if it settled somewhere much worse than the other fits
+            with np.errstate(divide="ignore", invalid="ignore"):
+                reduced_chisq = cost/np.maximum(valid.sum(axis=-1) - p.shape[1], 1)
+            good = converged & np.isfinite(reduced_chisq)
+            if good.any():
+                good &= reduced_chisq <= POOR_FIT_FACTOR*np.median(reduced_chisq[good])
+            poor = ~good
+            if good.any() and poor.any():
+                #try both neighbours and keep whichever start ends up with the lowest cost
+                for neighbour in _good_neighbours(good):
+                    retry = np.flatnonzero(poor & (neighbour >= 0))
+                    if len(retry) == 0:
+                        continue
+                    r_p, r_cov, r_cost, r_conv, r_iter = _fit_rows(model, x[retry], y[retry], weights[retry], p[neighbour[retry]],
+                                                                   max_iter, ftol, xtol, pool, chunk_size)
+                    improved = r_conv & (~converged[retry] | (r_cost < cost[retry]))
+                    take = retry[improved]
+                    p[take], cov[take], cost[take] = r_p[improved], r_cov[improved], r_cost[improved]
+                    converged[take] = True
+                    iterations[take] += r_iter[improved]
+                    warm_started[take] = True
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    num_params = p.shape[1]
+    dof = valid.sum(axis=-1) - num_params
+    converged &= dof >= 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reduced_chisq = np.where(dof > 0, cost/dof, np.nan)
+        if not absolute_sigma:
+            cov = cov*np.where(dof > 0, reduced_chisq, np.inf)[:, None, None]
+    p, cov = _from_fitted(model, p, cov)
+
+    fit_results = {
+        "Parameters": p,
+        "Parameter Errors": np.sqrt(np.diagonal(cov, axis1=1, axis2=2)),
+        "Covariance": cov,
+        "Reduced Chi Squared": reduced_chisq,
+        "Converged": converged,
+        "Iterations": iterations,
+        "Warm Started": warm_started
+    }
+    return fit_results
+
+
+def fit_curve(model, x, y, sigma=None, p0=None, absolute_sigma=False, max_iter=200, ftol=1.0E-10, xtol=1.0E-10):
+    """
+    Fits one data set, like scipy.optimize.curve_fit.
+
+    Parameters
+    ----------
+    model, x, y, sigma, p0, absolute_sigma, max_iter, ftol, xtol
+        The same as fit_curves, for a single 1D data set.
+
+    Returns
+    -------
+    param : numpy array
+        The best fit parameters.
+    pcov : numpy array
+        Their covariance matrix.
+
+    Raises
+    ------
+    RuntimeError
+        If the fit does not converge, like curve_fit.
+    """
+
+    fit_results = fit_curves(model, np.asarray(x, dtype=float), np.asarray(y, dtype=float), sigma, p0,
+                             absolute_sigma, False, max_iter, ftol, xtol)
+    if not fit_results["Converged"][0]:
+        raise RuntimeError("Optimal parameters not found: the "+model+" fit did not converge in "
+                           +str(fit_results["Iterations"][0])+" iterations")
+    return fit_results["Parameters"][0], fit_results["Covariance"][0]
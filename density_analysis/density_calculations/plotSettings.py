@@ -28,6 +28,10 @@ class plotable:
         Creates new plotable object.
     get_plotable_subset(self, type, index1, index2=None)
         Creates a subset of the original data. Typically used to drop off the first datapoint
+    find_in_Bfield_array(self, bfield, side="left")
+        Finds where a magnetic field value falls in the data sorted by field.
+    get_field_range(self, bfield_min=None, bfield_max=None)
+        Creates a subset with all the data between two magnetic field values, without copying it.
     """
     
     def __init__(self, x, y, laser_wavelength, optical_length, x_error = [], y_error = []):
@@ -63,6 +67,36 @@ class plotable:
         self.optical_length = optical_length
         self.x_error = np.array(x_error)
         self.y_error = np.array(y_error)
+        self._field_index = None
+
+    #makes a plotable that uses the given arrays as they are (no copy), for subsets made of slices
+    @classmethod
+    def _from_arrays(cls, x, y, x_error, y_error, laser_wavelength, optical_length):
+        subset = cls.__new__(cls)
+        subset.x = x
+        subset.y = y
+        subset.x_error = x_error
+        subset.y_error = y_error
+        subset.laser_wavelength = laser_wavelength
+        subset.optical_length = optical_length
+        subset._field_index = None
+        return subset
+
+    #the data sorted by magnetic field, built the first time a field query needs it and kept until x is replaced
+    #sweeps are usually recorded in field order already, then the index is just the original arrays
+    def _sorted_by_field(self):
+        index = getattr(self, "_field_index", None)
+        if index is not None and index[0] is self.x:
+            return index[1]
+        x = self.x
+        if x.size < 2 or np.all(x[1:] >= x[:-1]):
+            arrays = (x, self.y, self.x_error, self.y_error)
+        else:
+            order = np.argsort(x, kind="stable")
+            #error arrays are optional, an empty one stays empty
+            arrays = tuple(a[order] if a.size == x.size else a for a in (x, self.y, self.x_error, self.y_error))
+        self._field_index = (x, arrays)
+        return arrays
 
     def get_plotable_subset(self, type, index1, index2=None):
 
@@ -120,7 +154,7 @@ class plotable:
             #start index is location of value1
             start_index = index1
             #stop index is location of value2 plus 1
-            stop_index = self.find_in_Bfield_array(index2)+1
+            stop_index = index2+1
 
         subset.x = bfields[start_index:stop_index]
         subset.y = rotations[start_index:stop_index]
@@ -128,6 +162,64 @@ class plotable:
         subset.y_error = rotation_err[start_index:stop_index]
         
         return subset
+
+    def find_in_Bfield_array(self, bfield, side="left"):
+        """
+        Finds where a magnetic field value falls in the data sorted by field, with a binary search.
+
+        Parameters
+        ----------
+        self : plotable
+            The plotable object being searched.
+        bfield : float or numpy array
+            The magnetic field value(s) (in Gauss) to look for.
+        side : string
+            'left' gives the index of the first point with a field >= bfield,
+            'right' the index after the last point with a field <= bfield. Set to 'left' by default.
+
+        Returns
+        -------
+        int or numpy array
+            The index (or indices) in the field sorted data.
+        """
+
+        sorted_x = self._sorted_by_field()[0]
+        return np.searchsorted(sorted_x, bfield, side=side)
+
+    def get_field_range(self, bfield_min=None, bfield_max=None):
+        """
+        Creates a plotable with all the data whose magnetic field is between two values, e.g. to drop
+        the low field points or to refit a window of a sweep.
+
+        The new plotable's arrays are views of this plotable's field sorted data (no copies), sorted by field,
+        so changing them changes this plotable's data too.
+
+        Parameters
+        ----------
+        self : plotable
+            The plotable object being truncated.
+        bfield_min : float
+            The lowest magnetic field (in Gauss) to keep, INCLUDED. Set to None (no lower limit) by default.
+        bfield_max : float
+            The highest magnetic field (in Gauss) to keep, INCLUDED. Set to None (no upper limit) by default.
+
+        Returns
+        -------
+        plotable
+            Returns a plotable object containing the data in the field range.
+        """
+
+        x, y, x_error, y_error = self._sorted_by_field()
+        start_index = 0 if bfield_min is None else np.searchsorted(x, bfield_min, side="left")
+        stop_index = x.size if bfield_max is None else np.searchsorted(x, bfield_max, side="right")
+        stop_index = max(start_index, stop_index)
+        window = slice(start_index, stop_index)
+        subset = plotable._from_arrays(x[window], y[window], x_error[window] if x_error.size == x.size else x_error,
+                                       y_error[window] if y_error.size == x.size else y_error,
+                                       self.laser_wavelength, self.optical_length)
+        #a slice of sorted data is sorted, so the subset can use it as its own index
+        subset._field_index = (subset.x, (subset.x, subset.y, subset.x_error, subset.y_error))
+        return subset
         
 #settings for a plot with raw data scatter, and one fit line
 class plotSettings:
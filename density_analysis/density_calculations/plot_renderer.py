@@ -0,0 +1,171 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+#renders plots straight to image files without pyplot, so it needs no display and no global figure state
+#a PlotRenderer builds its figure and artists once and only swaps the data in them for every plot,
+#which is much faster than making a new figure each time. Each worker process keeps its own renderer
+#(see get_renderer), so plots can be rendered in parallel with render_plots.
+#matplotlib is imported when the first renderer is made, so importing this module stays cheap.
+
+
+class PlotRenderer:
+    """
+    A reusable figure for scatter plots with error bars, a fitted curve and a text box,
+    in the style of densityplots.better_plot.
+
+    Attributes
+    ----------
+    figure : matplotlib Figure
+        The figure, drawn with the Agg backend.
+    ax : matplotlib Axes
+        The axes every plot is drawn on.
+
+    Methods
+    -------
+    draw(self, x, y, y_err=None, fit_x=None, fit_y=None, title="", xlabel="", ylabel="", note="")
+        Puts new data in the plot.
+    save(self, path)
+        Writes the plot to an image file (the type comes from the extension, e.g. .png or .pdf).
+    """
+
+    def __init__(self, figsize=(8, 6), dpi=100):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        ax = self.ax
+        self.error_bars = LineCollection([], colors="b", linewidths=1)
+        ax.add_collection(self.error_bars)
+        (self.points,) = ax.plot([], [], "b.", label="Raw data")
+        (self.fit_line,) = ax.plot([], [], "black", label="Fitted curve")
+        self.note = ax.text(0.02, 0.97, "", transform=ax.transAxes, va="top", fontweight="bold")
+
+        #display grid lines
+        ax.minorticks_on()
+        ax.grid(which="major", color="green", linestyle="--", linewidth="1.0")
+        ax.grid(which="minor", linestyle=":", linewidth="0.5", color="black")
+
+    def draw(self, x, y, y_err=None, fit_x=None, fit_y=None, title="", xlabel="", ylabel="", note=""):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.points.set_data(x, y)
+        if y_err is not None and np.size(y_err) == y.size:
+            y_err = np.asarray(y_err, dtype=float)
+            self.error_bars.set_segments(np.stack([np.column_stack([x, y - y_err]), np.column_stack([x, y + y_err])], axis=1))
+            y_lo, y_hi = y - y_err, y + y_err
+        else:
+            self.error_bars.set_segments([])
+            y_lo, y_hi = y, y
+        if fit_x is not None:
+            self.fit_line.set_data(fit_x, fit_y)
+            self.fit_line.set_visible(True)
+            y_lo = np.concatenate([y_lo, np.asarray(fit_y, dtype=float)])
+            y_hi = np.concatenate([y_hi, np.asarray(fit_y, dtype=float)])
+        else:
+            self.fit_line.set_visible(False)
+
+        #the collection is not part of the automatic limits, so set them from the data
+        self.ax.set_xlim(*_padded_limits(x))
+        self.ax.set_ylim(*_padded_limits(np.concatenate([y_lo, y_hi])))
+        self.ax.set_title(title)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.note.set_text(note)
+        self.ax.legend(handles=[self.points] + ([self.fit_line] if fit_x is not None else []), loc="lower right")
+
+    def save(self, path):
+        self.figure.savefig(path)
+
+
+#data range with a 5% margin on each side
+def _padded_limits(values):
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return (0.0, 1.0)
+    lo, hi = values.min(), values.max()
+    pad = 0.05*(hi - lo) if hi > lo else max(abs(hi), 1.0)*0.05
+    return (lo - pad, hi + pad)
+
+
+#one renderer per process, made the first time it is needed
+_renderer = None
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = PlotRenderer()
+    return _renderer
+
+
+#draw arguments for a processed trial and its fit (see processing.fit_trial)
+def trial_plot(processed_data, fit_results, title=""):
+    x = processed_data["Magnetic Field (Gauss)"].to_numpy(dtype=float)
+    fit_x = np.linspace(np.nanmin(x), np.nanmax(x), 100)
+    note = ("Equation: y = " + f"{fit_results['Slope']:.4e}" + "x + " + f"{fit_results['Intercept']:.4e}"
+            + "\nDensity: " + f"{fit_results['Density']:.4e}" + " +/- " + f"{fit_results['Density Error']:.2e}")
+    return {
+        "x": x,
+        "y": processed_data["Rotation (Radians)"].to_numpy(dtype=float),
+        "y_err": processed_data["Rotation Standard Deviation"].to_numpy(dtype=float),
+        "fit_x": fit_x,
+        "fit_y": fit_results["Slope"]*fit_x + fit_results["Intercept"],
+        "title": title,
+        "xlabel": "Magnetic Field (Gauss)",
+        "ylabel": "Rotation (Radians)",
+        "note": note
+    }
+
+
+#draw arguments for one column of a summary table against another, e.g. density vs oven temperature
+def summary_plot(summary, x_column, y_column, err_column=None, title=""):
+    return {
+        "x": summary[x_column].to_numpy(dtype=float),
+        "y": summary[y_column].to_numpy(dtype=float),
+        "y_err": None if err_column is None else summary[err_column].to_numpy(dtype=float),
+        "title": title,
+        "xlabel": x_column,
+        "ylabel": y_column
+    }
+
+
+#draws and saves one plot with this process's renderer, returns an error message ("" if it worked)
+def render_plot(path, plot):
+    try:
+        renderer = get_renderer()
+        renderer.draw(**plot)
+        renderer.save(path)
+    except Exception as e:
+        return type(e).__name__+": "+str(e)
+    return ""
+
+
+def render_plots(plots, workers=None):
+    """
+    Renders many plots to disk, spread over a pool of worker processes.
+
+    Parameters
+    ----------
+    plots : list of (path, plot) pairs
+        Where to save each plot and its draw arguments (see trial_plot and summary_plot).
+    workers : int
+        Number of worker processes. Defaults to the number of CPUs, 1 renders in this process.
+
+    Returns
+    -------
+    errors : list of strings
+        One per plot, "" if it was saved.
+    """
+
+    for path, _ in plots:
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+    if workers == 1 or len(plots) <= 1:
+        return [render_plot(path, plot) for path, plot in plots]
+    n_workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(plots)//(n_workers*4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_plot, [p[0] for p in plots], [p[1] for p in plots], chunksize=chunksize))
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from .cells import get_cell
+from .density_calc import convertItoB_mainroom, convertVtoRot, rb_density
+from .linear_fit import weighted_line_fit, robust_line_fit, line_fit_errors, usable_sigma
+
+#column names used in the raw data files written by density_measurement
+RAW_COLUMNS = ["Current", "Voltage", "Voltage Mean Absolute Error", "Voltage Standard Deviation"]
+
+#column names used in the processed data files
+PROCESSED_COLUMNS = ["Magnetic Field (Gauss)", "Rotation (Radians)", "Rotation Mean Absolute Error", "Rotation Standard Deviation"]
+
+
+#we have been taking two data points at 0 field because of the current switch
+#handle this by taking all the 0 current values and averaging them. Use that voltage as 0 rotation
+def get_zero_rotation_voltage(raw_data):
+    currents = raw_data["Current"].to_numpy(dtype=float)
+    voltages = raw_data["Voltage"].to_numpy(dtype=float)
+    return np.average(voltages[currents == 0])
+
+
+def process_trial(raw_data, conversion_factor, cell=None):
+    """
+    Converts a raw trial (current and photodiode voltage) into magnetic field and rotation.
+
+    Every column is converted in one vectorized pass, so this does not need the GUI
+    and can be used from scripts and batch jobs.
+
+    Parameters
+    ----------
+    raw_data : pandas DataFrame
+        The raw trial data, with the columns in RAW_COLUMNS.
+    conversion_factor : float
+        The conversion factor (radians/volt) from the experiment parameters file.
+    cell : CellProfile or string
+        The cell (or its name in the cell registry) whose coil model turns current into
+        magnetic field. Set to None by default, which uses convertItoB_mainroom.
+
+    Returns
+    -------
+    processed_data : pandas DataFrame
+        The processed trial data, with the columns in PROCESSED_COLUMNS.
+    """
+
+    zero_rotation_voltage = get_zero_rotation_voltage(raw_data)
+    voltages = raw_data["Voltage"].to_numpy(dtype=float)
+    voltages_mae = raw_data["Voltage Mean Absolute Error"].to_numpy(dtype=float)
+    voltages_std = raw_data["Voltage Standard Deviation"].to_numpy(dtype=float)
+    currents = raw_data["Current"].to_numpy(dtype=float)
+    convert_current = convertItoB_mainroom if cell is None else get_cell(cell).convert_current
+
+    processed_data = pd.DataFrame({
+        "Magnetic Field (Gauss)": convert_current(currents),
+        "Rotation (Radians)": convertVtoRot(voltages, zero_rotation_voltage, conversion_factor),
+        "Rotation Mean Absolute Error": voltages_mae * conversion_factor,
+        "Rotation Standard Deviation": voltages_std * conversion_factor
+    })
+    return processed_data
+
+
+def fit_trial(processed_data, laser_wavelength, optical_length, cell=None, robust=None):
+    """
+    Fits a line to rotation vs magnetic field and converts the slope to a density.
+
+    Points are weighted by the Rotation Standard Deviation column (unweighted if any of
+    those are zero, e.g. in hand-made test files). The errors follow the DensityDataPlotter notebook: the slope error from the fit
+    covariance, and the MAE and standard deviation errors added in quadrature over
+    all points. All three are converted to density units.
+
+    Parameters
+    ----------
+    processed_data : pandas DataFrame
+        The processed trial data, with the columns in PROCESSED_COLUMNS.
+    laser_wavelength : float
+        The wavelength (in cm) of the probe laser.
+    optical_length : float
+        The length of the path of the laser through the cell (in cm).
+    cell : CellProfile or string
+        The cell (or its name in the cell registry) whose resonances to use. Set to None
+        by default, which uses the resonances in density_calc.
+    robust : string
+        "huber" or "tukey" to down weight glitch points (see linear_fit.robust_line_fit).
+        Set to None by default, an ordinary weighted fit.
+
+    Returns
+    -------
+    fit_results : dict
+        The slope, intercept and their errors, and the density with its three errors.
+        Robust fits also have "Robust Weights" (the weight of every point, 0 to 1) and
+        "Downweighted Points" (how many points have a weight below 0.5).
+    """
+
+    mag_field = processed_data["Magnetic Field (Gauss)"].to_numpy(dtype=float)
+    rotation = processed_data["Rotation (Radians)"].to_numpy(dtype=float)
+    r_err_m = processed_data["Rotation Mean Absolute Error"].to_numpy(dtype=float)
+    r_err_s = processed_data["Rotation Standard Deviation"].to_numpy(dtype=float)
+
+    sigma = r_err_s if usable_sigma(r_err_s) else None
+    if robust is None:
+        slope, intercept, param_cov = weighted_line_fit(mag_field, rotation, sigma)
+    else:
+        slope, intercept, param_cov, weights = robust_line_fit(mag_field, rotation, sigma, robust)
+    param = [slope, intercept]
+    param_err = line_fit_errors(param_cov)
+
+    l = len(rotation)
+    avg_err_m = np.sqrt(np.sum(r_err_m**2))/l
+    avg_err_s = np.sqrt(np.sum(r_err_s**2))/l
+
+    fit_results = {
+        "Slope": param[0],
+        "Slope Error": param_err[0],
+        "Intercept": param[1],
+        "Intercept Error": param_err[1],
+        "Density": rb_density(param[0], optical_length, laser_wavelength, cell),
+        "Density Error": rb_density(param_err[0], optical_length, laser_wavelength, cell),
+        "Density Error (MAE)": rb_density(avg_err_m, optical_length, laser_wavelength, cell),
+        "Density Error (STD)": rb_density(avg_err_s, optical_length, laser_wavelength, cell)
+    }
+    if robust is not None:
+        fit_results["Robust Weights"] = weights
+        fit_results["Downweighted Points"] = int(np.sum(weights < 0.5))
+    return fit_results
@@ -0,0 +1,199 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .density_calc import d1_resonance_f, d2_resonance_f, get_laser_f, optical_length_term
+from .levenberg_marquardt import levenberg_marquardt, weighted_residuals
+from .linear_fit import pad_trials
+
+#joint fit of the density and the pressure shifted D1/D2 resonances to a wavelength scan
+#rb_density is n = slope * ol * delta, and 1/delta = 4/D1^2 + 7/D2^2 - 2/(D1*D2), so the model is
+#   slope = (n/ol) * (4/D1^2 + 7/D2^2 - 2/(D1*D2)),   D1 = f1 - f_laser,  D2 = f2 - f_laser
+#every scan is fit at the same time by a Levenberg-Marquardt loop (see levenberg_marquardt.py) over arrays of shape
+#(num_scans, num_points); scans with fewer points are padded with NaN (see pad_trials)
+
+#the fitted parameters are scaled so they are all about 1: density / density guess,
+#and the resonance shifts from the starting values in GHz
+GHZ = 1.0E9
+
+RESONANCE_FIT_COLUMNS = [
+    "Density", "Density Error", "D1 Resonance", "D1 Resonance Error", "D2 Resonance", "D2 Resonance Error",
+    "Reduced Chi Squared", "Converged", "Iterations"
+]
+
+
+#returns the model slopes and the jacobian with respect to the scaled parameters
+def _model_and_jacobian(p, laser_f, ol, n0, f1_0, f2_0):
+    a = (p[:, 0]*n0)[:, None]/ol
+    D1 = (f1_0 + p[:, 1]*GHZ)[:, None] - laser_f
+    D2 = (f2_0 + p[:, 2]*GHZ)[:, None] - laser_f
+    g = 4/D1**2 + 7/D2**2 - 2/(D1*D2)
+    jac = np.empty(laser_f.shape + (3,))
+    jac[..., 0] = n0[:, None]/ol*g
+    jac[..., 1] = a*(-8/D1**3 + 2/(D1**2*D2))*GHZ
+    jac[..., 2] = a*(-14/D2**3 + 2/(D1*D2**2))*GHZ
+    return a*g, jac
+
+
+#fits one chunk of scans, starting every scan from its density guess and the starting resonances
+def _fit_chunk(args):
+    (laser_f, slopes, weights, ol, n0, f1_0, f2_0, max_iter, ftol, xtol) = args
+    p0 = np.zeros((len(slopes), 3))
+    p0[:, 0] = 1.0
+
+    def residuals(p):
+        model, jac = _model_and_jacobian(p, laser_f, ol, n0, f1_0, f2_0)
+        return weighted_residuals(model, jac, slopes, weights)
+
+    return levenberg_marquardt(residuals, p0, max_iter, ftol, xtol)
+
+
+def fit_resonances(wavelengths, slopes, slope_errs=None, optical_lengths=3.7, density_guess=None,
+                   d1_guess=None, d2_guess=None, absolute_sigma=False, max_iter=200, ftol=1.0E-10,
+                   xtol=1.0E-10, workers=1, chunk_size=1024):
+    """
+    Fits the density and the D1 and D2 resonance frequencies to many wavelength scans at once.
+
+    Parameters
+    ----------
+    wavelengths : numpy array or list of arrays
+        The probe laser wavelength (cm) of every trial, shape (num_scans, num_points). A list of
+        arrays of different lengths (one per scan) is padded with NaN. A single 1D scan also works.
+    slopes : numpy array or list of arrays
+        The rotation vs magnetic field slope of every trial, same shape as wavelengths.
+    slope_errs : numpy array or list of arrays
+        The error on each slope. Set to None by default, which weights every trial equally.
+    optical_lengths : numpy array or float
+        The optical length (cm) of each scan (shape (num_scans,)) or of every trial. Defaults to 3.7.
+    density_guess : numpy array or float
+        Starting density for each scan. Set to None by default, which uses the median of the
+        densities rb_density would give each trial with the starting resonances.
+    d1_guess, d2_guess : float
+        Starting D1 and D2 resonance frequencies (Hz). Default to the values in density_calc.
+    absolute_sigma : bool
+        Same meaning as in curve_fit. If False (default) the covariance is scaled by the
+        reduced chi squared.
+    max_iter : int
+        Maximum number of Levenberg-Marquardt iterations.
+    ftol, xtol : float
+        A scan has converged when an accepted step changes the cost or the parameters by less than this.
+    workers : int
+        Number of processes to spread the scans over. Defaults to 1 (no process pool).
+    chunk_size : int
+        Number of scans fit together in one process.
+
+    Returns
+    -------
+    resonance_results : dict
+        One numpy array per key in RESONANCE_FIT_COLUMNS, with one value per scan. The
+        resonances and their errors are in Hz.
+    """
+
+    def as_scans(values):
+        if isinstance(values, (list, tuple)) and len(values) and np.ndim(values[0]) == 1:
+            return pad_trials(values)
+        return np.atleast_2d(np.asarray(values, dtype=float))
+
+    wavelengths = as_scans(wavelengths)
+    slopes = as_scans(slopes)
+    if slope_errs is None:
+        slope_errs = np.ones_like(slopes)
+    slope_errs = np.broadcast_to(as_scans(slope_errs), slopes.shape)
+    optical_lengths = np.asarray(optical_lengths, dtype=float)
+    if optical_lengths.ndim == 1 and optical_lengths.shape[0] == slopes.shape[0]:
+        optical_lengths = optical_lengths[:, None]
+    ol = np.broadcast_to(optical_length_term(optical_lengths), slopes.shape)
+    num_scans = slopes.shape[0]
+
+    f1_0 = d1_resonance_f if d1_guess is None else d1_guess
+    f2_0 = d2_resonance_f if d2_guess is None else d2_guess
+    laser_f = get_laser_f(wavelengths)
+    valid = np.isfinite(laser_f) & np.isfinite(slopes) & np.isfinite(slope_errs) & (slope_errs > 0)
+    weights = np.where(valid, 1/np.where(valid, slope_errs, 1), 0.0)
+    laser_f = np.where(valid, laser_f, 0.5*(f1_0 + f2_0))
+    slopes = np.where(valid, slopes, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if density_guess is None:
+            D1 = f1_0 - laser_f
+            D2 = f2_0 - laser_f
+            trial_densities = np.where(valid, slopes*ol/(4/D1**2 + 7/D2**2 - 2/(D1*D2)), np.nan)
+            density_guess = np.nanmedian(trial_densities, axis=-1)
+        n0 = np.broadcast_to(np.asarray(density_guess, dtype=float), (num_scans,)).copy()
+    n0[~np.isfinite(n0) | (n0 == 0)] = 1.0
+
+    jobs = []
+    for start in range(0, num_scans, chunk_size):
+        s = slice(start, start + chunk_size)
+        jobs.append((laser_f[s], slopes[s], weights[s], ol[s], n0[s], f1_0, f2_0, max_iter, ftol, xtol))
+    if workers is not None and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_fit_chunk, jobs))
+    else:
+        chunks = [_fit_chunk(job) for job in jobs]
+    p, cov, cost, converged, iterations = [np.concatenate(parts) for parts in zip(*chunks)]
+
+    #three parameters cannot be pinned down by fewer than three trials
+    dof = valid.sum(axis=-1) - 3
+    converged &= dof >= 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reduced_chisq = np.where(dof > 0, cost/dof, np.nan)
+        if not absolute_sigma:
+            cov = cov*np.where(dof > 0, reduced_chisq, np.inf)[:, None, None]
+    errs = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+
+    resonance_results = {
+        "Density": p[:, 0]*n0,
+        "Density Error": errs[:, 0]*n0,
+        "D1 Resonance": f1_0 + p[:, 1]*GHZ,
+        "D1 Resonance Error": errs[:, 1]*GHZ,
+        "D2 Resonance": f2_0 + p[:, 2]*GHZ,
+        "D2 Resonance Error": errs[:, 2]*GHZ,
+        "Reduced Chi Squared": reduced_chisq,
+        "Converged": converged,
+        "Iterations": iterations
+    }
+    return resonance_results
+
+
+def fit_summary_resonances(summary, by=("Cell", "Oven Temperature", "Date"), **kwargs):
+    """
+    Fits the resonances for every scan in a batch summary (see batch.run_batch).
+
+    Parameters
+    ----------
+    summary : pandas DataFrame
+        The batch summary, one row per trial.
+    by : list of strings
+        The columns that identify one wavelength scan. Defaults to the cell, oven temperature and date.
+    **kwargs
+        Passed to fit_resonances.
+
+    Returns
+    -------
+    resonances : pandas DataFrame
+        One row per scan, the columns in by followed by RESONANCE_FIT_COLUMNS and "Number of Trials".
+    """
+
+    import pandas as pd #only needed here, so the fitting itself does not load pandas
+
+    summary = summary[summary["Slope"].notna() & summary["Laser Wavelength"].notna()]
+    by = list(by)
+    groups = list(summary.groupby(by, sort=True))
+    keys = [key if isinstance(key, tuple) else (key,) for key, _ in groups]
+    scans = [group for _, group in groups]
+    if len(scans) == 0:
+        return pd.DataFrame(columns=by + RESONANCE_FIT_COLUMNS + ["Number of Trials"])
+
+    slope_errs = [scan["Slope Error"].to_numpy(dtype=float) for scan in scans]
+    resonance_results = fit_resonances(
+        [scan["Laser Wavelength"].to_numpy(dtype=float) for scan in scans],
+        [scan["Slope"].to_numpy(dtype=float) for scan in scans],
+        slope_errs=slope_errs,
+        optical_lengths=np.array([scan["Optical Length"].median() for scan in scans]),
+        **kwargs)
+
+    resonances = pd.DataFrame(keys, columns=by)
+    for name in RESONANCE_FIT_COLUMNS:
+        resonances[name] = resonance_results[name]
+    resonances["Number of Trials"] = [len(scan) for scan in scans]
+    return resonances
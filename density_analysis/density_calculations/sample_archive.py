@@ -0,0 +1,146 @@
+import os
+import numpy as np
+import pandas as pd
+
+#reads the sample archives the measurement app writes next to raw trial files when it keeps every sample
+#(density_measurement/functions/sample_archive.py): a <trial>_samples folder with an index.csv and one
+#segment per data point, linked from the "Sample Segment" column of the raw file. Statistics can be
+#recomputed from the samples, with any filter, to re-analyze an old run without measuring it again.
+#the names below are the only definition of the layout, the measurement writer imports them from here
+
+SAMPLE_ARCHIVE_SUFFIX = "_samples"
+SAMPLE_INDEX_FILENAME = "index.csv"
+SAMPLE_INDEX_COLUMNS = ["Segment", "Current", "Samples", "Samples File", "Times File"]
+
+
+#the archive folder of a raw trial file
+def sample_archive_path(raw_filepath):
+    return str(raw_filepath)[:-len(".csv")] + SAMPLE_ARCHIVE_SUFFIX
+
+
+#[mean, mean absolute error, standard deviation] of a point's samples, the same numbers collectDataPoint records
+def sample_stats(samples):
+    samples = np.asarray(samples, dtype=float)
+    mean = samples.mean()
+    return np.array([mean, np.mean(np.abs(samples - mean)), samples.std()])
+
+
+class SampleArchive:
+    """
+    The samples behind every data point of one trial.
+
+    Only the index is read when the archive is opened, each point's samples are loaded when asked for.
+
+    Attributes
+    ----------
+    path : string
+        The archive folder.
+    index : pandas DataFrame
+        One row per segment: Segment, Current, Samples (how many), Samples File and Times File.
+
+    Methods
+    -------
+    samples(self, segment, mmap=True)
+        The samples (volts) of one point.
+    sample_times(self, segment)
+        When each sample of one point was read.
+    point_stats(self, segment, sample_filter=None)
+        Recomputes [mean, mean absolute error, standard deviation] for one point.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = pd.read_csv(os.path.join(path, SAMPLE_INDEX_FILENAME))
+        #segment number -> row of the index
+        self._rows = {int(s): i for i, s in enumerate(self.index["Segment"].to_numpy())}
+
+    def __len__(self):
+        return len(self.index)
+
+    def _file(self, segment, column):
+        try:
+            row = self._rows[int(segment)]
+        except KeyError:
+            raise KeyError("segment "+str(segment)+" is not in "+str(self.path)) from None
+        return os.path.join(self.path, self.index[column].iat[row])
+
+    def samples(self, segment, mmap=True):
+        """
+        Parameters
+        ----------
+        segment : int
+            The segment number (the "Sample Segment" column of the raw file).
+        mmap : bool
+            If True (default) uncompressed segments are memory mapped instead of read into memory.
+
+        Returns
+        -------
+        samples : numpy array
+            The samples of the point, in volts, in the order they were read.
+        """
+
+        filepath = self._file(segment, "Samples File")
+        if filepath.endswith(".npz"):
+            with np.load(filepath) as segment_data:
+                return segment_data["samples"]
+        return np.load(filepath, mmap_mode="r" if mmap else None)
+
+    def sample_times(self, segment):
+        filepath = self._file(segment, "Times File")
+        if filepath.endswith(".npz"):
+            with np.load(filepath) as segment_data:
+                return segment_data["times"]
+        return np.load(filepath)
+
+    def point_stats(self, segment, sample_filter=None):
+        """
+        Parameters
+        ----------
+        segment : int
+            The segment number.
+        sample_filter : function
+            Called as sample_filter(samples, sample_times), returns the samples to keep (e.g. with
+            glitches removed). Set to None by default, which keeps every sample.
+
+        Returns
+        -------
+        data_point : numpy array
+            [mean, mean absolute error, standard deviation] of the (filtered) samples, in volts.
+        """
+
+        samples = self.samples(segment)
+        if sample_filter is not None:
+            samples = sample_filter(samples, self.sample_times(segment))
+        return sample_stats(samples)
+
+
+def recompute_raw_trial(raw_filepath, sample_filter=None):
+    """
+    Rebuilds a raw trial's Voltage, Voltage Mean Absolute Error and Voltage Standard Deviation columns
+    from its sample archive, e.g. with a new filter, so it can be processed again (processing.process_trial).
+
+    Parameters
+    ----------
+    raw_filepath : string
+        The raw trial file. It needs a "Sample Segment" column and a sample archive.
+    sample_filter : function
+        See SampleArchive.point_stats. Set to None by default.
+
+    Returns
+    -------
+    raw_data : pandas DataFrame
+        The raw trial with the three voltage columns recomputed. Rows without a segment are left as they were.
+    """
+
+    from .columnar import read_table #only needed here, so the measurement app can import this module without it
+    raw_data = read_table(raw_filepath)
+    if "Sample Segment" not in raw_data.columns:
+        raise KeyError(str(raw_filepath)+" has no Sample Segment column, its samples were not archived")
+    archive = SampleArchive(sample_archive_path(raw_filepath))
+    segments = raw_data["Sample Segment"].to_numpy(dtype=float)
+    columns = ["Voltage", "Voltage Mean Absolute Error", "Voltage Standard Deviation"]
+    values = np.array(raw_data[columns], dtype=float)
+    for i in np.flatnonzero(np.isfinite(segments)):
+        values[i] = archive.point_stats(int(segments[i]), sample_filter)
+    raw_data[columns] = values
+    return raw_data
@@ -0,0 +1,160 @@
+import os
+
+from .columnar import COLUMNAR_SUFFIX, table_source, read_table
+
+#the raw data files are saved as <date>_cell-<cell>_temp-<oven temp>_trial-<trial number>.csv
+#see Data_Collection.collection_setup in density_measurement
+RAW_FILENAME_PARTS = 4
+
+
+def deconstruct_filename(filename):
+    """
+    Gets the information about a trial out of the name of its raw data file.
+
+    Parameters
+    ----------
+    filename : string
+        The raw data filename, with or without the folder and .csv extension.
+
+    Returns
+    -------
+    trial_info : dict
+        The date, cell_id, oven_temp and trial_num of the trial, as strings.
+    """
+
+    fn = os.path.basename(str(filename)).split(".")[0]
+    fn_arr = fn.split("_")
+    trial_info = {
+        "date": fn_arr[0],
+        "cell_id": fn_arr[1].split("-")[1],
+        "oven_temp": fn_arr[2].split("-")[1],
+        "trial_num": fn_arr[3].split("-")[1]
+    }
+    return trial_info
+
+
+#true if the file looks like a raw trial file (not processed, params or calibration files)
+def is_raw_trial_file(filename):
+    fn = os.path.basename(str(filename))
+    if not fn.endswith(".csv"):
+        return False
+    fn_arr = fn[:-len(".csv")].split("_")
+    if len(fn_arr) != RAW_FILENAME_PARTS:
+        return False
+    prefixes = ("cell-", "temp-", "trial-")
+    return all(part.startswith(prefix) for part, prefix in zip(fn_arr[1:], prefixes))
+
+
+#walks a data tree (e.g. Data/Density/) and returns the paths of all raw trial files, sorted
+#trials that only have a columnar copy (see columnar.py) are returned by their .csv name too
+def find_raw_trials(root):
+    raw_files = set()
+    for folder, dirs, files in os.walk(root):
+        names = list(files)
+        for d in dirs:
+            if d.endswith(COLUMNAR_SUFFIX):
+                names.append(d[:-len(COLUMNAR_SUFFIX)]+".csv")
+        #no need to look inside the columnar folders themselves
+        dirs[:] = [d for d in dirs if not d.endswith(COLUMNAR_SUFFIX)]
+        for f in names:
+            if is_raw_trial_file(f):
+                raw_files.add(os.path.join(folder, f))
+    return sorted(raw_files)
+
+
+#the experiment params file for a day is saved in the same folder as that day's raw data
+def params_filepath(folder, date):
+    return os.path.join(folder, "Experiment_Params_"+date+".csv")
+
+
+#the date of a params file comes from its name, the same way the raw files are matched to it
+def params_file_date(param_filepath):
+    return os.path.basename(str(param_filepath))[len("Experiment_Params_"):-len(".csv")]
+
+
+class ExperimentParamsIndex:
+    """
+    An in-memory index of Experiment_Params_<date>.csv files, keyed by (date, trial number).
+
+    Each params file is parsed once and kept until its modification time or size changes,
+    so looking up many trials from the same day only reads the csv one time.
+
+    Methods
+    -------
+    lookup(param_filepath, trial_num)
+        Returns the experiment parameters for one trial.
+    clear()
+        Forgets every cached params file.
+    """
+
+    def __init__(self):
+        #param_filepath -> ((file read, mtime), size, {(date, trial number): experiment params})
+        self._files = {}
+
+    def _load(self, param_filepath):
+        #the params may be read from the columnar copy, so check whichever file is actually used
+        source = table_source(param_filepath)
+        stat = os.stat(source)
+        cached = self._files.get(param_filepath)
+        if cached is not None and cached[0] == (source, stat.st_mtime_ns) and cached[1] == stat.st_size:
+            return cached[2]
+
+        date = params_file_date(param_filepath)
+        all_params = read_table(param_filepath)
+        trial_nums = all_params["Trial Number"].to_numpy()
+        conv_f = all_params["Conversion Factor"].to_numpy(dtype=float)
+        conv_err = all_params["Conversion Factor Error"].to_numpy(dtype=float)
+        wavelengths = all_params["Laser Wavelength"].to_numpy(dtype=float)
+        optical_lens = all_params["Optical Length"].to_numpy(dtype=float)
+
+        index = {}
+        for i in range(len(trial_nums)):
+            key = (date, int(trial_nums[i]))
+            #if a trial was saved twice, keep the first row like the app always has
+            if key not in index:
+                index[key] = {
+                    "conversion_factor": float(conv_f[i]),
+                    "conversion_factor_err": float(conv_err[i]),
+                    "laser_wavelength": float(wavelengths[i]),
+                    "optical_length": float(optical_lens[i])
+                }
+        self._files[param_filepath] = ((source, stat.st_mtime_ns), stat.st_size, index)
+        return index
+
+    def lookup(self, param_filepath, trial_num):
+        """
+        Finds the experiment parameters for one trial.
+
+        Parameters
+        ----------
+        param_filepath : string
+            The location of the Experiment_Params_<date>.csv file.
+        trial_num : int or string
+            The trial number to look up.
+
+        Returns
+        -------
+        experiment_params : dict
+            The conversion_factor, conversion_factor_err, laser_wavelength (cm) and
+            optical_length (cm) for the trial.
+        """
+
+        index = self._load(param_filepath)
+        date = params_file_date(param_filepath)
+        try:
+            experiment_params = index[(date, int(trial_num))]
+        except KeyError:
+            raise KeyError("trial "+str(trial_num)+" is not in "+str(param_filepath)) from None
+        return dict(experiment_params)
+
+    def clear(self):
+        self._files = {}
+
+
+#shared index, so the app and batch jobs only parse each params file once per process
+params_index = ExperimentParamsIndex()
+
+
+#finds the experiment parameters for one trial, see ExperimentParamsIndex.lookup
+def get_experiment_params(param_filepath, trial_num):
+    return params_index.lookup(param_filepath, trial_num)
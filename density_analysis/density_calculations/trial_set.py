@@ -0,0 +1,254 @@
+import os
+import numpy as np
+
+from .columnar import read_table
+from .density_calc import rb_density_batch
+from .linear_fit import pad_segments, usable_sigma, weighted_line_fit
+from .plotSettings import plotable
+from .processing import process_trial
+from .trial_files import deconstruct_filename, params_filepath, get_experiment_params
+
+#many trials in a few flat arrays instead of one plotable (and its arrays) per trial
+#the points of trial i are field[offsets[i]:offsets[i+1]] (same for rotation and rotation_err),
+#so getting one trial back is a slice, and operations over every trial are a handful of numpy calls
+
+
+class TrialSet:
+    """
+    A set of trials stored as contiguous ragged arrays (all the points of every trial, plus offsets).
+
+    Attributes
+    ----------
+    field : numpy array
+        The magnetic field (in Gauss) of every point of every trial, trial after trial.
+    rotation : numpy array
+        The rotation (in radians) of every point.
+    rotation_err : numpy array
+        The rotation standard deviation of every point.
+    offsets : numpy array
+        Where each trial starts in the point arrays, with the total number of points at the end (length num trials + 1).
+    laser_wavelength : numpy array
+        The wavelength (in cm) of the probe laser for each trial.
+    optical_length : numpy array
+        The length of the path of the laser through the cell (in cm) for each trial.
+    names : list of strings
+        A label for each trial (e.g. its raw file), or None.
+
+    Methods
+    -------
+    from_processed(cls, processed_trials, laser_wavelengths, optical_lengths, names=None, dtype=np.float64)
+        Makes a TrialSet from processed trial DataFrames.
+    from_raw_files(cls, raw_files, cell=None, dtype=np.float64)
+        Reads, processes and stores raw trial files.
+    trial(self, i)
+        The field, rotation and rotation error of one trial (views, not copies).
+    trial_plotable(self, i)
+        One trial as a plotable that shares this set's arrays.
+    trial_ids(self)
+        The trial number of every point.
+    sum_per_trial(self, values) / mean_per_trial(self, values)
+        Sums or averages a per point array within each trial.
+    fit_lines(self, weighted=True, absolute_sigma=False)
+        Fits a line to every trial at once.
+    fit(self, cell=None, weighted=True)
+        Fits every trial and converts the slopes to densities.
+    """
+
+    __slots__ = ("field", "rotation", "rotation_err", "offsets", "laser_wavelength", "optical_length", "names", "_ids")
+
+    def __init__(self, field, rotation, rotation_err, offsets, laser_wavelength, optical_length, names=None, dtype=np.float64):
+        """
+        Creates a TrialSet from arrays that are already flat (see from_processed to build one from separate trials).
+
+        Parameters
+        ----------
+        field, rotation, rotation_err : numpy arrays
+            The points of every trial, one trial after another.
+        offsets : numpy array
+            Where each trial starts, with the total number of points at the end.
+        laser_wavelength, optical_length : numpy array or float
+            One value per trial, or one value for all of them.
+        names : list of strings
+            A label for each trial. Set to None by default.
+        dtype : numpy dtype
+            How the point arrays are stored. np.float32 halves the memory, fits are still done in float64.
+            Set to np.float64 by default.
+        """
+
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        num_trials = len(self.offsets) - 1
+        self.field = np.asarray(field, dtype=dtype)
+        self.rotation = np.asarray(rotation, dtype=dtype)
+        self.rotation_err = np.asarray(rotation_err, dtype=dtype)
+        self.laser_wavelength = np.broadcast_to(np.asarray(laser_wavelength, dtype=float), (num_trials,)).copy()
+        self.optical_length = np.broadcast_to(np.asarray(optical_length, dtype=float), (num_trials,)).copy()
+        self.names = None if names is None else list(names)
+        self._ids = None
+        if not (self.field.size == self.rotation.size == self.rotation_err.size == self.offsets[-1]):
+            raise ValueError("the point arrays do not match the offsets")
+
+    @classmethod
+    def from_processed(cls, processed_trials, laser_wavelengths, optical_lengths, names=None, dtype=np.float64):
+        """
+        Makes a TrialSet from processed trial data.
+
+        Parameters
+        ----------
+        processed_trials : list of pandas DataFrames
+            The processed trials, with the columns in processing.PROCESSED_COLUMNS.
+        laser_wavelengths, optical_lengths : numpy array or float
+            One value per trial, or one value for all of them.
+        names : list of strings
+            A label for each trial. Set to None by default.
+        dtype : numpy dtype
+            How the point arrays are stored. Set to np.float64 by default.
+
+        Returns
+        -------
+        TrialSet
+            The trials, in the order given.
+        """
+
+        lengths = [len(p) for p in processed_trials]
+        offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        field = np.empty(offsets[-1], dtype=dtype)
+        rotation = np.empty(offsets[-1], dtype=dtype)
+        rotation_err = np.empty(offsets[-1], dtype=dtype)
+        #each trial is copied straight into its place, there is no list of per trial arrays
+        for i, p in enumerate(processed_trials):
+            start, stop = offsets[i], offsets[i+1]
+            field[start:stop] = p["Magnetic Field (Gauss)"].to_numpy(dtype=float)
+            rotation[start:stop] = p["Rotation (Radians)"].to_numpy(dtype=float)
+            rotation_err[start:stop] = p["Rotation Standard Deviation"].to_numpy(dtype=float)
+        return cls(field, rotation, rotation_err, offsets, laser_wavelengths, optical_lengths, names, dtype)
+
+    @classmethod
+    def from_raw_files(cls, raw_files, cell=None, dtype=np.float64):
+        """
+        Reads and processes raw trial files, with the experiment parameters from their params files.
+
+        Parameters
+        ----------
+        raw_files : list of strings
+            The raw trial files (e.g. from trial_files.find_raw_trials).
+        cell : CellProfile or string
+            The cell whose coil model turns current into magnetic field (see processing.process_trial).
+            Set to None by default.
+        dtype : numpy dtype
+            How the point arrays are stored. Set to np.float64 by default.
+
+        Returns
+        -------
+        TrialSet
+            The trials, named by their raw files.
+        """
+
+        processed_trials, wavelengths, optical_lengths = [], [], []
+        for raw_filepath in raw_files:
+            trial_info = deconstruct_filename(raw_filepath)
+            params = get_experiment_params(params_filepath(os.path.dirname(raw_filepath), trial_info["date"]), trial_info["trial_num"])
+            processed_trials.append(process_trial(read_table(raw_filepath), params["conversion_factor"], cell))
+            wavelengths.append(params["laser_wavelength"])
+            optical_lengths.append(params["optical_length"])
+        return cls.from_processed(processed_trials, wavelengths, optical_lengths, list(raw_files), dtype)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.field, self.rotation, self.rotation_err, self.offsets,
+                                      self.laser_wavelength, self.optical_length))
+
+    def trial(self, i):
+        window = slice(self.offsets[i], self.offsets[i+1])
+        return self.field[window], self.rotation[window], self.rotation_err[window]
+
+    def trial_plotable(self, i):
+        field, rotation, rotation_err = self.trial(i)
+        return plotable._from_arrays(field, rotation, np.empty(0, dtype=field.dtype), rotation_err,
+                                     self.laser_wavelength[i], self.optical_length[i])
+
+    def trial_ids(self):
+        #kept, since every per trial operation needs it
+        if self._ids is None:
+            self._ids = np.repeat(np.arange(len(self), dtype=np.intp), self.lengths)
+        return self._ids
+
+    def sum_per_trial(self, values):
+        return np.bincount(self.trial_ids(), weights=values, minlength=len(self))
+
+    def mean_per_trial(self, values):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.sum_per_trial(values)/self.lengths
+
+    def fit_lines(self, weighted=True, absolute_sigma=False):
+        """
+        Fits rotation = slope*field + intercept to every trial at once.
+
+        The trials are padded into one stack (linear_fit.pad_segments) and fit with a single
+        weighted_line_fit call. Like processing.fit_trial, a trial is weighted by its rotation
+        errors only if they are all above zero (linear_fit.usable_sigma).
+
+        Parameters
+        ----------
+        weighted : bool
+            If False every point has the same weight. Set to True by default.
+        absolute_sigma : bool
+            Same meaning as in weighted_line_fit. Set to False by default.
+
+        Returns
+        -------
+        slope : numpy array
+            The best fit slope of each trial.
+        intercept : numpy array
+            The best fit y-intercept of each trial.
+        cov : numpy array
+            The covariance matrix of [slope, intercept] for each trial, shape (num trials, 2, 2).
+        """
+
+        field = pad_segments(self.field, self.offsets)
+        rotation = pad_segments(self.rotation, self.offsets)
+        sigma = None
+        if weighted:
+            #padding gets an error of 1 so it does not stop a trial from being weighted, its field is NaN anyway
+            rotation_err = pad_segments(self.rotation_err, self.offsets, fill=1.0)
+            sigma = np.where(usable_sigma(rotation_err)[:, None], rotation_err, 1.0)
+        return weighted_line_fit(field, rotation, sigma, absolute_sigma)
+
+    def fit(self, cell=None, weighted=True):
+        """
+        Fits every trial and converts the slopes to densities, like processing.fit_trial does for one trial.
+
+        Parameters
+        ----------
+        cell : CellProfile or string
+            The cell (or its name in the cell registry) whose resonances to use. Set to None by default.
+        weighted : bool
+            If False every point has the same weight. Set to True by default.
+
+        Returns
+        -------
+        fit_results : dict of numpy arrays
+            "Slope", "Slope Error", "Intercept", "Intercept Error", "Density", "Density Error" and
+            "Density Error (STD)", one value per trial.
+        """
+
+        slope, intercept, cov = self.fit_lines(weighted)
+        param_err = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+        err = np.asarray(self.rotation_err, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_err_s = np.sqrt(self.sum_per_trial(err**2))/self.lengths
+        return {
+            "Slope": slope,
+            "Slope Error": param_err[:, 0],
+            "Intercept": intercept,
+            "Intercept Error": param_err[:, 1],
+            "Density": rb_density_batch(slope, self.optical_length, self.laser_wavelength, cell),
+            "Density Error": rb_density_batch(param_err[:, 0], self.optical_length, self.laser_wavelength, cell),
+            "Density Error (STD)": rb_density_batch(avg_err_s, self.optical_length, self.laser_wavelength, cell)
+        }
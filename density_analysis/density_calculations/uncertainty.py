@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .density_calc import rb_density, rb_density_batch
+from .linear_fit import weighted_line_fit
+
+#Monte Carlo propagation of every error we know about into the density
+#each draw picks a conversion factor, wavelength and optical length (correlated if asked),
+#rescales the rotations by the drawn conversion factor (that error moves every point together),
+#adds independent noise to each point, refits the slope and converts it to a density.
+#all the draws in a chunk are refit with one call to weighted_line_fit
+
+
+def _draw_chunk(args):
+    (seed, num_draws, mag_field, rotation, rotation_err, means, errs, corr_factor, weighted, cell) = args
+    rng = np.random.default_rng(seed)
+
+    #correlated draws: standard normals mixed by the cholesky factor of the correlation matrix,
+    #then scaled by each error (so a parameter with no error is never drawn away from its value)
+    params = means + (rng.standard_normal((num_draws, 3)) @ corr_factor.T)*errs
+    conv_f, wavelengths, o_lens = params[:, 0], params[:, 1], params[:, 2]
+
+    #rotation = delta V * conversion factor, so a different conversion factor scales every point
+    scale = conv_f/means[0]
+    rotations = rotation[None, :]*scale[:, None] + rng.standard_normal((num_draws, len(rotation)))*rotation_err[None, :]*scale[:, None]
+    sigma = rotation_err[None, :]*scale[:, None] if weighted else None
+    slopes, _, _ = weighted_line_fit(mag_field[None, :], rotations, sigma)
+    return rb_density_batch(slopes, o_lens, wavelengths, cell)
+
+
+def density_monte_carlo(mag_field, rotation, rotation_err, conversion_factor, laser_wavelength, optical_length,
+                        conversion_factor_err=0.0, wavelength_err=0.0, optical_length_err=0.0, correlation=None,
+                        num_draws=100000, chunk_size=25000, percentiles=(2.5, 16, 50, 84, 97.5), seed=None,
+                        workers=1, weighted=True, return_draws=False, cell=None):
+    """
+    Finds the uncertainty in the density of one trial by Monte Carlo.
+
+    Parameters
+    ----------
+    mag_field : numpy array
+        The magnetic field values (in Gauss).
+    rotation : numpy array
+        The rotation values (in radians), made with conversion_factor.
+    rotation_err : numpy array
+        The error in each rotation value (e.g. the Rotation Standard Deviation column).
+    conversion_factor : float
+        The conversion factor (radians/volt) the rotations were made with.
+    laser_wavelength : float
+        The wavelength (in cm) of the probe laser.
+    optical_length : float
+        The length of the path of the laser through the cell (in cm).
+    conversion_factor_err : float
+        The error in the conversion factor. Defaults to 0.
+    wavelength_err : float
+        The error in the laser wavelength (cm). Defaults to 0.
+    optical_length_err : float
+        The error in the optical length (cm). Defaults to 0.
+    correlation : 3x3 numpy array
+        Correlation matrix between (conversion factor, wavelength, optical length). Set to
+        None by default, meaning they are independent.
+    num_draws : int
+        Number of Monte Carlo draws. Defaults to 100000.
+    chunk_size : int
+        Number of draws refit together, which sets the memory used (about 3*chunk_size*points floats).
+    percentiles : list of floats
+        The percentiles of the density to report.
+    seed : int
+        Seed for the random numbers. The result for a given seed does not depend on workers.
+    workers : int
+        Number of processes to spread the chunks over. Defaults to 1 (no process pool).
+    weighted : bool
+        If True (default) each refit is weighted by rotation_err, like fit_trial. As in fit_trial,
+        the fits are unweighted if any rotation_err is zero (or not finite).
+    return_draws : bool
+        If True, the density of every draw is included in the results.
+    cell : CellProfile or string
+        The cell (or its name in the cell registry) whose resonances to use, as in fit_trial.
+        Set to None by default, which uses the resonances in density_calc.
+
+    Returns
+    -------
+    mc_results : dict
+        "density": the density from the unperturbed data,
+        "mean", "std": mean and standard deviation of the drawn densities,
+        "percentiles": {percentile: density},
+        "draws": every drawn density (only if return_draws is True).
+    """
+
+    mag_field = np.asarray(mag_field, dtype=float)
+    rotation = np.asarray(rotation, dtype=float)
+    rotation_err = np.broadcast_to(np.asarray(rotation_err, dtype=float), rotation.shape)
+    #same rule as fit_trial: a zero error would give that point infinite weight
+    if not np.all((rotation_err > 0) & np.isfinite(rotation_err)):
+        weighted = False
+        #a point with no usable error gets no noise either
+        rotation_err = np.where(np.isfinite(rotation_err), rotation_err, 0.0)
+
+    means = np.array([conversion_factor, laser_wavelength, optical_length], dtype=float)
+    errs = np.array([conversion_factor_err, wavelength_err, optical_length_err], dtype=float)
+    if correlation is None:
+        correlation = np.eye(3)
+    corr_factor = np.linalg.cholesky(np.asarray(correlation, dtype=float))
+
+    #every chunk gets its own random stream, so the answer is the same with or without the pool
+    sizes = [chunk_size]*(num_draws//chunk_size)
+    if num_draws % chunk_size:
+        sizes.append(num_draws % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(seeds[i], sizes[i], mag_field, rotation, rotation_err, means, errs, corr_factor, weighted, cell) for i in range(len(sizes))]
+    if workers is not None and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_draw_chunk, jobs))
+    else:
+        chunks = [_draw_chunk(job) for job in jobs]
+    densities = np.concatenate(chunks)
+
+    sigma = rotation_err if weighted else None
+    slope, _, _ = weighted_line_fit(mag_field, rotation, sigma)
+    mc_results = {
+        "density": rb_density(slope, optical_length, laser_wavelength, cell),
+        "mean": np.mean(densities),
+        "std": np.std(densities),
+        "percentiles": dict(zip(percentiles, np.percentile(densities, percentiles)))
+    }
+    if return_draws:
+        mc_results["draws"] = densities
+    return mc_results
+
+
+#runs density_monte_carlo on a processed trial, using the experiment params from trial_files.get_experiment_params
+#cell is passed on to the density conversion, like fit_trial's
+def trial_monte_carlo(processed_data, experiment_params, cell=None, **kwargs):
+    return density_monte_carlo(
+        processed_data["Magnetic Field (Gauss)"].to_numpy(dtype=float),
+        processed_data["Rotation (Radians)"].to_numpy(dtype=float),
+        processed_data["Rotation Standard Deviation"].to_numpy(dtype=float),
+        experiment_params["conversion_factor"],
+        experiment_params["laser_wavelength"],
+        experiment_params["optical_length"],
+        conversion_factor_err=experiment_params["conversion_factor_err"],
+        cell=cell,
+        **kwargs)
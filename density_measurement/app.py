@@ -4,12 +4,24 @@ from tkinter import filedialog
 from tkinter import scrolledtext
 import os
 import pandas as pd
+import numpy as np
 from datetime import datetime
-import time
+import threading
+import queue
 
 #my libraries
 import functions.utilities as util
 import functions.density_collection_functions as dcf
+from functions.acquisition_worker import AcquisitionWorker
+from functions.trial_recorder import TrialRecorder
+from functions.sample_archive import SampleArchiveWriter, sample_archive_path
+from functions.current_sweep import SweepScheduler, parse_currents
+import functions.instruments as instruments
+
+#seconds to wait for the acquisition worker to finish the point it is collecting when the app closes
+WORKER_JOIN_TIMEOUT = 10
+#seconds a calibration reading waits for the scope before saying it is busy (it runs on the Tk thread)
+CAL_SCOPE_TIMEOUT = 0.2
 
 
 class App(tk.Tk):
@@ -19,6 +31,8 @@ class App(tk.Tk):
 		#need to start these out with None, so I can close the program correctly later
 		self.raw_data_file = None
 		self.my_scope = None
+		#the scope is used from the acquisition worker thread, so only one thing talks to it at a time
+		self.scope_lock = threading.Lock()
 		self.current_date = datetime.today().strftime('%Y-%m-%d')
 
 		#if it does not already exist, make the folder for the day's data collection
@@ -62,22 +76,65 @@ class App(tk.Tk):
 		#some info for collecting data
 		self.time_constant = 1
 		self.num_points = 10
+		#"measurement" queries MEASU:IMM:VAL? num_points times, "waveform" reads num_points whole waveform records
+		self.acquisition_mode = "measurement"
+		#number of data points to collect before they are written (and fsynced) to the raw data file
+		self.flush_every = 1
+		#set to True to also keep every sample of every point, in a <trial>_samples folder next to the
+		#raw data file (compressed, see functions/sample_archive.py), so old runs can be re-analyzed
+		self.archive_samples = False
 		self.scope_addr = 'USB0::0x0699::0x0368::C041014::INSTR'
-		#now connect to the scope (comment out two lines below when testing w/o scope)
-		self.my_scope = dcf.connectToScope(self.scope_addr)
-		dcf.setUpScopeForDataCol(self.my_scope)
+		#set DENSITY_SCOPE_BACKEND=simulated to run without a scope (see functions/instruments.py)
+		self.scope_backend = os.environ.get("DENSITY_SCOPE_BACKEND", "visa")
+		#the scope is connected the first time it is used (see get_scope), so the window opens
+		#right away and pyvisa is only loaded when a measurement is taken
+		#the coil power supply is only needed for automatic sweeps, set DENSITY_SUPPLY_BACKEND
+		#(and DENSITY_SUPPLY_ADDR for a real supply) to enable them. "simulated" drives the simulated scope
+		self.supply_backend = os.environ.get("DENSITY_SUPPLY_BACKEND")
+		self.power_supply = None
+
+	#returns the scope, connecting to it and setting it up the first time
+	#call this while holding scope_lock, it is used from the acquisition worker thread
+	def get_scope(self):
+		if (self.my_scope == None):
+			self.my_scope = dcf.connectToScope(self.scope_addr, self.scope_backend)
+			dcf.setUpScopeForDataCol(self.my_scope)
+		return self.my_scope
+
+	#returns the coil power supply, opening it the first time (None if no supply is configured)
+	def get_power_supply(self):
+		if (self.power_supply == None and self.supply_backend == "simulated"):
+			sim_scope = None
+			if (self.scope_backend == "simulated"):
+				with self.scope_lock:
+					sim_scope = self.get_scope()
+			self.power_supply = instruments.open_power_supply(None, "simulated", scope=sim_scope)
+		elif (self.power_supply == None and self.supply_backend != None):
+			self.power_supply = instruments.open_power_supply(os.environ.get("DENSITY_SUPPLY_ADDR"), self.supply_backend)
+		return self.power_supply
 	
 
 	def save_data(self):
 		self.raw_data_file.close()
 		#disable the current entry and submit
 
+	#stop the acquisition worker and close the files the frames are recording to
+	def close_frames(self):
+		self.collection_module_frame.shutdown()
+		self.collection_params_frame.shutdown()
+		self.calibration_params_frame.shutdown()
+
 	#function to close the app 
 	def close(self):
+		self.close_frames()
 		if (self.raw_data_file != None):
 			self.raw_data_file.close()
-		if(self.my_scope != None):
+		#the worker was stopped above, but if it is still stuck talking to the scope leave the scope open
+		if(self.my_scope != None and self.scope_lock.acquire(timeout=WORKER_JOIN_TIMEOUT)):
 			self.my_scope.close()
+			self.scope_lock.release()
+		if(self.power_supply != None):
+			self.power_supply.close()
 		self.destroy()
 
 	
@@ -91,6 +148,7 @@ class App(tk.Tk):
 		except FileExistsError: 
 			pass # if directory already exists
 		# I want to refresh all frames after this and this is the only way I can find to maybe do that?
+		self.close_frames()
 		self.calibration_params_frame = Calibration_Parameters(self)
 		self.collection_params_frame = Collection_Parameters(self)
 		self.collection_module_frame = Data_Collection(self)
@@ -98,6 +156,7 @@ class App(tk.Tk):
 	def reset_for_new_collection(self):
 		#base_folder = self.raw_data_folder
 		#I think I can just refresh all the modules? Maybe?
+		self.close_frames()
 		self.calibration_params_frame = Calibration_Parameters(self)
 		self.collection_params_frame = Collection_Parameters(self)
 		self.collection_module_frame = Data_Collection(self)
@@ -121,13 +180,13 @@ class Data_Collection(tk.Frame):
 		#prep the fields for creating a data file
 		self.data_folder = self.parent.raw_data_folder
 		
-		#create an empty data frame to save future data
-		self.raw_data = pd.DataFrame({
-			"Current": [],
-			"Voltage": [],
-			"Voltage Mean Absolute Error": [], 
-			"Voltage Standard Deviation": []
-		})
+		#columns of the raw data file, the rows are kept by self.recorder once collection starts
+		#Timestamp is when the point was measured (seconds since the epoch, the middle of its samples, see util.monotonicTimestamp)
+		#the time of every sample is only kept when the samples are archived (archive_samples), next to the samples themselves
+		self.raw_columns = ["Current", "Voltage", "Voltage Mean Absolute Error", "Voltage Standard Deviation", "Timestamp"]
+		self.recorder = None
+		#the sample archive of the trial, when the app keeps samples (archive_samples)
+		self.archive = None
 
 		#widgets 
 		self.start_data_collection_button = tk.Button(self, text="Start Data Collection", command=self.collection_setup)	
@@ -144,13 +203,38 @@ class Data_Collection(tk.Frame):
 		
 		self.error_display_lbl = tk.Label(self, text="", fg="red", font=("Ariel", 17))
 
+		#automatic sweep, the currents are "start:stop:step" or a comma separated list
+		self.sweep_label = tk.Label(self, text="Sweep Currents (amps)", font=("Ariel", 14))
+		self.sweep_entry = tk.Entry(self)
+		self.sweep_button = tk.Button(self, text="Run Sweep", command=self.start_sweep)
+		if (self.parent.supply_backend == None):
+			self.sweep_button["state"] = tk.DISABLED
+		self.sweep = None
+
+		#live status of the acquisition worker, and a way to stop it
+		#status_text is the status without the number of queued points, see set_status
+		self.status_text = "Idle"
+		self.status_lbl = tk.Label(self, text=self.status_text, font=("Ariel", 12))
+		self.cancel_button = tk.Button(self, text="Cancel", command=self.cancel_collection)
+
 		self.data_display = scrolledtext.ScrolledText(self, wrap = tk.WORD, width=100, height=8)
 		
 		self.enter_current_label.grid(row=2, column=0, columnspan=2, padx=10)
 		self.enter_current.grid(row=2, column=2, padx=10)
 		self.submit_button.grid(row=2, column=3, padx=10)
-		self.error_display_lbl.grid(row=3, column=0, columnspan=4, padx=10)
-		self.data_display.grid(row=4, column=0, columnspan=4)
+		self.sweep_label.grid(row=3, column=0, columnspan=2, padx=10)
+		self.sweep_entry.grid(row=3, column=2, padx=10)
+		self.sweep_button.grid(row=3, column=3, padx=10)
+		self.error_display_lbl.grid(row=4, column=0, columnspan=4, padx=10)
+		self.status_lbl.grid(row=5, column=0, columnspan=3, sticky=tk.W, padx=10)
+		self.cancel_button.grid(row=5, column=3, padx=10)
+		self.data_display.grid(row=6, column=0, columnspan=4)
+
+		#data points are collected on a background thread so the window does not freeze
+		#the results come back through a queue that is checked with after()
+		self.worker = AcquisitionWorker(self.saveVoltageValues)
+		self.worker.start()
+		self.poll_worker()
 
 	def validate_current(self):
 		val = self.enter_current.get()
@@ -180,9 +264,28 @@ class Data_Collection(tk.Frame):
 		temp = "temp-"+str(exp_params["Oven Temperature"].values[l-1])
 		date = str(self.parent.current_date)
 		self.data_filename =  date+"_"+cell+"_"+temp+"_"+trial+".csv"
-		#create empty file for data collection
+		#create empty file for data collection, it stays open until the trial is over
 		self.data_filepath = self.data_folder+self.data_filename
-		(self.raw_data).to_csv(self.data_filepath, mode='a', index=False, header=True)
+		#points queued (or being collected) for the previous trial must not end up in this one
+		self.cancel_collection()
+		if (self.recorder != None):
+			self.recorder.close()
+			self.recorder = None
+		if (self.archive != None):
+			self.archive.close()
+			self.archive = None
+		columns = self.raw_columns
+		if (self.parent.archive_samples):
+			columns = columns + ["Sample Segment"]
+		try:
+			self.recorder = TrialRecorder(self.data_filepath, columns, flush_every=self.parent.flush_every)
+		except ValueError as e:
+			#the trial was started before with sample archiving set the other way (or the file was edited)
+			self.error_display_lbl["text"]=str(e)
+			return
+		if (self.parent.archive_samples):
+			#each row points to the archive segment holding its samples
+			self.archive = SampleArchiveWriter(sample_archive_path(self.data_filepath))
 		#notify the user of where this data will be saved
 		save_msg = "Raw Data File: "+self.data_filename
 		self.raw_data_loc_lbl["text"]=save_msg
@@ -191,13 +294,31 @@ class Data_Collection(tk.Frame):
 	def clear_current_val(self, enter_current):
 		self.enter_current.delete(0, 'end')
 
-	def saveVoltageValues(self):
-		#later this will run the data collection stuff for now, just give me a number
-		data_point = dcf.collectDataPoint(self.num_points, 0.1, self.parent.my_scope)
+	#this runs on the acquisition worker (or sweep) thread, so it must not touch any widgets
+	#recorder and archive are the trial files the point was requested for, the recorder is returned with the
+	#values so save_data_point can drop a point whose trial was closed while it was being collected
+	def saveVoltageValues(self, c, recorder, archive):
+		with self.parent.scope_lock:
+			#the simulated scope has no coils to measure, so tell it the current the operator set
+			if (self.parent.scope_backend == "simulated"):
+				self.parent.get_scope().set_current(c)
+			sample_times = []
+			samples = [] if archive != None else None
+			data_point = dcf.collectDataPoint(self.num_points, 0.1, self.parent.get_scope(), self.parent.acquisition_mode, sample_times, samples)
 		v = data_point[0]
 		v_abs_mean_err = data_point[1]
 		v_std_dev = data_point[2]
-		return v, v_abs_mean_err, v_std_dev
+		#the raw file gets the mean sample time. The time of every sample is kept with the samples in the archive,
+		#without an archive there are no samples to keep it for
+		t = float(np.mean(np.hstack(sample_times)))
+		if (archive == None):
+			return recorder, [v, v_abs_mean_err, v_std_dev, t]
+		if (recorder is not self.recorder):
+			#the trial (and its archive) was closed during collection, the point is dropped
+			return recorder, [v, v_abs_mean_err, v_std_dev, t, None]
+		#the archive writes the samples on its own thread, this only queues them
+		segment = archive.submit(float(c), samples, sample_times)
+		return recorder, [v, v_abs_mean_err, v_std_dev, t, segment]
 	
 	def save_text_and_clear(self):
 		#step 0: check the value in current field is valid
@@ -205,35 +326,125 @@ class Data_Collection(tk.Frame):
 		isOK = util.entry_exists_is_number(val)
 		if(isOK==False):
 			self.error_display_lbl["text"]="Current value must be a number."
+		elif (self.recorder == None):
+			#the point would be measured with no file to write it to
+			self.error_display_lbl["text"]="Start data collection before submitting currents."
 		else:
-			self.submit_button["state"]=tk.DISABLED
 			self.error_display_lbl["text"]=""
-			#also need to diable the button until timeconstant*5 is over
-			total_time = self.time_constant * 5
-			#disable the button at the beginning of the data collection process
-			#do all the data stuff
+			#hand the point to the worker, it waits timeconstant*5 after collecting before the next one
 			c = self.enter_current.get()
-			v1, v2, v3 = self.saveVoltageValues()
-			#v1 = 0.1 
-			#v2 = 0.1
-			#v3 = 0.1
-			new_row = pd.DataFrame({
-				"Current": [c],
-				"Voltage": [v1],
-				"Voltage Mean Absolute Error": [v2], 
-				"Voltage Standard Deviation": [v3]
-			})
-			new_row.to_csv(self.data_filepath, mode='a', index=False, header=False)
-			text = str(c)+", "+str(v1)+", "+str(v2)+", "+str(v3)+"\n"
-			self.data_display.insert(tk.END, text)
-			self.raw_data = pd.concat([self.raw_data, new_row]).reset_index(drop = True)
-			#enforce time constant wait
-			time.sleep(total_time)
-			#clear text from field
+			total_time = self.time_constant * 5
+			self.worker.submit(c, total_time, self.recorder, self.archive)
+			#clear text from field, the next current can be queued right away
 			self.enter_current.delete(0, 'end')
-			#enable button again
+			self.set_status(self.status_text)
+
+	#show text in the status label, followed by how many points are still queued
+	def set_status(self, text):
+		self.status_text = text
+		pending = self.worker.pending()
+		if (pending > 0):
+			text = text + " (" + str(pending) + " queued)"
+		self.status_lbl["text"] = text
+
+	#write a collected point to the raw data file and show it
+	#data_point is (recorder, values) from saveVoltageValues, values are [voltage, mean absolute error,
+	#standard deviation, timestamp] and the sample segment if samples are archived
+	def save_data_point(self, c, data_point):
+		recorder, values = data_point
+		if (recorder is not self.recorder):
+			self.error_display_lbl["text"] = "Dropped the point at " + str(c) + " A, it was collected for the previous trial."
+			return
+		recorder.append([float(c)] + list(values))
+		v1, v2, v3 = values[0], values[1], values[2]
+		text = str(c)+", "+str(v1)+", "+str(v2)+", "+str(v3)+"\n"
+		self.data_display.insert(tk.END, text)
+
+	#all the data collected so far in this trial, as a DataFrame
+	def get_raw_data(self):
+		return self.recorder.to_dataframe()
+
+	#run the whole list of currents on the power supply without any more clicks
+	def start_sweep(self):
+		try:
+			currents = parse_currents(self.sweep_entry.get())
+		except ValueError:
+			self.error_display_lbl["text"]="Sweep must be start:stop:step or a list of currents."
+			return
+		if (len(currents) == 0 or self.recorder == None):
+			self.error_display_lbl["text"]="Start data collection and enter the sweep currents first."
+			return
+		self.error_display_lbl["text"]=""
+		self.sweep_button["state"]=tk.DISABLED
+		self.submit_button["state"]=tk.DISABLED
+		total_time = self.time_constant * 5
+		#every point of the sweep belongs to the trial that was open when it started
+		recorder, archive = self.recorder, self.archive
+		collect = lambda c: self.saveVoltageValues(c, recorder, archive)
+		self.sweep = SweepScheduler(self.parent.get_power_supply(), collect, currents, total_time)
+		self.sweep.start()
+
+	#show one message from the worker or the sweep
+	def handle_message(self, msg):
+		kind, c = msg[0], msg[1]
+		if (kind == "setting"):
+			self.set_status("Setting current to " + str(c) + " A")
+		elif (kind == "collecting"):
+			self.set_status("Collecting data at " + str(c) + " A")
+		elif (kind == "point"):
+			self.save_data_point(c, msg[2])
+		elif (kind == "progress"):
+			self.set_status("Settling at " + str(c) + " A: " + str(int(msg[2]*100)) + "%")
+		elif (kind == "ready"):
+			self.set_status("Ready")
+		elif (kind == "error"):
+			self.error_display_lbl["text"] = "Collection failed at " + str(c) + " A: " + msg[2]
+		elif (kind == "cancelled"):
+			self.set_status("Cancelled")
+		elif (kind == "done"):
+			self.set_status(self.status_text + " - sweep finished")
+			self.sweep_button["state"]=tk.NORMAL
 			self.submit_button["state"]=tk.NORMAL
 
+	#handle everything the worker and the sweep have reported since the last check, then check again later
+	#a message that cannot be handled is reported and skipped, so polling (and the rest of the queue) goes on
+	def poll_worker(self):
+		try:
+			for results in [self.worker.results] + ([self.sweep.results] if self.sweep != None else []):
+				while True:
+					try:
+						msg = results.get_nowait()
+					except queue.Empty:
+						break
+					try:
+						self.handle_message(msg)
+					except Exception as e:
+						#also in the error label, the next status message would replace it in the status label
+						error = "Could not handle " + str(msg[0]) + " at " + str(msg[1]) + " A: " + type(e).__name__ + ": " + str(e)
+						self.set_status(error)
+						self.error_display_lbl["text"] = error
+		finally:
+			if self.worker.is_alive():
+				self.after(100, self.poll_worker)
+
+	def cancel_collection(self):
+		self.worker.cancel()
+		if (self.sweep != None):
+			self.sweep.cancel()
+
+	def shutdown(self):
+		#wait for a point that is being collected, so the scope is not closed under it
+		self.worker.stop()
+		self.worker.join(WORKER_JOIN_TIMEOUT)
+		if (self.sweep != None):
+			#a sweep stuck talking to the supply or the scope is left behind (it is a daemon thread)
+			self.sweep.cancel()
+			self.sweep.join(WORKER_JOIN_TIMEOUT)
+		if (self.recorder != None):
+			self.recorder.close()
+		if (self.archive != None):
+			self.archive.close()
+
 
 
 #####################################################################################
@@ -250,6 +461,8 @@ class Collection_Parameters(tk.Frame):
 		#create the params file
 		self.paramfilename = "Experiment_Params_" + self.parent.current_date+".csv"
 		self.param_filepath = self.parent.raw_data_folder + self.paramfilename
+		#opened by checkForParamsFile and kept open for the session
+		self.param_recorder = None
 
 		self.latest_collection_params = pd.DataFrame({
 				"Date": [],
@@ -338,25 +551,33 @@ class Collection_Parameters(tk.Frame):
 ####################################################################################################
 
 	def checkForParamsFile(self):
-		# check for existence of daily params file
-		paramsFileCreated = os.path.isfile(self.param_filepath)
-		## if the file does exist, load the data into self.collection_params
-		if(paramsFileCreated): 
-			self.collection_params = pd.read_csv(self.param_filepath)
-			n = len(self.collection_params["Trial Number"])
-			if (n==0):
-				#case: file was created but nothing was saved
-				self.trial_num=1
-			else:
-				#case: file was created and previous data has been collected
-				self.trial_num = self.collection_params["Trial Number"].values[n-1]+1
-		## if there is not a file for today's collection create one
-		else: 
-			#case: file was not yet created, so create it and set trial number to 1
-			#create the data frame for the experiment parameters
-			self.collection_params = self.latest_collection_params
-			self.trial_num = 1
-			self.param_file = util.createDataCSV(self.param_filepath, self.collection_params)
+		# open the daily params file (creating it if it does not exist yet), loading any trials already saved
+		if (self.param_recorder == None):
+			try:
+				self.param_recorder = TrialRecorder(self.param_filepath, self.latest_collection_params.columns, dtype=object, load_existing=True)
+			except ValueError as e:
+				#the file has other columns than this version of the app writes
+				self.error_display_lbl["text"]=str(e)
+				raise
+		n = len(self.param_recorder)
+		if (n==0):
+			#case: file was just created or nothing was saved
+			self.trial_num=1
+		else:
+			#case: previous data has been collected
+			self.trial_num = int(float(self.param_recorder.column("Trial Number")[n-1]))+1
+
+	#the trials saved today as a DataFrame, built only when it is read so saving a trial stays quick
+	#(there is none until the params file is opened, see checkForParamsFile)
+	@property
+	def collection_params(self):
+		if (self.param_recorder == None):
+			raise AttributeError("the params file has not been opened yet")
+		return self.param_recorder.to_dataframe()
+
+	def shutdown(self):
+		if (self.param_recorder != None):
+			self.param_recorder.close()
 
 	def update_from_cal_params(self):
 		self.checkForParamsFile()
@@ -426,8 +647,9 @@ class Collection_Parameters(tk.Frame):
 		self.latest_collection_params["Conversion Factor"] = [conv_f]
 		self.latest_collection_params["Conversion Factor Error"] = [conv_err]
 
-		self.latest_collection_params.to_csv(self.param_filepath, mode='a', index=False, header=False)
-		self.collection_params = pd.concat([self.collection_params, self.latest_collection_params]).reset_index(drop = True)
+		if (self.param_recorder == None):
+			self.checkForParamsFile()
+		self.param_recorder.append(self.latest_collection_params.iloc[0].to_dict())
 		#show the calculated calibration value on screen
 		conv_f_formatted = util.formatter(conv_f, 4)
 		self.disp_conversion_factor_lbl["text"]="Conversion Factor: " + str(conv_f_formatted)
@@ -508,6 +730,8 @@ class Calibration_Parameters(tk.Frame):
 		#create a calibration file for the day if none exists
 		self.calfilename = "Calibration_" + self.parent.current_date+".csv"
 		self.calibration_filepath = self.parent.raw_data_folder + self.calfilename
+		#opened by checkForCalFile and kept open for the session
+		self.cal_recorder = None
 
 		#create an empty data frame to save future data
 		self.latest_cal_params = pd.DataFrame({
@@ -675,24 +899,52 @@ class Calibration_Parameters(tk.Frame):
 ############## END OF VALIDATION FUNCTIONS ################################
 
 	def checkForCalFile(self):
-		calFileExists = os.path.isfile(self.calibration_filepath)
-		if(calFileExists):
-			self.cal_params = pd.read_csv(self.calibration_filepath)
-		else:
-			self.cal_params = self.latest_cal_params
-			self.calibration_file = util.createDataCSV(self.calibration_filepath, self.cal_params)
+		# open the daily calibration file (creating it if it does not exist yet), loading any calibrations already saved
+		if (self.cal_recorder == None):
+			try:
+				self.cal_recorder = TrialRecorder(self.calibration_filepath, self.latest_cal_params.columns, dtype=object, load_existing=True)
+			except ValueError as e:
+				#the file has other columns than this version of the app writes
+				self.error_display_lbl["text"]=str(e)
+				raise
+
+	#the calibrations saved today as a DataFrame, built only when it is read so saving one stays quick
+	#(there is none until the calibration file is opened, see checkForCalFile)
+	@property
+	def cal_params(self):
+		if (self.cal_recorder == None):
+			raise AttributeError("the calibration file has not been opened yet")
+		return self.cal_recorder.to_dataframe()
+
+	def shutdown(self):
+		if (self.cal_recorder != None):
+			self.cal_recorder.close()
+
+	#one calibration reading, or None if the acquisition worker or a sweep is using the scope
+	#this runs on the Tk thread, so it does not wait for a data point to finish (that takes seconds)
+	def read_cal_value(self):
+		if (not self.parent.scope_lock.acquire(timeout=CAL_SCOPE_TIMEOUT)):
+			self.error_display_lbl["text"]="Scope busy collecting a data point, try again when it is done."
+			return None
+		try:
+			self.error_display_lbl["text"]=""
+			return dcf.collectDataPoint(5, 0.01, self.parent.get_scope())
+		finally:
+			self.parent.scope_lock.release()
 
 	def getCal(self):
 		if (self.initial_cal_val_disp["text"]=="TBD"):
-			self.cal1=dcf.collectDataPoint(5, 0.01, self.parent.my_scope)
-			#for testing when no scope present comment above and use
-			#self.cal1 = [1,0.1,0.1]
+			cal1 = self.read_cal_value()
+			if (cal1 is None):
+				return
+			self.cal1 = cal1
 			cal_1_formmated = util.formatter(self.cal1[0], 4)
 			self.initial_cal_val_disp["text"]=cal_1_formmated
 		elif (self.final_cal_val_disp["text"]=="TBD"):
-			self.cal2=dcf.collectDataPoint(5, 0.01, self.parent.my_scope)
-			#for testing when no scope present comment above and use
-			#self.cal2 = [3,0.1,0.1]
+			cal2 = self.read_cal_value()
+			if (cal2 is None):
+				return
+			self.cal2 = cal2
 			cal_2_formmated = util.formatter(self.cal2[0], 4)
 			self.final_cal_val_disp["text"]=cal_2_formmated
 		else:
@@ -736,8 +988,7 @@ class Calibration_Parameters(tk.Frame):
 			"Calibration Factor": [cal_factor],
 			"Calibration Factor Error": [cal_factor_error]
 			})
-		new_row.to_csv(self.calibration_filepath, mode='a', index=False, header=False)
-		self.cal_params = pd.concat([self.cal_params, new_row]).reset_index(drop = True)
+		self.cal_recorder.append(new_row.iloc[0].to_dict())
 		#show the calculated calibration value on screen
 		cal_f_formatted = util.formatter(cal_factor, 4)
 		self.display_cal_value["text"]="Calibration Factor: " + str(cal_f_formatted)
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+
+
+class AcquisitionWorker(threading.Thread):
+    """
+    A background thread that collects data points so the Tk window never blocks.
+
+    Currents are submitted to a job queue and collected in order. For every job the worker
+    calls collect(current, *args) with the args it was submitted with, reports the data point,
+    then waits out the settle time before starting the next job, so the next current can be
+    queued while the previous point settles.
+    Everything the GUI needs to know is put on the results queue as a tuple, which the GUI
+    reads from its own thread with after(). The worker never touches any Tk widgets.
+
+    Messages on the results queue
+    -----------------------------
+    ("collecting", current)
+        Collection of the point for this current has started.
+    ("point", current, data_point)
+        Whatever collect returned. For the measurement app (Data_Collection.saveVoltageValues) that is
+        (recorder, values): the trial recorder the job was submitted for, and [voltage, mean absolute error,
+        standard deviation, timestamp] plus the sample segment when samples are archived.
+    ("progress", current, fraction)
+        How much of the settle time has passed, from 0 to 1.
+    ("ready", current)
+        The settle time is over and the worker is starting the next job (if there is one).
+    ("error", current, message)
+        collect raised an exception. The worker keeps running.
+    ("cancelled", current)
+        The job was skipped or its settle time cut short by cancel().
+
+    Methods
+    -------
+    __init__(self, collect, progress_interval=0.2)
+        Creates the worker, call start() to run it.
+    submit(self, current, settle_time, *args)
+        Queues a data point, args are passed on to collect (e.g. which trial the point is for).
+    cancel(self)
+        Drops all queued jobs and stops waiting on the current settle time.
+    stop(self)
+        Cancels everything and ends the thread once the point being collected (if any) is done,
+        join() to wait for that.
+    pending(self)
+        Number of jobs waiting in the queue.
+    """
+
+    def __init__(self, collect, progress_interval=0.2):
+        super().__init__(daemon=True)
+        self.collect = collect
+        self.progress_interval = progress_interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self._cancel = threading.Event()
+        self._cancel_generation = 0
+
+    def submit(self, current, settle_time, *args):
+        self.jobs.put((self._cancel_generation, current, settle_time, args))
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def cancel(self):
+        #jobs submitted before the cancel carry an old generation number and are skipped
+        self._cancel_generation += 1
+        self._cancel.set()
+
+    def stop(self):
+        self.cancel()
+        self.jobs.put(None)
+
+    def _wait_for_settle(self, current, settle_time):
+        #wait in short steps so progress can be reported and cancel() takes effect quickly
+        start = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= settle_time:
+                self.results.put(("progress", current, 1.0))
+                return True
+            self.results.put(("progress", current, elapsed/settle_time))
+            if self._cancel.wait(min(self.progress_interval, settle_time - elapsed)):
+                return False
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            generation, current, settle_time, args = job
+            if generation != self._cancel_generation:
+                self.results.put(("cancelled", current))
+                continue
+            self._cancel.clear()
+
+            self.results.put(("collecting", current))
+            try:
+                data_point = self.collect(current, *args)
+            except Exception as e:
+                self.results.put(("error", current, type(e).__name__+": "+str(e)))
+                continue
+            self.results.put(("point", current, data_point))
+
+            #enforce time constant wait before the next point
+            if self._wait_for_settle(current, settle_time):
+                self.results.put(("ready", current))
+            else:
+                self.results.put(("cancelled", current))
@@ -0,0 +1,41 @@
+import importlib
+import os
+import sys
+
+#the measurement app shares a few things with density_analysis: the physics behind the simulated
+#scope (density_calc) and the layout of the sample archives (sample_archive), so both sides always agree.
+#density_analysis is a sibling of density_measurement, and it can only be imported with the repo root
+#on the path, which it is not when the app is run as `python density_measurement`.
+#this is the only place the measurement code reaches into density_analysis, always go through it.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def analysis_module(name):
+    """
+    Imports a module of density_analysis/density_calculations.
+
+    If density_analysis cannot be found, the repo root is added to the end of sys.path (so it never
+    shadows anything already there) and the import is tried again.
+
+    Parameters
+    ----------
+    name : string
+        The module name, e.g. "density_calc".
+
+    Returns
+    -------
+    module
+        density_analysis.density_calculations.<name>
+    """
+
+    full_name = "density_analysis.density_calculations." + name
+    try:
+        return importlib.import_module(full_name)
+    except ModuleNotFoundError as e:
+        #only a missing density_analysis means the path is the problem
+        if e.name not in ("density_analysis", "density_analysis.density_calculations"):
+            raise
+    if REPO_ROOT not in sys.path:
+        sys.path.append(REPO_ROOT)
+    return importlib.import_module(full_name)
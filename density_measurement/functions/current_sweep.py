@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+import numpy as np
+
+
+#the currents from start to stop (inclusive) in steps of step, in amps
+def sweep_currents(start, stop, step):
+    step = abs(step) if stop >= start else -abs(step)
+    n = int(np.floor((stop - start)/step + 1E-9)) + 1
+    return start + step*np.arange(n)
+
+#takes the text the operator typed for a sweep and returns the currents, in amps
+#either "start:stop:step" or a comma separated list like "0, 1, 2, 3, 0, -1"
+def parse_currents(text):
+    text = text.strip()
+    if ":" in text:
+        start, stop, step = [float(t) for t in text.split(":")]
+        if step == 0:
+            raise ValueError("the sweep step cannot be 0")
+        return sweep_currents(start, stop, step)
+    return np.array([float(t) for t in text.replace(" ", "").split(",") if t != ""])
+
+
+class SweepScheduler(threading.Thread):
+    """
+    Runs an unattended current sweep: sets each current on the power supply, waits the
+    settle time, then collects the data point.
+
+    Data points are put on the results queue as soon as they are collected and the next
+    current is set right away, so whatever reads the queue (the GUI, or record_sweep) writes
+    the file and updates the display while the supply settles at the next point. The
+    results queue uses the same messages as AcquisitionWorker, plus ("setting", current)
+    when a new current is set and ("done", None) at the end of the sweep.
+
+    Methods
+    -------
+    __init__(self, supply, collect, currents, settle_time, progress_interval=0.2)
+        Creates the sweep, call start() to run it.
+    cancel(self)
+        Stops the sweep after the current step.
+    """
+
+    def __init__(self, supply, collect, currents, settle_time, progress_interval=0.2):
+        """
+        Parameters
+        ----------
+        supply : instruments.PowerSupply
+            The coil power supply.
+        collect : function
+            Called as collect(current) once the current has settled, returns the data point.
+        currents : list of floats
+            The currents to visit, in order (amps).
+        settle_time : float
+            Time to wait after setting each current before collecting (seconds).
+        progress_interval : float
+            How often to report settle progress (seconds).
+        """
+
+        super().__init__(daemon=True)
+        self.supply = supply
+        self.collect = collect
+        self.currents = [float(c) for c in currents]
+        self.settle_time = settle_time
+        self.progress_interval = progress_interval
+        self.results = queue.Queue()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _wait_for_settle(self, current, settle_end):
+        while True:
+            remaining = settle_end - time.monotonic()
+            if remaining <= 0:
+                return True
+            self.results.put(("progress", current, 1 - remaining/self.settle_time))
+            if self._cancel.wait(min(self.progress_interval, remaining)):
+                return False
+
+    def run(self):
+        try:
+            self.supply.output(True)
+            for current in self.currents:
+                if self._cancel.is_set():
+                    self.results.put(("cancelled", current))
+                    break
+                self.supply.set_current(current)
+                settle_end = time.monotonic() + self.settle_time
+                self.results.put(("setting", current))
+                if not self._wait_for_settle(current, settle_end):
+                    self.results.put(("cancelled", current))
+                    break
+                self.results.put(("collecting", current))
+                try:
+                    data_point = self.collect(current)
+                except Exception as e:
+                    self.results.put(("error", current, type(e).__name__+": "+str(e)))
+                    break
+                self.results.put(("point", current, data_point))
+        finally:
+            #never leave current in the coils when the sweep ends
+            self.supply.set_current(0)
+            self.supply.output(False)
+            self.results.put(("done", None))
+
+
+def record_sweep(scheduler, recorder, on_point=None):
+    """
+    Runs a sweep without the GUI, writing every data point to a TrialRecorder.
+
+    The rows are written on the calling thread while the sweep thread waits for the
+    next current to settle.
+
+    Parameters
+    ----------
+    scheduler : SweepScheduler
+        The sweep to run. It is started here.
+    recorder : TrialRecorder
+        Where the rows [current, voltage, mean absolute error, standard deviation] go, followed by
+        anything else collect returns for the point (e.g. its timestamp).
+    on_point : function
+        Called as on_point(current, data_point) after each row is written. Set to None by default.
+
+    Returns
+    -------
+    errors : list of strings
+        Any error messages reported by the sweep.
+    """
+
+    errors = []
+    scheduler.start()
+    while True:
+        msg = scheduler.results.get()
+        if msg[0] == "point":
+            current, data_point = msg[1], msg[2]
+            recorder.append([current] + list(data_point))
+            if on_point is not None:
+                on_point(current, data_point)
+        elif msg[0] == "error":
+            errors.append(msg[2])
+        elif msg[0] == "done":
+            break
+    scheduler.join()
+    recorder.flush()
+    return errors
@@ -1,25 +1,125 @@
 import numpy as np # http://www.numpy.org/
-import pyvisa as visa # http://github.com/hgrecco/pyvisa
 import time
 
 #imports for my modules
 import functions.utilities as util
+import functions.instruments as instruments
+from functions.streaming_stats import RunningStats
 #from functions.utilities import meanAbsError
 
 #meanAbsError
 
 
-def collectDataPoint(num_avg, time_interval, scope):
-    i = 0
-    data_point_calc = np.zeros(num_avg)
-    data_point = np.zeros(3)
+#mode "measurement" asks the scope for its immediate measurement num_avg times (one USB round trip per sample)
+#mode "waveform" pulls num_avg whole waveform records as binary blocks instead, see collectWaveformDataPoint
+#if sample_times is a list, the time each sample was read (utilities.monotonicTimestamp) is added to it
+#if samples is a list, every sample (in volts) is added to it, e.g. for a SampleArchiveWriter
+def collectDataPoint(num_avg, time_interval, scope, mode="measurement", sample_times=None, samples=None):
+    if (mode == "waveform"):
+        return collectWaveformDataPoint(num_avg, time_interval, scope, sample_times, samples)
+    if (num_avg < 1):
+        raise ValueError("num_avg must be at least 1, not " + str(num_avg))
+    #mean and standard deviation are updated as each sample comes in
+    stats = RunningStats(buffer_size=num_avg)
     for i in range (0, num_avg):
-        data_point_calc[i] = scope.query('MEASU:IMM:VAL?')
+        value = scope.query('MEASU:IMM:VAL?')
+        stats.update(value)
+        if samples is not None:
+            samples.append(float(value))
+        if sample_times is not None:
+            sample_times.append(util.monotonicTimestamp())
         time.sleep(time_interval)
-        i = i+1
-    data_point[0]=np.average(data_point_calc) #average of all collected points for that current
-    data_point[1]=util.meanAbsError(data_point_calc) #error using mean absolute error
-    data_point[2]=np.std(data_point_calc) #standard deviation from the mean
+    #[average, mean absolute error, standard deviation from the mean] of all collected points for that current
+    data_point = stats.data_point()
+    return data_point
+
+
+#reads the scaling the scope uses for the curve data (DATA:SOU CH1)
+#volts = (raw value - yoff) * ymult + yzero
+def getWaveformScaling(scope):
+    ymult = float(scope.query('WFMPRE:YMULT?'))
+    yoff = float(scope.query('WFMPRE:YOFF?'))
+    yzero = float(scope.query('WFMPRE:YZERO?'))
+    return ymult, yoff, yzero
+
+#the time between two samples of a waveform record (seconds)
+def getWaveformSampleInterval(scope):
+    return float(scope.query('WFMPRE:XINCR?'))
+
+#takes the raw bytes of an IEEE 488.2 definite length block (#<n><length><data>)
+#and returns the data as a uint8 array that shares memory with raw (no copy)
+def parseBinaryBlock(raw):
+    start = raw.index(b'#')
+    num_digits = int(raw[start+1:start+2])
+    length = int(raw[start+2:start+2+num_digits])
+    offset = start+2+num_digits
+    return np.frombuffer(raw, dtype=np.uint8, count=length, offset=offset)
+
+#reads one full waveform record from the scope in a single binary transfer
+#returns the raw 1 byte values (DATA:WIDTH 1, DATA:ENC RPB), use getWaveformScaling to get volts
+def collectWaveform(scope):
+    scope.write('CURVE?')
+    raw = scope.read_raw()
+    return parseBinaryBlock(raw)
+
+def collectWaveformDataPoint(num_records, time_interval, scope, sample_times=None, samples=None):
+    """
+    Collects a data point from whole waveform records instead of single measurements.
+
+    Each record is one binary block read, so a data point averages thousands of samples
+    in about the time a single MEASU:IMM:VAL? query takes. The statistics are accumulated
+    record by record (see RunningStats) on the raw byte values and then scaled, so the
+    waveform is never converted to volts and the records are never joined together.
+    The raw values are single bytes, so the mean absolute error is worked out exactly from a
+    256 bin histogram of them instead of from a buffer of every sample.
+
+    Parameters
+    ----------
+    num_records : int
+        Number of waveform records to average together, at least 1.
+    time_interval : float
+        Time to wait between records, in seconds.
+    scope : pyvisa resource
+        The oscilloscope, set up by setUpScopeForDataCol.
+    sample_times : list
+        If given, the time of every sample of each record is added to it, as one array per record.
+        The record is taken to end when it was requested (utilities.monotonicTimestamp), with its
+        samples WFMPRE:XINCR apart before that.
+    samples : list
+        If given, each record is added to it, converted to volts (float32).
+
+    Returns
+    -------
+    data_point : numpy array
+        [average voltage, mean absolute error, standard deviation], same as collectDataPoint.
+    """
+
+    if (num_records < 1):
+        raise ValueError("num_records must be at least 1, not " + str(num_records))
+    ymult, yoff, yzero = getWaveformScaling(scope)
+    if sample_times is not None:
+        sample_interval = getWaveformSampleInterval(scope)
+    #only count, mean and spread are needed, the histogram stands in for a buffer of the samples
+    stats = RunningStats(buffer_size=0)
+    #how many times each raw value (0 to 255) came up, for the mean absolute error
+    code_counts = np.zeros(256, dtype=np.int64)
+    for i in range(0, num_records):
+        requested = util.monotonicTimestamp()
+        codes = collectWaveform(scope)
+        if sample_times is not None:
+            sample_times.append(requested - sample_interval*np.arange(len(codes)-1, -1, -1))
+        if samples is not None:
+            samples.append((codes.astype(np.float32) - np.float32(yoff))*np.float32(ymult) + np.float32(yzero))
+        stats.update_batch(codes)
+        code_counts += np.bincount(codes, minlength=256)
+        if (i < num_records-1):
+            time.sleep(time_interval)
+
+    data_point = np.zeros(3)
+    data_point[0] = (stats.mean - yoff)*ymult + yzero #average of all collected samples for that current
+    mean_abs_error = np.dot(code_counts, np.abs(np.arange(256) - stats.mean))/stats.count
+    data_point[1] = mean_abs_error*abs(ymult) #error using mean absolute error
+    data_point[2] = stats.std()*abs(ymult) #standard deviation from the mean
     return data_point
 
 
@@ -29,19 +129,23 @@ def collectCurrent(resource):
         return current
 
 
-def connectToScope(scope_address):
-    rm = visa.ResourceManager()
-    rm.list_resources()
-    oscilloscope = rm.open_resource(scope_address)
+#backend is "visa" for the real scope or "simulated" for instruments.SimulatedScope,
+#any keyword arguments are passed on to the simulated scope
+def connectToScope(scope_address, backend="visa", **kwargs):
+    oscilloscope = instruments.open_scope(scope_address, backend, **kwargs)
     return oscilloscope
 
-def setUpScopeForDataCol(resource):
+#record_length is the number of points the scope keeps per waveform (2500 on our scope)
+def setUpScopeForDataCol(resource, record_length=2500):
     resource.encoding = 'latin_1'
     resource.source_channel = 'CH1'
 
     resource.write('DATA:SOU CH1') 
     resource.write('DATA:WIDTH 1') 
     resource.write('DATA:ENC RPB')
+    #transfer the whole record when collecting waveforms
+    resource.write('DATA:START 1')
+    resource.write('DATA:STOP ' + str(record_length))
 
     #set trigger to auto
     resource.write('TRIGGER:MAIN:MODE AUTO')
@@ -0,0 +1,241 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+from functions.analysis_modules import analysis_module
+
+
+#connects to a real oscilloscope through pyvisa
+def open_visa_scope(scope_address):
+    import pyvisa as visa # http://github.com/hgrecco/pyvisa
+    rm = visa.ResourceManager()
+    rm.list_resources()
+    oscilloscope = rm.open_resource(scope_address)
+    return oscilloscope
+
+
+class SimulatedScope:
+    """
+    A stand-in for the oscilloscope that produces a Faraday rotation signal from known physics.
+
+    It answers the same query/write/read_raw/close calls that density_collection_functions
+    makes, so the whole acquisition to density pipeline can run with no instrument attached.
+    The photodiode voltage at a coil current I is
+
+        voltage = zero_voltage + slope * B(I) / conversion_factor + noise
+
+    where B(I) is convertItoB_mainroom and the slope is the one rb_density turns back into
+    the configured density at the configured optical length and wavelength.
+
+    Attributes
+    ----------
+    density : float
+        The rubidium density (cm^-3) the signal is made from.
+    optical_length : float
+        The length of the path of the laser through the cell (cm).
+    laser_wavelength : float
+        The wavelength of the probe laser (cm).
+    conversion_factor : float
+        Radians of rotation per volt at the photodiode.
+    zero_voltage : float
+        The voltage at zero field.
+    noise : float
+        Standard deviation of the gaussian noise added to every sample (volts).
+    current : float
+        The coil current (amps), set with set_current.
+    record_length : int
+        Number of samples in a waveform record (see DATA:STOP).
+    commands : list of strings
+        Every command written to the scope, in order.
+    """
+
+    def __init__(self, density=1.0E13, optical_length=3.7, laser_wavelength=7.80505E-5, conversion_factor=0.05,
+                 zero_voltage=0.2, noise=1.0E-4, record_length=2500, ymult=1.0E-4, seed=None):
+        self.density = density
+        self.optical_length = optical_length
+        self.laser_wavelength = laser_wavelength
+        self.conversion_factor = conversion_factor
+        self.zero_voltage = zero_voltage
+        self.noise = noise
+        self.record_length = record_length
+        self.current = 0.0
+        self.commands = []
+        self.encoding = 'latin_1'
+        self.source_channel = 'CH1'
+        #waveform scaling, centred on the zero field voltage so small rotations are resolved
+        self.ymult = ymult
+        self.yoff = 128.0
+        self.yzero = zero_voltage
+        #time between samples, a 2500 point record covers 10 ms
+        self.xincr = 4.0E-6
+        self._rng = np.random.default_rng(seed)
+        self._pending_read = None
+        #the simulated scope uses the same physics as the analysis code
+        self._density_calc = analysis_module("density_calc")
+
+    #the rotation slope (radians/Gauss) that rb_density turns into the configured density
+    def slope(self):
+        return self.density / self._density_calc.rb_density(1.0, self.optical_length, self.laser_wavelength)
+
+    def set_current(self, current):
+        self.current = float(current)
+
+    #the noise free voltage at the present current
+    def signal_voltage(self):
+        rotation = self.slope() * self._density_calc.convertItoB_mainroom(self.current)
+        return self.zero_voltage + rotation/self.conversion_factor
+
+    def samples(self, n):
+        return self.signal_voltage() + self._rng.normal(0.0, self.noise, n)
+
+    #one waveform record as raw RPB values, the way the scope sends them
+    def waveform_codes(self):
+        codes = np.rint((self.samples(self.record_length) - self.yzero)/self.ymult + self.yoff)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def query(self, command):
+        command = command.strip()
+        if command == 'MEASU:IMM:VAL?':
+            return str(self.samples(1)[0])
+        if command == 'WFMPRE:YMULT?':
+            return str(self.ymult)
+        if command == 'WFMPRE:YOFF?':
+            return str(self.yoff)
+        if command == 'WFMPRE:YZERO?':
+            return str(self.yzero)
+        if command == 'WFMPRE:XINCR?':
+            return str(self.xincr)
+        if command == '*IDN?':
+            return 'SIMULATED,DENSITY SCOPE,0,0'
+        raise ValueError("simulated scope does not understand " + command)
+
+    def write(self, command):
+        command = command.strip()
+        self.commands.append(command)
+        if command == 'CURVE?':
+            data = self.waveform_codes().tobytes()
+            length = str(len(data))
+            self._pending_read = b'#' + str(len(length)).encode() + length.encode() + data + b'\n'
+        elif command.startswith('DATA:STOP '):
+            self.record_length = int(command.split(' ')[1])
+
+    def read_raw(self):
+        raw = self._pending_read
+        self._pending_read = None
+        if raw is None:
+            raise ValueError("nothing to read from the simulated scope")
+        return raw
+
+    def close(self):
+        pass
+
+
+#the scope backends connectToScope can use
+#"visa" is the real oscilloscope, "simulated" is SimulatedScope (the address is ignored)
+SCOPE_BACKENDS = {
+    "visa": open_visa_scope,
+    "simulated": lambda scope_address, **kwargs: SimulatedScope(**kwargs)
+}
+
+
+def open_scope(scope_address, backend="visa", **kwargs):
+    if backend not in SCOPE_BACKENDS:
+        raise ValueError("unknown scope backend " + str(backend) + ", use one of " + ", ".join(SCOPE_BACKENDS))
+    return SCOPE_BACKENDS[backend](scope_address, **kwargs)
+
+
+#####################################################################################
+# POWER SUPPLIES FOR THE COILS
+#####################################################################################
+
+class PowerSupply(ABC):
+    """
+    The calls the current sweep makes on the coil power supply.
+
+    A backend has to implement set_current, get_current and output, or it cannot be created.
+
+    Methods
+    -------
+    set_current(self, current)
+        Sets the output current, in amps.
+    get_current(self)
+        Returns the output current, in amps.
+    output(self, on)
+        Turns the output on (True) or off (False).
+    close(self)
+        Closes the connection.
+    """
+
+    @abstractmethod
+    def set_current(self, current):
+        pass
+
+    @abstractmethod
+    def get_current(self):
+        pass
+
+    @abstractmethod
+    def output(self, on):
+        pass
+
+    def close(self):
+        pass
+
+
+class VisaPowerSupply(PowerSupply):
+    """
+    A power supply that understands the standard SCPI current commands, connected through pyvisa.
+    """
+
+    def __init__(self, supply_address):
+        import pyvisa as visa # http://github.com/hgrecco/pyvisa
+        rm = visa.ResourceManager()
+        self.resource = rm.open_resource(supply_address)
+
+    def set_current(self, current):
+        self.resource.write('CURR ' + str(float(current)))
+
+    def get_current(self):
+        return float(self.resource.query('MEAS:CURR?'))
+
+    def output(self, on):
+        self.resource.write('OUTP ON' if on else 'OUTP OFF')
+
+    def close(self):
+        self.resource.close()
+
+
+class SimulatedPowerSupply(PowerSupply):
+    """
+    A stand-in for the coil power supply. If it is given a SimulatedScope, setting the
+    current here changes the field the simulated scope sees.
+    """
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.current = 0.0
+        self.is_on = False
+
+    def set_current(self, current):
+        self.current = float(current)
+        if self.scope is not None:
+            self.scope.set_current(self.current if self.is_on else 0.0)
+
+    def get_current(self):
+        return self.current if self.is_on else 0.0
+
+    def output(self, on):
+        self.is_on = bool(on)
+        self.set_current(self.current)
+
+
+#the power supply backends open_power_supply can use
+POWER_SUPPLY_BACKENDS = {
+    "visa": lambda supply_address, **kwargs: VisaPowerSupply(supply_address),
+    "simulated": lambda supply_address, **kwargs: SimulatedPowerSupply(**kwargs)
+}
+
+
+def open_power_supply(supply_address, backend="visa", **kwargs):
+    if backend not in POWER_SUPPLY_BACKENDS:
+        raise ValueError("unknown power supply backend " + str(backend) + ", use one of " + ", ".join(POWER_SUPPLY_BACKENDS))
+    return POWER_SUPPLY_BACKENDS[backend](supply_address, **kwargs)
@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+import numpy as np
+
+from functions.analysis_modules import analysis_module
+from functions.trial_recorder import TrialRecorder
+
+#keeps every sample behind every data point, so old runs can be re-analyzed (new filters, other statistics)
+#without going back to the lab. The samples of a trial go in a folder next to its raw data file:
+#   2024-08-01_cell-314B_temp-100_trial-1.csv            the trial, its "Sample Segment" column links each row
+#   2024-08-01_cell-314B_temp-100_trial-1_samples/
+#       index.csv                                       one row per segment: current, number of samples, files
+#       segment-00000.npz                               the samples (volts) and when they were read
+#(or segment-00000.npy and segment-00000_times.npy when not compressed). Each point is its own file, so
+#reading one point never touches the rest, and uncompressed segments can be memory mapped.
+
+#the folder and index names belong to the reader, density_analysis/density_calculations/sample_archive.py,
+#so the writer and the reader can never disagree about them
+_archive_layout = analysis_module("sample_archive")
+SAMPLE_ARCHIVE_SUFFIX = _archive_layout.SAMPLE_ARCHIVE_SUFFIX
+SAMPLE_INDEX_FILENAME = _archive_layout.SAMPLE_INDEX_FILENAME
+SAMPLE_INDEX_COLUMNS = _archive_layout.SAMPLE_INDEX_COLUMNS
+sample_archive_path = _archive_layout.sample_archive_path
+
+
+class SampleArchiveWriter:
+    """
+    Writes the samples of each data point to a trial's sample archive on a background thread.
+
+    submit only hands the samples to the writer thread and returns the segment number, so
+    acquisition never waits for the disk.
+
+    Attributes
+    ----------
+    folder : string
+        The archive folder (see sample_archive_path).
+    compress : bool
+        If True (default), each segment is one compressed .npz file. If False, each segment is two .npy
+        files, which are larger but can be memory mapped.
+    errors : list of strings
+        Problems the writer thread ran into. The segments they happened on are missing from the index.
+
+    Methods
+    -------
+    submit(self, current, samples, sample_times=None)
+        Queues the samples of one data point, returns its segment number.
+    pending(self)
+        Number of segments waiting to be written.
+    close(self)
+        Writes everything still queued and stops the writer thread.
+    """
+
+    def __init__(self, folder, compress=True):
+        self.folder = folder
+        self.compress = compress
+        self.errors = []
+        os.makedirs(folder, exist_ok=True)
+        #a trial that is started again keeps its old segments and numbers the new ones after them
+        self._index = TrialRecorder(os.path.join(folder, SAMPLE_INDEX_FILENAME), SAMPLE_INDEX_COLUMNS,
+                                    dtype=object, load_existing=True)
+        self._next_segment = len(self._index)
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, current, samples, sample_times=None):
+        """
+        Parameters
+        ----------
+        current : float
+            The current of the data point.
+        samples : list of floats or arrays
+            The samples (volts), as collected with collectDataPoint(..., samples=...). They are joined
+            on the writer thread, so do not change the list after submitting it.
+        sample_times : list of floats or arrays
+            When each sample was read, as collected with collectDataPoint(..., sample_times=...).
+            Set to None by default.
+
+        Returns
+        -------
+        segment : int
+            The segment number, for the "Sample Segment" column of the trial file.
+        """
+
+        segment = self._next_segment
+        self._next_segment += 1
+        self._jobs.put((segment, current, samples, sample_times))
+        return segment
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def _write(self, segment, current, samples, sample_times):
+        if len(samples) and np.ndim(samples[0]) > 0:
+            #waveform records
+            values = np.concatenate([np.asarray(s).ravel() for s in samples])
+        else:
+            values = np.asarray(samples, dtype=float)
+        #one time per sample, or one array per waveform record
+        times = np.asarray(np.hstack(sample_times) if sample_times else [], dtype=float)
+        name = "segment-" + str(segment).zfill(5)
+        if self.compress:
+            samples_file = times_file = name + ".npz"
+            np.savez_compressed(os.path.join(self.folder, samples_file), samples=values, times=times)
+        else:
+            samples_file, times_file = name + ".npy", name + "_times.npy"
+            np.save(os.path.join(self.folder, samples_file), values)
+            np.save(os.path.join(self.folder, times_file), times)
+        #the index row is written last, so a segment in the index always has its files
+        self._index.append([segment, float(current), len(values), samples_file, times_file])
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            try:
+                self._write(*job)
+            except Exception as e:
+                self.errors.append("segment " + str(job[0]) + ": " + type(e).__name__ + ": " + str(e))
+
+    def close(self):
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+            self._index.close()
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class RunningStats:
+    """
+    Keeps the mean and standard deviation of a stream of samples without storing them all.
+
+    Single samples are added with Welford's update, whole arrays (e.g. waveform records) with
+    update_batch, and accumulators filled in parallel chunks can be combined with merge. The
+    mean absolute error needs the final mean, so it is computed on demand from a bounded
+    buffer of the most recent samples; it is exact while fewer than buffer_size samples
+    have been added. With buffer_size 0 nothing is kept, for callers that work the mean
+    absolute error out some other way.
+
+    Attributes
+    ----------
+    count : int
+        Number of samples added.
+    mean : float
+        Mean of all samples added.
+    buffer_size : int
+        Number of recent samples kept for the mean absolute error, 0 to keep none. Defaults to 100000.
+
+    Methods
+    -------
+    update(self, x)
+        Adds one sample.
+    update_batch(self, samples)
+        Adds an array of samples.
+    merge(self, other)
+        Adds all the samples from another RunningStats.
+    variance(self)
+        Population variance (same as np.var).
+    std(self)
+        Population standard deviation (same as np.std).
+    mean_abs_error(self)
+        Mean absolute difference from the mean (same as utilities.meanAbsError), nan if buffer_size is 0.
+    data_point(self)
+        [mean, mean absolute error, standard deviation], the same as collectDataPoint returns.
+    """
+
+    def __init__(self, buffer_size=100000):
+        if int(buffer_size) < 0:
+            raise ValueError("buffer_size must be at least 0, not " + str(buffer_size))
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.buffer_size = int(buffer_size)
+        self._buffer = np.empty(self.buffer_size)
+        self._buffer_pos = 0
+
+    def _remember(self, samples):
+        #ring buffer of the most recent samples
+        if self.buffer_size == 0:
+            return
+        samples = samples[-self.buffer_size:]
+        n = len(samples)
+        first = min(n, self.buffer_size - self._buffer_pos)
+        self._buffer[self._buffer_pos:self._buffer_pos+first] = samples[:first]
+        self._buffer[:n-first] = samples[first:]
+        self._buffer_pos = (self._buffer_pos + n) % self.buffer_size
+
+    def _combine(self, n_b, mean_b, m2_b):
+        #Chan et al. formula for combining two sets of (count, mean, sum of squared differences)
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta*n_b/n
+        self._m2 = self._m2 + m2_b + delta**2*n_a*n_b/n
+        self.count = n
+
+    def update(self, x):
+        x = float(x)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta/self.count
+        self._m2 += delta*(x - self.mean)
+        if self.buffer_size == 0:
+            return
+        self._buffer[self._buffer_pos] = x
+        self._buffer_pos = (self._buffer_pos + 1) % self.buffer_size
+
+    def update_batch(self, samples):
+        samples = np.asarray(samples, dtype=float).ravel()
+        if len(samples) == 0:
+            return
+        batch_mean = samples.mean()
+        batch_m2 = np.sum((samples - batch_mean)**2)
+        self._combine(len(samples), batch_mean, batch_m2)
+        self._remember(samples)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        retained = other._retained()
+        self._combine(other.count, other.mean, other._m2)
+        self._remember(retained)
+
+    #the buffered samples, oldest first
+    def _retained(self):
+        n = min(self.count, self.buffer_size)
+        if self.count <= self.buffer_size:
+            return self._buffer[:n]
+        return np.concatenate((self._buffer[self._buffer_pos:], self._buffer[:self._buffer_pos]))
+
+    def variance(self):
+        if self.count == 0:
+            return np.nan
+        return self._m2/self.count
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def mean_abs_error(self):
+        if self.count == 0 or self.buffer_size == 0:
+            return np.nan
+        return np.mean(np.abs(self._retained() - self.mean))
+
+    def data_point(self):
+        return np.array([self.mean, self.mean_abs_error(), self.std()])
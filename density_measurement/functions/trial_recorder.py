@@ -0,0 +1,144 @@
+import csv
+import os
+import numpy as np
+import pandas as pd
+
+
+class TrialRecorder:
+    """
+    Records the rows of a data file (raw trial, params or calibration) as they are collected.
+
+    The file is opened once and kept open. Rows are stored in preallocated column arrays that
+    double in size when they fill up, so adding a row takes the same time no matter how long
+    the session has run. New rows are written to the file every flush_every rows, and each
+    write is fsynced (if fsync is True) so the data survives a crash or power cut.
+
+    Attributes
+    ----------
+    filepath : string
+        The csv file being recorded to.
+    columns : list of strings
+        The column names, in file order.
+    flush_every : int
+        Number of new rows to collect before writing them to the file. Defaults to 1.
+    fsync : bool
+        If True (default), force every write onto the disk.
+
+    Methods
+    -------
+    __init__(self, filepath, columns, dtype=float, flush_every=1, fsync=True, load_existing=False, capacity=64)
+        Opens the file and writes the header if the file is empty.
+    append(self, row)
+        Adds one row, given as a list in column order or a dict.
+    flush(self)
+        Writes all rows that are not in the file yet.
+    column(self, name)
+        Returns the recorded values of one column (a view, not a copy).
+    to_dataframe(self)
+        Returns all the recorded rows as a pandas DataFrame.
+    close(self)
+        Flushes and closes the file.
+    """
+
+    def __init__(self, filepath, columns, dtype=float, flush_every=1, fsync=True, load_existing=False, capacity=64):
+        """
+        Parameters
+        ----------
+        filepath : string
+            The csv file to record to. It is created if it does not exist. If it already has rows,
+            its header must be columns (ValueError otherwise).
+        columns : list of strings
+            The column names, in file order.
+        dtype : numpy dtype
+            The type stored for every column. Use object for files with text columns.
+        flush_every : int
+            Number of new rows to collect before writing them to the file.
+        fsync : bool
+            If True, force every write onto the disk.
+        load_existing : bool
+            If True, rows already in the file are loaded, so column and to_dataframe
+            include them. They are not written again.
+        capacity : int
+            Number of rows to make room for at the start.
+        """
+
+        self.filepath = filepath
+        self.columns = list(columns)
+        self.dtype = dtype
+        self.flush_every = max(1, int(flush_every))
+        self.fsync = fsync
+        self._size = 0
+        self._flushed = 0
+        self._arrays = [np.empty(capacity, dtype=dtype) for _ in self.columns]
+
+        has_data = os.path.isfile(filepath) and os.path.getsize(filepath) > 0
+        if has_data:
+            #new rows are written in column order under the header already in the file, so they have to match
+            #(an older file, or one edited by hand, would otherwise get rows under the wrong columns)
+            with open(filepath, newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != self.columns:
+                raise ValueError(str(filepath) + " has the columns [" + ", ".join(header) + "], not ["
+                                 + ", ".join(self.columns) + "]. Move it aside or fix its header to record to it.")
+        if has_data and load_existing:
+            existing = pd.read_csv(filepath)
+            for row in existing.itertuples(index=False):
+                self._store(row)
+            self._flushed = self._size
+        self._file = open(filepath, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if not has_data:
+            self._writer.writerow(self.columns)
+            self._sync()
+
+    def __len__(self):
+        return self._size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _store(self, row):
+        if isinstance(row, dict):
+            row = [row[name] for name in self.columns]
+        if self._size == len(self._arrays[0]):
+            #out of room, double the capacity of every column
+            for i, arr in enumerate(self._arrays):
+                bigger = np.empty(max(1, 2*len(arr)), dtype=self.dtype)
+                bigger[:self._size] = arr[:self._size]
+                self._arrays[i] = bigger
+        for arr, value in zip(self._arrays, row):
+            arr[self._size] = value
+        self._size += 1
+
+    def _sync(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def append(self, row):
+        self._store(row)
+        if self._size - self._flushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._file is None or self._flushed == self._size:
+            return
+        new_rows = zip(*[arr[self._flushed:self._size] for arr in self._arrays])
+        self._writer.writerows(new_rows)
+        self._flushed = self._size
+        self._sync()
+
+    def column(self, name):
+        return self._arrays[self.columns.index(name)][:self._size]
+
+    def to_dataframe(self):
+        return pd.DataFrame({name: self.column(name) for name in self.columns})
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
@@ -1,4 +1,5 @@
 import datetime
+import time
 import numpy as np
 from datetime import date
 import csv
@@ -89,6 +90,7 @@ def dtStringForFilename():
     return fn
 
 #takes a time stamp (float) and converts it into an array in the format [date, time]
+#(for whole arrays of timestamps use formatTimestampsForCSV)
 def timestampToArray(ts):
     dt_obj = datetime.datetime.fromtimestamp(ts)
     dt_arry = str(dt_obj).split(' ')
@@ -105,25 +107,84 @@ def twoDArryToTwoOneDArry(arry):
         arry_1.append(x[1])
     return (arry_0, arry_1)
 
+#the wall clock reading and the monotonic clock reading at the same moment, see monotonicTimestamp
+_clock_anchor = (time.time(), time.monotonic())
+
+#seconds since the epoch, like time.time(), but it never goes backwards or jumps when the
+#system clock is changed (it is time.time() at import, advanced by time.monotonic())
+def monotonicTimestamp():
+    return _clock_anchor[0] + (time.monotonic() - _clock_anchor[1])
+
+#the local time zone offset (seconds) for an array of timestamps, looked up once for every 15 minutes
+#the timestamps cover (time zone changes always happen on a 15 minute boundary)
+def _utcOffsets(times):
+    blocks = np.floor(times/900.0)
+    unique_blocks, inverse = np.unique(blocks[np.isfinite(blocks)], return_inverse=True)
+    offsets = np.zeros(len(unique_blocks))
+    for i, b in enumerate(unique_blocks):
+        t = b*900.0
+        local = datetime.datetime.fromtimestamp(t)
+        utc = datetime.datetime.fromtimestamp(t, datetime.timezone.utc).replace(tzinfo=None)
+        offsets[i] = (local - utc).total_seconds()
+    result = np.zeros(len(times))
+    result[np.isfinite(blocks)] = offsets[inverse]
+    return result
+
+def timestampsToDatetime64(times):
+    """
+    Converts timestamps (seconds since the epoch) to local date and time, all at once.
+
+    Parameters
+    ----------
+    times : array of floats
+        The timestamps, e.g. from time.time() or monotonicTimestamp.
+
+    Returns
+    -------
+    datetimes : numpy array of datetime64[us]
+        The local date and time of each timestamp, rounded to the microsecond like datetime.fromtimestamp.
+        NaN timestamps become NaT.
+    """
+
+    times = np.asarray(times, dtype=float).ravel()
+    valid = np.isfinite(times)
+    times = np.where(valid, times, 0.0)
+    #whole seconds and the fraction are rounded separately, the same way datetime does it
+    seconds = np.floor(times)
+    microseconds = np.round((times - seconds)*1.0E6).astype(np.int64)
+    seconds = (seconds + _utcOffsets(times)).astype(np.int64)
+    datetimes = (seconds*1000000 + microseconds).view('datetime64[us]')
+    datetimes[~valid] = np.datetime64('NaT')
+    return datetimes
+
 #takes an array of timestamps and converts it to two arrays, one containing all the dates, the other containing all the times
+#the strings are the same as str(datetime.datetime.fromtimestamp(x)) split at the space, NaN timestamps give empty strings
 def formatTimestampsForCSV(times):
-    arry_0 = []
-    arry_1 = []
-
-    for x in times:
-        temp = timestampToArray(x)
-        arry_0.append(temp[0])
-        arry_1.append(temp[1])
-    
-    return (arry_0, arry_1)
+    datetimes = timestampsToDatetime64(times)
+    strings = np.datetime_as_string(datetimes, unit='us')
+    #'YYYY-MM-DDTHH:MM:SS.ffffff': the date is the first 10 characters and the time the 15 after the T,
+    #cut out of the characters directly (np.char.partition does the same split far slower)
+    dates = strings.astype('U10')
+    characters = strings.view('U1').reshape(-1, strings.dtype.itemsize//4)
+    clock_times = np.ascontiguousarray(characters[:, 11:26]).view('U15').ravel()
+    #datetime leaves the fraction off when it is zero, 'HH:MM:SS' is the first 8 characters
+    whole_seconds = datetimes == datetimes.astype('datetime64[s]')
+    clock_times[whole_seconds] = clock_times[whole_seconds].astype('U8')
+    missing = np.isnat(datetimes)
+    dates[missing] = ''
+    clock_times[missing] = ''
+    return (dates, clock_times)
+
+#the reverse of formatTimestampsForCSV: date and time columns (e.g. from a csv file) to datetime64, without a loop
+def parseDateTimeColumns(dates, times):
+    dates = np.asarray(dates, dtype=str)
+    times = np.asarray(times, dtype=str)
+    return np.char.add(np.char.add(dates, 'T'), times).astype('datetime64[us]')
 
 def meanAbsError(data_set):
-    sum = 0
-    num_pts = len(data_set)
+    data_set = np.asarray(data_set, dtype=float)
     avg = np.average(data_set)
-    for i in range(num_pts): 
-        sum += abs(data_set[i] - avg) 
-    error = sum/num_pts
+    error = np.mean(np.abs(data_set - avg))
     return error
 
 def createFilePath(folder, collection_type):
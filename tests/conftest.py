@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+#the analysis code is imported as density_analysis.density_calculations.<module> from the repo root,
+#the measurement code as functions.<module>, the way the measurement app runs from density_measurement
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (REPO_ROOT, os.path.join(REPO_ROOT, "density_measurement")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+#the field, rotation and rotation error of one synthetic trial: a straight line with gaussian noise of the given errors
+def make_line_trial(rng, num_points=21, slope=1.0E-4, intercept=2.0E-4):
+    field = np.linspace(-20, 20, num_points)
+    err = rng.uniform(1.0E-5, 3.0E-5, num_points)
+    rotation = slope*field + intercept + rng.normal(0, 1, num_points)*err
+    return field, rotation, err
+
+
+#the same trial as a processed trial (processing.PROCESSED_COLUMNS)
+def make_processed_trial(rng, num_points=21, slope=1.0E-4, intercept=2.0E-4):
+    import pandas as pd
+    from density_analysis.density_calculations.processing import PROCESSED_COLUMNS
+    field, rotation, err = make_line_trial(rng, num_points, slope, intercept)
+    return pd.DataFrame(dict(zip(PROCESSED_COLUMNS, [field, rotation, 0.8*err, err])))
+
+
+@pytest.fixture
+def line_trial():
+    return make_line_trial
+
+
+@pytest.fixture
+def processed_trial():
+    return make_processed_trial
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+from density_analysis.density_calculations.catalog import ResultsCatalog
+
+
+def summary_row(folder, temp, trial_num, density, density_err, error=""):
+    raw_file = os.path.join(folder, "2023-06-27_cell-309A_temp-" + temp + "_trial-" + str(trial_num) + ".csv")
+    return {"Raw File": raw_file, "Date": "2023-06-27", "Cell": "309A", "Oven Temperature": temp,
+            "Trial Number": str(trial_num), "Laser Wavelength": 7.8E-5, "Optical Length": 3.7,
+            "Slope": 1.0E-4, "Density": density, "Density Error": density_err, "Error": error}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    with ResultsCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        yield catalog
+
+
+def test_paths_are_normalized(catalog, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    catalog.add([summary_row("Data", "100", 1, 1.0E12, 1.0E10)])
+    #the same trial written another way replaces it instead of being added again
+    catalog.add([summary_row(os.path.join(".", "Data"), "100", 1, 2.0E12, 1.0E10)])
+    assert len(catalog) == 1
+    rows = catalog.rows([os.path.join(str(tmp_path), "Data", "2023-06-27_cell-309A_temp-100_trial-1.csv")])
+    assert len(rows) == 1 and rows[0]["Density"] == 2.0E12
+    catalog.remove([os.path.join("Data", "2023-06-27_cell-309A_temp-100_trial-1.csv")])
+    assert len(catalog) == 0
+
+
+def test_rows_keep_the_summary_types(catalog, tmp_path):
+    row = summary_row(str(tmp_path), "100", 3, 1.0E12, 1.0E10)
+    row["Downweighted Points"] = np.int64(2)
+    catalog.add([row])
+    read_back = catalog.rows([row["Raw File"]])[0]
+    assert read_back["Raw File"] == row["Raw File"]
+    #oven temperature and trial number stay the text from the file name (not 100.0)
+    assert read_back["Oven Temperature"] == "100" and read_back["Trial Number"] == "3"
+    assert read_back["Downweighted Points"] == 2 and isinstance(read_back["Downweighted Points"], int)
+    assert read_back["Density"] == 1.0E12 and read_back["Error"] == ""
+
+
+def test_query_filters_and_sorts_numerically(catalog, tmp_path):
+    catalog.add([summary_row(str(tmp_path), temp, i, 1.0E12*(i + 1), 1.0E10)
+                 for i, temp in enumerate(["90", "100", "110", "120"])])
+    results = catalog.query(["Oven Temperature", "Density"], order_by="oven_temp", oven_temp=(95, 115))
+    np.testing.assert_array_equal(results["Oven Temperature"], [100.0, 110.0])
+    np.testing.assert_array_equal(results["Density"], [2.0E12, 3.0E12])
+
+
+def test_group_by_leaves_rows_without_errors_out_of_the_weighted_mean(catalog, tmp_path):
+    folder = str(tmp_path)
+    catalog.add([summary_row(folder, "100", 1, 1.0E12, 1.0E10), summary_row(folder, "100", 2, 3.0E12, 2.0E10),
+                 summary_row(folder, "100", 3, 5.0E12, 0.0), summary_row(folder, "110", 4, 7.0E12, 1.0E10),
+                 summary_row(folder, "110", 5, 9.0E12, 1.0E10, error="ValueError: bad file")])
+    groups = catalog.group_by("Oven Temperature", "Density", "Density Error")
+    np.testing.assert_array_equal(groups["Oven Temperature"], [100.0, 110.0])
+    #the failed trial is left out, the zero error one only from the weighted mean
+    np.testing.assert_array_equal(groups["count"], [3, 1])
+    np.testing.assert_array_equal(groups["weighted_count"], [2, 1])
+    np.testing.assert_allclose(groups["mean"], [3.0E12, 7.0E12])
+    np.testing.assert_allclose(groups["std"][0], np.std([1.0E12, 3.0E12, 5.0E12]), rtol=1.0E-9)
+    w = np.array([1/1.0E10**2, 1/2.0E10**2])
+    np.testing.assert_allclose(groups["weighted_mean"], [np.sum(w*[1.0E12, 3.0E12])/np.sum(w), 7.0E12])
+    np.testing.assert_allclose(groups["weighted_mean_err"], [1/np.sqrt(np.sum(w)), 1.0E10])
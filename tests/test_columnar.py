@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from density_analysis.density_calculations.columnar import columnar_path, convert_tree, read_columns, read_table, \
+    table_source, write_columns
+
+
+def params_table(num_rows=4):
+    return pd.DataFrame({"Trial Number": np.arange(1, num_rows + 1), "Conversion Factor": np.linspace(0.05, 0.06, num_rows),
+                         "Cell": ["309A"]*num_rows, "Notes": ["ok", np.nan] + [""]*(num_rows - 2)})
+
+
+def test_round_trip_keeps_values_and_types(tmp_path):
+    table = params_table()
+    path = str(tmp_path / "params.cols")
+    write_columns(table, path)
+    read_back = read_columns(path, mmap=False)
+    assert list(read_back.columns) == list(table.columns)
+    assert read_back["Trial Number"].dtype == np.int64 and read_back["Conversion Factor"].dtype == np.float64
+    #missing text stays missing and an empty string stays empty (a csv file cannot tell the two apart)
+    assert pd.isna(read_back["Notes"][1]) and read_back["Notes"][2] == ""
+    pd.testing.assert_frame_equal(read_back, table, check_dtype=False)
+
+
+def test_read_table_uses_the_copy_only_while_it_is_up_to_date(tmp_path):
+    csv_path = str(tmp_path / "Experiment_Params_2023-06-27.csv")
+    params_table().to_csv(csv_path, index=False)
+    write_columns(params_table(), columnar_path(csv_path))
+    assert table_source(csv_path).endswith("columns.json")
+    #a csv saved after the copy was made is read instead of the stale copy
+    changed = params_table(5)
+    changed.to_csv(csv_path, index=False)
+    later = os.path.getmtime(table_source(csv_path)) + 10
+    os.utime(csv_path, (later, later))
+    assert table_source(csv_path) == csv_path
+    assert len(read_table(csv_path)) == 5
+
+
+def test_convert_tree_skips_small_and_up_to_date_tables(tmp_path):
+    params_table(10).to_csv(tmp_path / "big.csv", index=False)
+    params_table(3).to_csv(tmp_path / "small.csv", index=False)
+    assert convert_tree(str(tmp_path), min_rows=5) == [str(tmp_path / "big.csv")]
+    assert convert_tree(str(tmp_path), min_rows=5) == []
+    pd.testing.assert_frame_equal(read_table(str(tmp_path / "big.csv"), mmap=False), pd.read_csv(tmp_path / "big.csv"),
+                                  check_dtype=False)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from functions.density_collection_functions import collectDataPoint
+from functions.instruments import SimulatedScope
+
+
+def test_every_sample_gets_a_time():
+    scope = SimulatedScope(record_length=500, seed=0)
+    sample_times = []
+    collectDataPoint(5, 0, scope, mode="measurement", sample_times=sample_times)
+    assert len(sample_times) == 5 and np.all(np.diff(sample_times) >= 0)
+
+
+def test_waveform_sample_times_are_xincr_apart():
+    scope = SimulatedScope(record_length=500, seed=0)
+    samples, sample_times = [], []
+    collectDataPoint(3, 0, scope, mode="waveform", sample_times=sample_times, samples=samples)
+    assert [len(t) for t in sample_times] == [len(s) for s in samples]
+    for times in sample_times:
+        #seconds since the epoch resolve about 0.2 microseconds
+        np.testing.assert_allclose(np.diff(times), scope.xincr, atol=5.0E-7)
+    assert np.all(np.diff([times[-1] for times in sample_times]) >= 0)
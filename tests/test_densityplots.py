@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from density_analysis.density_calculations import plotSettings as ps
+from density_analysis.density_calculations.densityplots import fit_to_gaussian, fit_to_line, fit_to_ln, fit_to_sine
+from density_analysis.density_calculations.linear_fit import weighted_line_fit
+
+
+def test_fit_to_line_matches_weighted_line_fit(line_trial):
+    field, rotation, err = line_trial(np.random.default_rng(0))
+    param, pcov = fit_to_line(ps.plotable(field, rotation, 7.8E-5, 3.7, y_error=err))
+    slope, intercept, cov = weighted_line_fit(field, rotation, err)
+    np.testing.assert_allclose(param, [slope, intercept], rtol=1.0E-12)
+    np.testing.assert_allclose(pcov, cov, rtol=1.0E-12)
+
+
+@pytest.mark.parametrize("robust", [None, "huber"])
+def test_fit_to_line_zero_errors_fit_unweighted(line_trial, robust):
+    #hand-made test files have zero errors, which would give those points infinite weight
+    field, rotation, err = line_trial(np.random.default_rng(1))
+    for y_error in (np.zeros_like(err), np.where(np.arange(len(err)) == 3, 0.0, err)):
+        with np.errstate(all="raise"):
+            fit = fit_to_line(ps.plotable(field, rotation, 7.8E-5, 3.7, y_error=y_error), robust)
+        unweighted = fit_to_line(ps.plotable(field, rotation, 7.8E-5, 3.7), robust)
+        np.testing.assert_allclose(fit[0], unweighted[0], rtol=1.0E-12)
+        assert np.all(np.isfinite(fit[0]))
+
+
+@pytest.mark.parametrize("fit", [fit_to_ln, fit_to_sine, fit_to_gaussian])
+def test_curve_fits_with_zero_errors_fit_unweighted(fit):
+    rng = np.random.default_rng(2)
+    x = np.linspace(0.5, 5, 40)
+    y = {fit_to_ln: 0.8*np.log(3*x) - 1, fit_to_sine: 1.3*np.sin(2.1*x) + 0.2,
+         fit_to_gaussian: 2.0*np.exp(-(x - 2.5)**2/1.5) + 0.3}[fit] + rng.normal(0, 0.01, len(x))
+    param, pcov = fit(ps.plotable(x, y, 7.8E-5, 3.7, y_error=np.zeros_like(x)))
+    expected, _ = fit(ps.plotable(x, y, 7.8E-5, 3.7))
+    np.testing.assert_allclose(param, expected, rtol=1.0E-12)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from scipy.optimize import curve_fit
+
+from density_analysis.density_calculations.linear_fit import pad_trials, robust_line_fit, weighted_line_fit
+
+
+def line(x, slope, intercept):
+    return slope*x + intercept
+
+
+#covariances are compared relative to their largest element, since the off diagonal ones can be about 0
+def assert_cov_close(cov, pcov):
+    np.testing.assert_allclose(cov, pcov, rtol=1.0E-5, atol=1.0E-8*np.max(np.abs(pcov)))
+
+
+@pytest.mark.parametrize("absolute_sigma", [False, True])
+def test_weighted_line_fit_matches_curve_fit(line_trial, absolute_sigma):
+    x, y, sigma = line_trial(np.random.default_rng(0))
+    p, pcov = curve_fit(line, x, y, sigma=sigma, absolute_sigma=absolute_sigma)
+    slope, intercept, cov = weighted_line_fit(x, y, sigma, absolute_sigma)
+    np.testing.assert_allclose([slope, intercept], p, rtol=1.0E-7)
+    assert_cov_close(cov, pcov)
+
+
+def test_weighted_line_fit_unweighted_matches_curve_fit(line_trial):
+    x, y, _ = line_trial(np.random.default_rng(1))
+    p, pcov = curve_fit(line, x, y)
+    slope, intercept, cov = weighted_line_fit(x, y)
+    np.testing.assert_allclose([slope, intercept], p, rtol=1.0E-7)
+    assert_cov_close(cov, pcov)
+
+
+def test_weighted_line_fit_stack_matches_each_trial(line_trial):
+    rng = np.random.default_rng(2)
+    trials = [line_trial(rng, n) for n in (5, 21, 12, 2)]
+    slope, intercept, cov = weighted_line_fit(*[pad_trials([t[i] for t in trials]) for i in range(3)])
+    for i, (x, y, sigma) in enumerate(trials):
+        s, b, c = weighted_line_fit(x, y, sigma)
+        np.testing.assert_allclose([slope[i], intercept[i]], [s, b], rtol=1.0E-12)
+        np.testing.assert_allclose(cov[i], c, rtol=1.0E-10)
+
+
+def test_weighted_line_fit_empty_trial_is_nan():
+    slope, intercept, cov = weighted_line_fit(np.full((1, 4), np.nan), np.full((1, 4), np.nan))
+    assert np.isnan(slope[0]) and np.isnan(intercept[0])
+
+
+@pytest.mark.parametrize("loss", ["huber", "tukey"])
+def test_robust_line_fit_without_outliers_matches_curve_fit(line_trial, loss):
+    x, y, sigma = line_trial(np.random.default_rng(3))
+    p, _ = curve_fit(line, x, y, sigma=sigma)
+    slope, intercept, _, weights = robust_line_fit(x, y, sigma, loss)
+    #gaussian noise barely moves the robust fit away from least squares
+    _, _, cov = weighted_line_fit(x, y, sigma)
+    assert abs(slope - p[0]) < 0.5*np.sqrt(cov[0, 0])
+    assert abs(intercept - p[1]) < 0.5*np.sqrt(cov[1, 1])
+    assert np.all(weights > 0)
+
+
+@pytest.mark.parametrize("loss", ["huber", "tukey"])
+def test_robust_line_fit_ignores_a_glitch(line_trial, loss):
+    x, y, sigma = line_trial(np.random.default_rng(4))
+    clean = np.ones(len(x), dtype=bool)
+    clean[3] = False
+    p, _ = curve_fit(line, x[clean], y[clean], sigma=sigma[clean])
+    y[3] += 1.0E-3
+    slope, _, _, weights = robust_line_fit(x, y, sigma, loss)
+    assert weights[3] < 0.1
+    assert abs(slope - p[0]) < 0.05*abs(p[0] - weighted_line_fit(x, y, sigma)[0])
+
+
+def test_robust_line_fit_stack_matches_each_trial(line_trial):
+    rng = np.random.default_rng(5)
+    trials = [line_trial(rng, n) for n in (8, 21, 15)]
+    trials[1][1][4] += 1.0E-3
+    slope, intercept, _, _ = robust_line_fit(*[pad_trials([t[i] for t in trials]) for i in range(3)], loss="tukey")
+    for i, (x, y, sigma) in enumerate(trials):
+        s, b, _, _ = robust_line_fit(x, y, sigma, "tukey")
+        np.testing.assert_allclose([slope[i], intercept[i]], [s, b], rtol=1.0E-9)
+
+
+def test_robust_line_fit_rejects_unknown_loss():
+    with pytest.raises(ValueError):
+        robust_line_fit([0, 1, 2], [0, 1, 2], loss="cauchy")
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from scipy.optimize import curve_fit
+
+from density_analysis.density_calculations.nonlinear_fit import fit_curve, fit_curves
+
+
+def sine(x, a, b, c):
+    return a*np.sin(b*x) + c
+
+
+def gaussian(x, a, b, c, d):
+    return a*np.exp(-(x - b)**2/c) + d
+
+
+#the ln model is fit with b = 1 (see nonlinear_fit._ln_model), so curve_fit gets the same two parameters
+def ln(x, a, c):
+    return a*np.log(np.abs(x)) + c
+
+
+def test_fit_curve_gaussian_matches_curve_fit():
+    rng = np.random.default_rng(0)
+    x = np.linspace(-5, 5, 60)
+    y = gaussian(x, 2.0, 0.7, 1.5, 0.3) + rng.normal(0, 0.02, len(x))
+    p, pcov = curve_fit(gaussian, x, y, p0=[2.0, 0.7, 1.5, 0.3])
+    param, cov = fit_curve("gaussian", x, y)
+    np.testing.assert_allclose(param, p, rtol=1.0E-6)
+    np.testing.assert_allclose(cov, pcov, rtol=1.0E-3, atol=1.0E-6*np.max(np.abs(pcov)))
+
+
+def test_fit_curve_sine_matches_curve_fit():
+    rng = np.random.default_rng(1)
+    x = np.linspace(-5, 5, 60)
+    sigma = rng.uniform(0.03, 0.08, len(x))
+    y = sine(x, 1.3, 2.1, 0.2) + rng.normal(0, 1, len(x))*sigma
+    p, pcov = curve_fit(sine, x, y, p0=[1.3, 2.1, 0.2], sigma=sigma)
+    param, cov = fit_curve("sine", x, y, sigma)
+    np.testing.assert_allclose(param, p, rtol=1.0E-6)
+    np.testing.assert_allclose(cov, pcov, rtol=1.0E-3, atol=1.0E-6*np.max(np.abs(pcov)))
+
+
+def test_fit_curve_ln_matches_curve_fit():
+    rng = np.random.default_rng(2)
+    x = np.linspace(1, 20, 50)
+    y = 0.8*np.log(np.abs(3*x)) - 1 + rng.normal(0, 0.01, len(x))
+    p, pcov = curve_fit(ln, x, y)
+    param, cov = fit_curve("ln", x, y)
+    np.testing.assert_allclose(param, [p[0], 1.0, p[1]], rtol=1.0E-6)
+    np.testing.assert_allclose(cov[np.ix_([0, 2], [0, 2])], pcov, rtol=1.0E-3)
+
+
+@pytest.mark.parametrize("warm_start", [False, True])
+def test_fit_curves_matches_each_fit(warm_start):
+    rng = np.random.default_rng(3)
+    x = [np.linspace(0, 3, n) for n in (100, 80, 60)]
+    y = [gaussian(xi, 2.0, 1.3, 0.5, 0.5) + rng.normal(0, 0.01, len(xi)) for xi in x]
+    fit_results = fit_curves("gaussian", x, y, warm_start=warm_start)
+    assert fit_results["Converged"].all()
+    for i in range(len(x)):
+        param, cov = fit_curve("gaussian", x[i], y[i])
+        np.testing.assert_allclose(fit_results["Parameters"][i], param, rtol=1.0E-8)
+        np.testing.assert_allclose(fit_results["Covariance"][i], cov, rtol=1.0E-6, atol=1.0E-9*np.max(np.abs(cov)))
+
+
+def test_fit_curves_sine_recovers_every_frequency():
+    rng = np.random.default_rng(4)
+    x = np.tile(np.linspace(-5, 5, 60), (200, 1))
+    b = np.linspace(1, 3, 200)[:, None]
+    y = np.sin(b*x) + rng.normal(0, 0.05, x.shape)
+    fit_results = fit_curves("sine", x, y)
+    assert fit_results["Converged"].all()
+    #within the fit's own error of the true frequency, not stuck on a neighbouring FFT bin
+    assert np.all(np.abs(fit_results["Parameters"][:, 1] - b[:, 0]) < 5*fit_results["Parameter Errors"][:, 1])
+
+
+def test_fit_curves_rejects_unknown_model():
+    with pytest.raises(ValueError):
+        fit_curves("cubic", np.arange(5.0), np.arange(5.0))
@@ -0,0 +1,66 @@
+import numpy as np
+from scipy.optimize import curve_fit
+
+from density_analysis.density_calculations import density_calc as dc
+from density_analysis.density_calculations.resonance_fit import GHZ, fit_resonances
+
+OPTICAL_LENGTH = 3.7
+
+
+#slopes of a scan with density n and resonances f1, f2, and the wavelengths they were taken at
+def resonance_scan(rng, n=5.0E12, f1_shift=3.0E9, f2_shift=-2.0E9, noise=0.01, num_points=40):
+    wavelengths = np.linspace(7.79E-5, 7.96E-5, num_points)
+    laser_f = dc.get_laser_f(wavelengths)
+    #stay away from the resonances themselves
+    keep = (np.abs(laser_f - dc.d1_resonance_f) > 2.0E11) & (np.abs(laser_f - dc.d2_resonance_f) > 2.0E11)
+    wavelengths, laser_f = wavelengths[keep], laser_f[keep]
+    delta = dc.delta_term_from_f(laser_f, dc.d1_resonance_f + f1_shift, dc.d2_resonance_f + f2_shift)
+    slopes = n/(dc.optical_length_term(OPTICAL_LENGTH)*delta)
+    slopes = slopes*(1 + rng.normal(0, noise, len(slopes)))
+    return wavelengths, slopes, np.abs(slopes)*noise
+
+
+#the same model fit by curve_fit, in the same scaled parameters (density / guess, resonance shifts in GHz)
+def curve_fit_scan(wavelengths, slopes, slope_errs, n0):
+    laser_f = dc.get_laser_f(wavelengths)
+    ol = dc.optical_length_term(OPTICAL_LENGTH)
+
+    def model(f, a, s1, s2):
+        D1 = dc.d1_resonance_f + s1*GHZ - f
+        D2 = dc.d2_resonance_f + s2*GHZ - f
+        return a*n0/ol*(4/D1**2 + 7/D2**2 - 2/(D1*D2))
+
+    p, pcov = curve_fit(model, laser_f, slopes, p0=[1.0, 0.0, 0.0], sigma=slope_errs)
+    return p, np.sqrt(np.diag(pcov))
+
+
+def test_fit_resonances_matches_curve_fit():
+    rng = np.random.default_rng(0)
+    scans = [resonance_scan(rng, n, s1, s2) for n, s1, s2 in [(5.0E12, 3.0E9, -2.0E9), (2.0E13, -1.0E9, 4.0E9)]]
+    n0 = [4.0E12, 2.5E13]
+    resonance_results = fit_resonances([s[0] for s in scans], [s[1] for s in scans], [s[2] for s in scans],
+                                       OPTICAL_LENGTH, density_guess=n0)
+    assert resonance_results["Converged"].all()
+    for i, (wavelengths, slopes, slope_errs) in enumerate(scans):
+        p, perr = curve_fit_scan(wavelengths, slopes, slope_errs, n0[i])
+        np.testing.assert_allclose(resonance_results["Density"][i], p[0]*n0[i], rtol=1.0E-6)
+        #the shifts are compared, the resonances themselves are ~4E14 Hz
+        np.testing.assert_allclose((resonance_results["D1 Resonance"][i] - dc.d1_resonance_f)/GHZ, p[1], rtol=1.0E-5)
+        np.testing.assert_allclose((resonance_results["D2 Resonance"][i] - dc.d2_resonance_f)/GHZ, p[2], rtol=1.0E-5)
+        np.testing.assert_allclose(resonance_results["Density Error"][i], perr[0]*n0[i], rtol=1.0E-3)
+        np.testing.assert_allclose(resonance_results["D1 Resonance Error"][i], perr[1]*GHZ, rtol=1.0E-3)
+        np.testing.assert_allclose(resonance_results["D2 Resonance Error"][i], perr[2]*GHZ, rtol=1.0E-3)
+
+
+def test_fit_resonances_finds_noiseless_values():
+    wavelengths, slopes, slope_errs = resonance_scan(np.random.default_rng(1), noise=0.0)
+    resonance_results = fit_resonances(wavelengths, slopes, None, OPTICAL_LENGTH)
+    np.testing.assert_allclose(resonance_results["Density"], 5.0E12, rtol=1.0E-8)
+    np.testing.assert_allclose(resonance_results["D1 Resonance"] - dc.d1_resonance_f, 3.0E9, rtol=1.0E-5)
+    np.testing.assert_allclose(resonance_results["D2 Resonance"] - dc.d2_resonance_f, -2.0E9, rtol=1.0E-5)
+
+
+def test_fit_resonances_too_few_trials_do_not_converge():
+    wavelengths, slopes, slope_errs = resonance_scan(np.random.default_rng(2))
+    resonance_results = fit_resonances([wavelengths, wavelengths[:2]], [slopes, slopes[:2]], None, OPTICAL_LENGTH)
+    assert resonance_results["Converged"].tolist() == [True, False]
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from density_analysis.density_calculations.sample_archive import SampleArchive, recompute_raw_trial, \
+    sample_archive_path, sample_stats
+from functions.sample_archive import SampleArchiveWriter
+
+RAW_COLUMNS = ["Current", "Voltage", "Voltage Mean Absolute Error", "Voltage Standard Deviation", "Timestamp",
+               "Sample Segment"]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_writer_and_reader_round_trip(tmp_path, compress):
+    rng = np.random.default_rng(0)
+    folder = str(tmp_path / "trial_samples")
+    points = [list(rng.normal(0.2, 1.0E-3, 10)), [rng.normal(0.2, 1.0E-3, 50).astype(np.float32) for _ in range(3)]]
+    times = [list(1.7E9 + np.arange(10)), [1.7E9 + 50*i + np.arange(50) for i in range(3)]]
+    with SampleArchiveWriter(folder, compress) as writer:
+        assert writer.submit(-1.5, points[0], times[0]) == 0
+    #a trial started again numbers its new segments after the old ones
+    with SampleArchiveWriter(folder, compress) as writer:
+        assert writer.submit(1.5, points[1], times[1]) == 1
+    assert writer.errors == []
+
+    archive = SampleArchive(folder)
+    assert len(archive) == 2
+    np.testing.assert_array_equal(archive.index["Current"], [-1.5, 1.5])
+    for segment in range(2):
+        np.testing.assert_allclose(archive.samples(segment), np.hstack(points[segment]))
+        np.testing.assert_array_equal(archive.sample_times(segment), np.hstack(times[segment]))
+    if not compress:
+        assert isinstance(archive.samples(1), np.memmap)
+    with pytest.raises(KeyError):
+        archive.samples(2)
+
+
+def test_recompute_raw_trial_from_the_archive(tmp_path):
+    rng = np.random.default_rng(1)
+    raw_filepath = str(tmp_path / "2023-06-27_cell-309A_temp-100_trial-1.csv")
+    points = [rng.normal(0.2 + 0.01*i, 1.0E-3, 20) for i in range(3)]
+    with SampleArchiveWriter(sample_archive_path(raw_filepath)) as writer:
+        segments = [writer.submit(i, list(p)) for i, p in enumerate(points)]
+    #the last row has no samples, it keeps its values
+    raw = pd.DataFrame([[i, 0.0, 0.0, 0.0, 1.7E9 + i, s] for i, s in enumerate(segments)] + [[3, 9.0, 9.0, 9.0, 1.7E9, np.nan]],
+                       columns=RAW_COLUMNS)
+    raw.to_csv(raw_filepath, index=False)
+
+    recomputed = recompute_raw_trial(raw_filepath)
+    voltages = recomputed[RAW_COLUMNS[1:4]].to_numpy()
+    np.testing.assert_allclose(voltages[:3], [sample_stats(p) for p in points])
+    np.testing.assert_array_equal(voltages[3], [9.0, 9.0, 9.0])
+
+    #a filter that drops the first sample of every point
+    filtered = recompute_raw_trial(raw_filepath, lambda samples, sample_times: samples[1:])
+    np.testing.assert_allclose(filtered["Voltage"][:3], [np.mean(p[1:]) for p in points])
+
+
+def test_recompute_needs_a_sample_segment_column(tmp_path):
+    raw_filepath = str(tmp_path / "2023-06-27_cell-309A_temp-100_trial-1.csv")
+    pd.DataFrame([[0, 0.2, 0.0, 0.0, 1.7E9]], columns=RAW_COLUMNS[:5]).to_csv(raw_filepath, index=False)
+    with pytest.raises(KeyError):
+        recompute_raw_trial(raw_filepath)
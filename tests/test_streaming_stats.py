@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import functions.utilities as util
+from functions.density_collection_functions import collectDataPoint
+from functions.instruments import SimulatedScope
+from functions.streaming_stats import RunningStats
+
+
+def samples():
+    return np.random.default_rng(0).normal(0.2, 1.0E-3, 1000)
+
+
+def test_update_matches_numpy():
+    x = samples()
+    stats = RunningStats()
+    for value in x:
+        stats.update(value)
+    np.testing.assert_allclose(stats.data_point(), [np.mean(x), util.meanAbsError(x), np.std(x)], rtol=1.0E-9)
+
+
+def test_update_batch_and_merge_match_numpy():
+    x = samples()
+    stats = RunningStats()
+    for chunk in np.array_split(x[:600], 7):
+        stats.update_batch(chunk)
+    other = RunningStats()
+    other.update_batch(x[600:])
+    stats.merge(other)
+    assert stats.count == len(x)
+    np.testing.assert_allclose(stats.data_point(), [np.mean(x), util.meanAbsError(x), np.std(x)], rtol=1.0E-9)
+
+
+@pytest.mark.parametrize("buffer_size", [0, 10])
+def test_small_buffer_keeps_mean_and_std_exact(buffer_size):
+    x = samples()
+    stats = RunningStats(buffer_size)
+    stats.update_batch(x[:500])
+    for value in x[500:]:
+        stats.update(value)
+    np.testing.assert_allclose([stats.mean, stats.std()], [np.mean(x), np.std(x)], rtol=1.0E-9)
+    if buffer_size == 0:
+        assert np.isnan(stats.mean_abs_error())
+    else:
+        np.testing.assert_allclose(stats.mean_abs_error(), np.mean(np.abs(x[-10:] - np.mean(x))), rtol=1.0E-9)
+
+
+def test_negative_buffer_size_is_an_error():
+    with pytest.raises(ValueError):
+        RunningStats(-1)
+
+
+def test_waveform_data_point_matches_the_samples():
+    scope = SimulatedScope(record_length=500, noise=1.0E-3, seed=0)
+    samples = []
+    data_point = collectDataPoint(4, 0, scope, mode="waveform", samples=samples)
+    volts = np.concatenate(samples).astype(float)
+    np.testing.assert_allclose(data_point, [np.mean(volts), util.meanAbsError(volts), np.std(volts)], rtol=1.0E-5)
@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import pytest
+
+import density_analysis.density_calculations.trial_files as trial_files
+from density_analysis.density_calculations.columnar import columnar_path, write_columns
+from density_analysis.density_calculations.trial_files import ExperimentParamsIndex, deconstruct_filename, \
+    params_filepath
+
+
+def write_params(path, conversion_factor):
+    pd.DataFrame({"Trial Number": [1, 2, 1], "Conversion Factor": [conversion_factor, 0.07, 0.09],
+                  "Conversion Factor Error": [1.0E-3]*3, "Laser Wavelength": [7.8E-5]*3,
+                  "Optical Length": [3.7]*3}).to_csv(path, index=False)
+
+
+#counts how many times the index reads a params table
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+    read_table = trial_files.read_table
+    monkeypatch.setattr(trial_files, "read_table", lambda path: calls.append(path) or read_table(path))
+    return calls
+
+
+def test_deconstruct_filename():
+    info = deconstruct_filename(os.path.join("Data", "2023-06-27_cell-309A_temp-100_trial-3.csv"))
+    assert info == {"date": "2023-06-27", "cell_id": "309A", "oven_temp": "100", "trial_num": "3"}
+
+
+def test_each_params_file_is_read_once(tmp_path, reads):
+    path = params_filepath(str(tmp_path), "2023-06-27")
+    write_params(path, 0.05)
+    index = ExperimentParamsIndex()
+    #the first row of a trial saved twice is the one used
+    assert index.lookup(path, "1")["conversion_factor"] == 0.05
+    assert index.lookup(path, 2)["conversion_factor"] == 0.07
+    assert len(reads) == 1
+    with pytest.raises(KeyError):
+        index.lookup(path, 4)
+
+
+def test_changed_file_is_read_again(tmp_path, reads):
+    path = params_filepath(str(tmp_path), "2023-06-27")
+    write_params(path, 0.05)
+    index = ExperimentParamsIndex()
+    index.lookup(path, 1)
+    write_params(path, 0.06)
+    later = os.path.getmtime(path) + 10
+    os.utime(path, (later, later))
+    assert index.lookup(path, 1)["conversion_factor"] == 0.06
+    #a columnar copy made after the csv is read instead
+    write_params(path, 0.08)
+    os.utime(path, (later - 100, later - 100))
+    write_columns(pd.read_csv(path), columnar_path(path))
+    assert index.lookup(path, 1)["conversion_factor"] == 0.08
+    assert len(reads) == 3
+    index.clear()
+    index.lookup(path, 1)
+    assert len(reads) == 4
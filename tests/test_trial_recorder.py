@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions.trial_recorder import TrialRecorder
+
+COLUMNS = ["Current (A)", "Voltage (V)"]
+
+
+def test_rows_survive_growing_past_capacity(tmp_path):
+    path = str(tmp_path / "trial.csv")
+    with TrialRecorder(path, COLUMNS, fsync=False, capacity=2) as recorder:
+        for i in range(37):
+            recorder.append([i, 0.5*i] if i % 2 else {"Current (A)": i, "Voltage (V)": 0.5*i})
+        assert len(recorder) == 37
+        np.testing.assert_array_equal(recorder.column("Voltage (V)"), 0.5*np.arange(37))
+    pd.testing.assert_frame_equal(pd.read_csv(path), recorder.to_dataframe(), check_dtype=False)
+
+
+def test_rows_are_written_every_flush_every_rows(tmp_path):
+    path = str(tmp_path / "trial.csv")
+    recorder = TrialRecorder(path, COLUMNS, flush_every=3, fsync=False)
+    for i in range(5):
+        recorder.append([i, 0.5*i])
+    assert len(pd.read_csv(path)) == 3
+    recorder.close()
+    assert len(pd.read_csv(path)) == 5
+
+
+def test_load_existing_keeps_the_file_rows_without_writing_them_again(tmp_path):
+    path = str(tmp_path / "params.csv")
+    with TrialRecorder(path, COLUMNS, dtype=object, fsync=False) as recorder:
+        recorder.append([1, "a"])
+    with TrialRecorder(path, COLUMNS, dtype=object, fsync=False, load_existing=True) as recorder:
+        assert len(recorder) == 1
+        recorder.append([2, "b"])
+        assert list(recorder.to_dataframe()["Voltage (V)"]) == ["a", "b"]
+    assert list(pd.read_csv(path)["Current (A)"]) == [1, 2]
+
+
+def test_file_with_other_columns_is_a_clear_error(tmp_path):
+    path = tmp_path / "params.csv"
+    path.write_text("Current (A),Old Column\n1,2\n")
+    with pytest.raises(ValueError, match="Old Column"):
+        TrialRecorder(str(path), COLUMNS, load_existing=True)
+    #and the file is left as it was
+    assert path.read_text() == "Current (A),Old Column\n1,2\n"
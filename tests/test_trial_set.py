@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from density_analysis.density_calculations.linear_fit import usable_sigma, weighted_line_fit
+from density_analysis.density_calculations.processing import PROCESSED_COLUMNS, fit_trial
+from density_analysis.density_calculations.trial_set import TrialSet
+
+
+#processed trials of different lengths, the third one with a zero error like hand-made test files
+def processed_trials(processed_trial, rng):
+    trials = [processed_trial(rng, n, slope=1.0E-4 + 1.0E-5*i) for i, n in enumerate((10, 25, 7, 16))]
+    trials[2].loc[3, "Rotation Standard Deviation"] = 0.0
+    return trials
+
+
+def test_fit_lines_matches_weighted_line_fit_trial_by_trial(processed_trial):
+    trials = processed_trials(processed_trial, np.random.default_rng(0))
+    trial_set = TrialSet.from_processed(trials, 7.8E-5, 3.7)
+    for weighted in (True, False):
+        slope, intercept, cov = trial_set.fit_lines(weighted)
+        for i in range(len(trial_set)):
+            field, rotation, rotation_err = trial_set.trial(i)
+            sigma = rotation_err if weighted and usable_sigma(rotation_err) else None
+            s, b, c = weighted_line_fit(field, rotation, sigma)
+            np.testing.assert_allclose([slope[i], intercept[i]], [s, b], rtol=1.0E-12)
+            np.testing.assert_allclose(cov[i], c, rtol=1.0E-9, atol=1.0E-12*np.max(np.abs(c)))
+
+
+def test_fit_matches_fit_trial(processed_trial):
+    trials = processed_trials(processed_trial, np.random.default_rng(1))
+    wavelengths = np.array([7.80E-5, 7.81E-5, 7.82E-5, 7.83E-5])
+    fit_results = TrialSet.from_processed(trials, wavelengths, 3.7).fit(cell="309A")
+    for i, trial in enumerate(trials):
+        expected = fit_trial(trial, wavelengths[i], 3.7, cell="309A")
+        for name in ("Slope", "Slope Error", "Intercept", "Intercept Error", "Density", "Density Error", "Density Error (STD)"):
+            np.testing.assert_allclose(fit_results[name][i], expected[name], rtol=1.0E-9)
+
+
+def test_empty_trial_fits_to_nan(processed_trial):
+    trials = processed_trials(processed_trial, np.random.default_rng(2))
+    trials.insert(1, pd.DataFrame({name: np.empty(0) for name in PROCESSED_COLUMNS}))
+    slope, intercept, _ = TrialSet.from_processed(trials, 7.8E-5, 3.7).fit_lines()
+    assert np.isnan(slope[1]) and np.isnan(intercept[1])
+    assert np.isfinite(slope[[0, 2, 3, 4]]).all()
@@ -0,0 +1,53 @@
+import numpy as np
+
+from density_analysis.density_calculations.processing import fit_trial
+from density_analysis.density_calculations.uncertainty import density_monte_carlo, trial_monte_carlo
+
+WAVELENGTH = 7.8E-5
+OPTICAL_LENGTH = 3.7
+
+
+def experiment_params(conversion_factor_err=0.0):
+    return {"conversion_factor": 0.05, "conversion_factor_err": conversion_factor_err,
+            "laser_wavelength": WAVELENGTH, "optical_length": OPTICAL_LENGTH}
+
+
+def test_density_matches_fit_trial_for_the_cell(processed_trial):
+    trial = processed_trial(np.random.default_rng(0))
+    for cell in (None, "309A", "Rb85-unshifted"):
+        mc_results = trial_monte_carlo(trial, experiment_params(), cell=cell, num_draws=2000, seed=1)
+        expected = fit_trial(trial, WAVELENGTH, OPTICAL_LENGTH, cell=cell)
+        np.testing.assert_allclose(mc_results["density"], expected["Density"], rtol=1.0E-12)
+
+
+def test_spread_matches_the_fit_error(processed_trial):
+    #with only the point errors drawn, the spread of the refits is the fit's own (absolute sigma) slope error
+    trial = processed_trial(np.random.default_rng(1))
+    mc_results = trial_monte_carlo(trial, experiment_params(), num_draws=40000, seed=2)
+    field = trial["Magnetic Field (Gauss)"].to_numpy()
+    w = 1/trial["Rotation Standard Deviation"].to_numpy()**2
+    slope_err = 1/np.sqrt(np.sum(w*(field - np.sum(w*field)/np.sum(w))**2))
+    density_per_slope = mc_results["density"]/fit_trial(trial, WAVELENGTH, OPTICAL_LENGTH)["Slope"]
+    np.testing.assert_allclose(mc_results["std"], abs(slope_err*density_per_slope), rtol=0.02)
+    np.testing.assert_allclose(mc_results["mean"], mc_results["density"], rtol=1.0E-3)
+
+
+def test_same_seed_same_answer_with_any_chunking(processed_trial):
+    trial = processed_trial(np.random.default_rng(3))
+    args = (trial["Magnetic Field (Gauss)"], trial["Rotation (Radians)"], trial["Rotation Standard Deviation"],
+            0.05, WAVELENGTH, OPTICAL_LENGTH)
+    first = density_monte_carlo(*args, conversion_factor_err=0.001, num_draws=3000, chunk_size=1000, seed=4, return_draws=True)
+    second = density_monte_carlo(*args, conversion_factor_err=0.001, num_draws=3000, chunk_size=1000, seed=4, return_draws=True)
+    np.testing.assert_array_equal(first["draws"], second["draws"])
+
+
+def test_zero_or_missing_errors_fall_back_to_unweighted_fits(processed_trial):
+    trial = processed_trial(np.random.default_rng(5))
+    for bad in (0.0, np.nan):
+        broken = trial.copy()
+        broken.loc[4, "Rotation Standard Deviation"] = bad
+        mc_results = trial_monte_carlo(broken, experiment_params(0.001), num_draws=2000, seed=6)
+        assert np.isfinite(mc_results["mean"]) and np.isfinite(mc_results["std"])
+        #fit_trial also fits unweighted when an error is not above zero
+        expected = fit_trial(broken, WAVELENGTH, OPTICAL_LENGTH)
+        np.testing.assert_allclose(mc_results["density"], expected["Density"], rtol=1.0E-12)
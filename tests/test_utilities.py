@@ -0,0 +1,45 @@
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+import functions.utilities as util
+
+
+@pytest.fixture(params=["UTC", "America/New_York", "Australia/Lord_Howe"])
+def timezone(request, monkeypatch):
+    #Lord Howe moves its clocks by half an hour, New York by an hour
+    if not hasattr(time, "tzset"):
+        pytest.skip("the time zone can only be changed where time.tzset exists")
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_format_timestamps_matches_datetime(timezone):
+    rng = np.random.default_rng(0)
+    times = np.concatenate([1.6E9 + rng.random(5000)*1.0E8, np.floor(1.6E9 + rng.random(100)*1.0E8),
+                            [0.0, 1.7E9 + 0.9999996, 1.7E9 + 0.5E-6]])
+    dates, clock_times = util.formatTimestampsForCSV(times)
+    for t, d, c in zip(times, dates, clock_times):
+        assert d + " " + c == str(datetime.datetime.fromtimestamp(t))
+
+
+def test_format_timestamps_nan_is_empty():
+    dates, clock_times = util.formatTimestampsForCSV([np.nan, 1.7E9])
+    assert dates[0] == "" and clock_times[0] == ""
+    assert [dates[1], clock_times[1]] == util.timestampToArray(1.7E9)
+
+
+def test_timestamp_to_array_matches_datetime(timezone):
+    for t in (1.7E9, 1.7E9 + 0.25):
+        assert util.timestampToArray(t) == str(datetime.datetime.fromtimestamp(t)).split(" ")
+
+
+def test_parse_date_time_columns_reverses_formatting():
+    times = 1.7E9 + np.arange(10)*0.37
+    dates, clock_times = util.formatTimestampsForCSV(times)
+    np.testing.assert_array_equal(util.parseDateTimeColumns(dates, clock_times), util.timestampsToDatetime64(times))